@@ -0,0 +1,115 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+
+import modbus_tk.modbus
+from PyQt5.QtCore import QObject, pyqtSignal
+from modbus_tk.exceptions import *
+import modbus_tk.defines as cst
+
+import defines
+import mb_protocol
+
+
+class AddressScanner(QObject):
+    """
+    Task that finds the readable addresses of a device, for one reading function.
+    The addresses are probed with blocks as large as the protocol allows. Only the blocks answered with
+    exception 2 "Illegal data address" (or 3 "Illegal data value", used by some devices for a too large block)
+    are bisected, until the readable addresses are isolated.
+    The task is executed by the PollScheduler of the connection, one batch of probes per step.
+    """
+    # pyqtSignal should be not in the __init__ !
+    log_progress = pyqtSignal(str)
+    progress = pyqtSignal(int, int)  # Number of addresses scanned, number of addresses to scan
+    found = pyqtSignal(list)  # Readable ranges, as (starting_address, quantity) tuples
+    finished = pyqtSignal()
+
+    def __init__(self, unit_id: int, read_func: cst, starting_address: int, end_address: int):
+        """
+        Constructor
+
+        :param unit_id: Unit identifier of the server/slave.
+        :param read_func: Modbus reading function.
+        :param starting_address: First address to scan.
+        :param end_address: Last address to scan.
+        """
+        super(AddressScanner, self).__init__()
+        self.unit_id = unit_id
+        self.read_func = read_func
+
+        quantity = end_address - starting_address + 1
+        self._blocks = collections.deque(mb_protocol.split_range(read_func, starting_address, quantity))
+        self._readable = []
+        self._scanned_quantity = 0
+        self._total_quantity = quantity
+        self._canceled = False
+
+    def cancel(self):
+        """Stop the scan at the next step. The ranges found so far are reported."""
+        self._canceled = True
+
+    def execute(self, modbus_client: modbus_tk.modbus.Master) -> bool:
+        """
+        Probe one batch of blocks. On TCP, the probes of a batch are in flight at the same time.
+
+        :param modbus_client: The connected modbus client.
+        :return: True if there are more blocks to probe.
+        """
+        if self._canceled:
+            self._report_found("Scan stopped")
+            return False
+
+        batch_size = defines.MAX_TCP_REQUESTS_IN_FLIGHT if mb_protocol.is_pipelined(modbus_client) else 1
+        batch = [self._blocks.popleft() for _ in range(min(batch_size, len(self._blocks)))]
+        try:
+            results = mb_protocol.probe_chunks(modbus_client, self.unit_id, self.read_func, batch)
+        except Exception as ex:  # Communication failure, invalid response or MBAP, unexpected error
+            self.log_progress.emit(mb_protocol.error_message(ex))
+            self._report_found("Scan aborted")
+            return False
+
+        halves = []
+        for (starting_address, quantity), result in zip(batch, results):
+            if not isinstance(result, Exception):
+                self._readable.append((starting_address, quantity))
+                self._scanned_quantity += quantity
+            elif isinstance(result, ModbusError) and result.get_exception_code() in (2, 3):
+                if quantity > 1:  # Bisect
+                    half = quantity // 2
+                    halves.append((starting_address, half))
+                    halves.append((starting_address + half, quantity - half))
+                else:
+                    self._scanned_quantity += 1
+            else:
+                self.log_progress.emit(mb_protocol.error_message(result))
+                self._report_found("Scan aborted")
+                return False
+        self._blocks.extendleft(reversed(halves))  # Probe the halves first, to scan in address order
+
+        self.progress.emit(self._scanned_quantity, self._total_quantity)
+        if not self._blocks:
+            self._report_found("Scan completed")
+            return False
+        return True
+
+    def _report_found(self, message: str):
+        ranges = [(starting_address, quantity)
+                  for starting_address, quantity, _ in mb_protocol.coalesce_ranges(self._readable, 0)]
+        self.log_progress.emit(f"{message}: {len(ranges)} readable range(s)")
+        self.found.emit(ranges)
@@ -0,0 +1,249 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import struct
+import threading
+
+from modbus_tk.exceptions import *
+import modbus_tk.defines as cst
+
+import defines
+import mb_protocol
+
+
+class AsyncTcpMaster:
+    """
+    Modbus TCP client based on asyncio. Several requests can wait for their response at the same time:
+    they are matched to the responses by transaction identifier, so the server can answer in any order.
+
+    The asyncio loop runs on its own thread. The public methods are blocking, and have the same behavior as
+    the ones of modbus_tk Master, so this client can be used in place of a modbus_tk TcpMaster.
+    """
+
+    def __init__(self, host="127.0.0.1", port=502, timeout_in_sec=5.0,
+                 max_in_flight=defines.MAX_TCP_REQUESTS_IN_FLIGHT):
+        """
+        Constructor
+
+        :param host: IP or hostname of the server.
+        :param port: TCP port of the server.
+        :param timeout_in_sec: Maximum waiting time of a response.
+        :param max_in_flight: Maximum number of requests waiting for a response.
+        """
+        self._host = host
+        self._port = port
+        self._timeout = timeout_in_sec
+        self._max_in_flight = max_in_flight
+
+        self._loop = None
+        self._loop_thread = None
+        self._reader = None
+        self._writer = None
+        self._receiving_task = None
+        self._in_flight = None  # Semaphore limiting the number of requests in flight
+        self._pending = {}  # transaction id -> future of the response PDU
+        self._last_transaction_id = 0
+
+    def open(self):
+        """Connect to the server."""
+        if self._writer is not None:
+            return
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+            self._loop_thread.start()
+        self._run(self._connect())
+
+    def close(self):
+        """Close the connection and stop the asyncio loop."""
+        if self._loop is None:
+            return
+        self._run(self._disconnect())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop_thread.join()
+        self._loop.close()
+        self._loop = None
+        self._loop_thread = None
+
+    def set_timeout(self, timeout_in_sec: float):
+        """Change the timeout value"""
+        self._timeout = timeout_in_sec
+
+    def get_timeout(self) -> float:
+        """Gets the current value of the timeout"""
+        return self._timeout
+
+    def execute(self, slave: int, function_code: cst, starting_address: int, quantity_of_x=0, output_value=0) -> tuple:
+        """
+        Execute a modbus request and returns the data part of the answer as a tuple. Same as modbus_tk Master.
+
+        :raise ModbusError: If the server answers with an exception.
+        :raise TimeoutError: If the server does not answer in time.
+        """
+        self.open()
+        pdu = mb_protocol.build_request_pdu(function_code, starting_address, quantity_of_x, output_value)
+        response_pdu = self._run(self._request(slave, pdu))
+        return mb_protocol.parse_response_pdu(function_code, quantity_of_x, response_pdu)
+
+    def probe_chunks(self, unit_id: int, read_func: cst, chunks: list) -> list:
+        """
+        Read all chunks with pipelined requests, and get the result of each one.
+
+        :param unit_id: Unit identifier of the server/slave.
+        :param read_func: Modbus reading function.
+        :param chunks: List of (starting_address, quantity) tuples.
+        :return: For each chunk, the array of values or the ModbusError/ModbusInvalidResponseError raised.
+        :raise OSError: If the communication fails (timeout, connection lost, ...).
+        """
+        self.open()
+        return self._run(self._probe_chunks(unit_id, read_func, chunks))
+
+    def probe_units(self, read_func: cst, address: int, unit_ids: list) -> list:
+        """
+        Send the same single-item read to every unit id in parallel. Each request has its own timeout.
+
+        :param read_func: Modbus reading function.
+        :param address: Address to read.
+        :param unit_ids: Unit identifiers to probe.
+        :return: For each unit, a (result, response time in second) tuple, (None, None) if it has not answered.
+        :raise OSError: If the connection is lost.
+        """
+        self.open()
+        return self._run(self._probe_units(read_func, address, unit_ids))
+
+    def _run(self, coroutine):
+        """Run a coroutine in the asyncio loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _connect(self):
+        try:
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self._host, self._port), self._timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("timed out")
+        self._in_flight = asyncio.Semaphore(self._max_in_flight)
+        self._receiving_task = asyncio.ensure_future(self._receive_responses())
+
+    async def _disconnect(self):
+        if self._receiving_task is not None:
+            self._receiving_task.cancel()
+            self._receiving_task = None
+        await self._close_writer()
+        self._fail_pending(ConnectionAbortedError("Connection closed"))
+
+    async def _close_writer(self):
+        """Close the stream, so its socket is released."""
+        writer = self._writer
+        self._writer = None
+        self._reader = None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:  # The connection is already broken
+                pass
+
+    def _fail_pending(self, ex: Exception):
+        """Fail every request that waits for a response."""
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ex)
+        self._pending.clear()
+
+    async def _receive_responses(self):
+        """Receive the responses and deliver each one to the request with the same transaction id."""
+        try:
+            while True:
+                mbap = await self._reader.readexactly(7)
+                transaction_id, protocol_id, length, unit_id = struct.unpack(">HHHB", mbap)
+                if length < 2:
+                    raise ModbusInvalidResponseError("Invalid MBAP length: {0}".format(length))
+                response_pdu = await self._reader.readexactly(length - 1)
+                future = self._pending.pop(transaction_id, None)
+                if future is not None and not future.done():
+                    future.set_result(response_pdu)
+        except asyncio.IncompleteReadError:
+            await self._close_writer()
+            self._fail_pending(ConnectionResetError("Connection closed by the server"))
+        except (ModbusInvalidResponseError, OSError) as ex:
+            await self._close_writer()
+            self._fail_pending(ex)
+
+    async def _request(self, slave: int, pdu: bytes) -> bytes:
+        """Send a request and wait for its response PDU."""
+        async with self._in_flight:
+            return await self._send_request(slave, pdu)
+
+    async def _send_request(self, slave: int, pdu: bytes) -> bytes:
+        """Send a request and wait for its response PDU. Must be called with a slot of _in_flight acquired."""
+        if self._writer is None:
+            raise ConnectionResetError("Not connected")
+
+        self._last_transaction_id = (self._last_transaction_id + 1) & 0xffff
+        transaction_id = self._last_transaction_id
+        future = self._loop.create_future()
+        self._pending[transaction_id] = future
+
+        self._writer.write(struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, slave) + pdu)
+        try:
+            return await asyncio.wait_for(future, self._timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("timed out")
+        finally:
+            self._pending.pop(transaction_id, None)
+
+    async def _probe_chunks(self, unit_id: int, read_func: cst, chunks: list) -> list:
+        requests = [self._request(unit_id, mb_protocol.build_request_pdu(read_func, address, quantity))
+                    for address, quantity in chunks]
+        responses = await asyncio.gather(*requests, return_exceptions=True)
+
+        results = []
+        for (address, quantity), response in zip(chunks, responses):
+            if isinstance(response, Exception):
+                raise response
+            try:
+                results.append(mb_protocol.parse_read_response(read_func, quantity, response))
+            except (ModbusError, ModbusInvalidResponseError) as ex:
+                results.append(ex)
+        return results
+
+    async def _probe_unit(self, unit_id: int, pdu: bytes) -> (bytes, float):
+        async with self._in_flight:
+            # The response time does not include the wait for a free slot
+            start_time = self._loop.time()
+            try:
+                response_pdu = await self._send_request(unit_id, pdu)
+            except TimeoutError:
+                return None, None
+            return response_pdu, self._loop.time() - start_time
+
+    async def _probe_units(self, read_func: cst, address: int, unit_ids: list) -> list:
+        pdu = mb_protocol.build_request_pdu(read_func, address, 1)
+        responses = await asyncio.gather(*[self._probe_unit(unit_id, pdu) for unit_id in unit_ids])
+
+        results = []
+        for response_pdu, response_time in responses:
+            if response_pdu is None:
+                results.append((None, None))
+                continue
+            try:
+                result = mb_protocol.parse_read_response(read_func, 1, response_pdu)
+            except (ModbusError, ModbusInvalidResponseError) as ex:
+                result = ex
+            results.append((result, response_time))
+        return results
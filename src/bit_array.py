@@ -0,0 +1,187 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import array
+
+# Translation of unpacked bits (one byte 0 or 1 per bit) into binary digits, and back
+_BYTES_TO_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+_DIGITS_TO_BYTES = bytes.maketrans(b"01", b"\x00\x01")
+
+
+class BitArray:
+    """
+    Sequence of bits packed into a bytearray, 8 bits per byte, least significant bit first (as in the modbus
+    frames). So 2000 coils cost 250 bytes.
+    The operations on several bits (slices, comparison, filling) are done on Python integers, without a Python
+    object per bit.
+    """
+
+    def __init__(self, length: int = 0):
+        """
+        Constructor
+
+        :param length: Number of bits, all 0.
+        """
+        self._length = length
+        self._bytes = bytearray((length + 7) // 8)
+
+    @classmethod
+    def from_unpacked(cls, values):
+        """
+        :param values: The bits, as one byte (or item) 0 or 1 per bit, for example an array('B').
+        :return: A new BitArray with these bits.
+        """
+        bits = cls(len(values))
+        bits.set_bits(0, len(values), unpacked_to_int(values))
+        return bits
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            first, end, step = index.indices(self._length)
+            if step != 1:
+                raise ValueError("BitArray slices must be contiguous")
+            bits = BitArray(max(end - first, 0))
+            bits.set_bits(0, len(bits), self.get_bits(first, end))
+            return bits
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("BitArray index out of range")
+        return (self._bytes[index >> 3] >> (index & 7)) & 1
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            first, end, step = index.indices(self._length)
+            if step != 1:
+                raise ValueError("BitArray slices must be contiguous")
+            if not isinstance(value, BitArray):
+                value = BitArray.from_unpacked(value)
+            if len(value) != max(end - first, 0):
+                raise ValueError("BitArray slices cannot be resized")
+            self.set_bits(first, end, value.get_bits(0, len(value)))
+            return
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("BitArray index out of range")
+        if value:
+            self._bytes[index >> 3] |= 1 << (index & 7)
+        else:
+            self._bytes[index >> 3] &= ~(1 << (index & 7)) & 0xff
+
+    def get_bits(self, first: int, end: int) -> int:
+        """
+        :param first: Index of the first bit.
+        :param end: Index after the last bit.
+        :return: The bits as an integer, the first bit being the least significant one.
+        """
+        if end <= first:
+            return 0
+        value = int.from_bytes(self._bytes[first >> 3:(end + 7) >> 3], "little")
+        return (value >> (first & 7)) & ((1 << (end - first)) - 1)
+
+    def set_bits(self, first: int, end: int, value: int):
+        """
+        Set consecutive bits.
+
+        :param first: Index of the first bit.
+        :param end: Index after the last bit.
+        :param value: The bits as an integer, the first bit being the least significant one.
+        """
+        if end <= first:
+            return
+        first_byte = first >> 3
+        end_byte = (end + 7) >> 3
+        shift = first & 7
+        mask = ((1 << (end - first)) - 1) << shift
+        old_value = int.from_bytes(self._bytes[first_byte:end_byte], "little")
+        new_value = (old_value & ~mask) | ((value << shift) & mask)
+        self._bytes[first_byte:end_byte] = new_value.to_bytes(end_byte - first_byte, "little")
+
+    def fill(self, first: int, end: int, bit: int):
+        """
+        Set consecutive bits to the same value.
+
+        :param first: Index of the first bit.
+        :param end: Index after the last bit.
+        :param bit: 0 or 1.
+        """
+        self.set_bits(first, end, ((1 << (end - first)) - 1) if bit and end > first else 0)
+
+    def all(self, first: int, end: int) -> bool:
+        """
+        :param first: Index of the first bit.
+        :param end: Index after the last bit.
+        :return: True if every bit of the slice is 1.
+        """
+        return self.get_bits(first, end) == (1 << max(end - first, 0)) - 1
+
+    def changed_indexes(self, first: int, end: int, value: int) -> list:
+        """
+        Compare consecutive bits with new ones.
+
+        :param first: Index of the first bit.
+        :param end: Index after the last bit.
+        :param value: The new bits as an integer, the first bit being the least significant one.
+        :return: The sorted indexes (from first) of the bits that differ.
+        """
+        difference = self.get_bits(first, end) ^ value
+        indexes = []
+        while difference:
+            lowest = difference & -difference
+            indexes.append(lowest.bit_length() - 1)
+            difference ^= lowest
+        return indexes
+
+    def tobytes(self) -> bytes:
+        """
+        :return: The packed bits, least significant bit first. The unused bits of the last byte are 0.
+        """
+        return bytes(self._bytes)
+
+    def tolist(self) -> list:
+        """
+        :return: The value of every bit.
+        """
+        return int_to_unpacked(self.get_bits(0, self._length), self._length).tolist()
+
+
+def unpacked_to_int(values) -> int:
+    """
+    :param values: Bits, as one byte (or item) 0 or 1 per bit.
+    :return: The bits as an integer, the first bit being the least significant one.
+    """
+    if not len(values):
+        return 0
+    if not isinstance(values, (bytes, bytearray)):
+        values = bytes(values)
+    return int(values[::-1].translate(_BYTES_TO_DIGITS), 2)
+
+
+def int_to_unpacked(value: int, length: int) -> array.array:
+    """
+    :param value: Bits as an integer, the first bit being the least significant one.
+    :param length: Number of bits.
+    :return: The bits as an array('B'), one item 0 or 1 per bit.
+    """
+    if length <= 0:
+        return array.array('B')
+    digits = format(value & ((1 << length) - 1), "0{0}b".format(length)).encode()
+    return array.array('B', digits[::-1].translate(_DIGITS_TO_BYTES))
@@ -0,0 +1,65 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+
+from custome_widgets.IntegerLineEdit import QIntegerLineEdit
+import custome_widgets.CustomQValidators as Validators
+
+
+class BlockWriteUI(object):
+    """This class contains all the widgets and configures them for the block writing dialog box."""
+    def __init__(self, main_window):
+        main_window.setWindowTitle('Write block')
+        general_layout = QVBoxLayout()
+        widget = QWidget()
+        widget.setLayout(general_layout)
+        main_window.setCentralWidget(widget)
+
+        # ****************************
+        # Values prompt
+        # ****************************
+        self.start_address_edit = QIntegerLineEdit()
+        self.start_address_edit.setValidator(Validators.DecValidator(0, 65535))
+
+        self.values_edit = QPlainTextEdit()
+        self.values_edit.setToolTip("One value per line, or a column of values pasted from a spreadsheet")
+
+        self.info_label = QLabel()
+
+        flo = QFormLayout()
+        flo.addRow("Starting address", self.start_address_edit)
+        flo.addRow("Values", self.values_edit)
+        flo.addRow(self.info_label)
+        general_layout.addLayout(flo)
+
+        # ****************************
+        # Main buttons
+        # ****************************
+        h_layout = QHBoxLayout()
+        general_layout.addLayout(h_layout)
+
+        self.valid_button = QPushButton()
+        self.valid_button.setText("Write")
+        h_layout.addWidget(self.valid_button)
+
+        self.cancel_button = QPushButton()
+        self.cancel_button.setText("Cancel")
+        self.cancel_button.setShortcut(QKeySequence(Qt.Key.Key_Escape))
+        self.cancel_button.setStyleSheet("background-color : red")
+        h_layout.addWidget(self.cancel_button)
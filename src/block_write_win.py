@@ -0,0 +1,126 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+import modbus_tk.defines as cst
+
+import block_write_ui
+import mb_protocol
+from register_row import RegisterRow as Row
+
+
+class BlockWriteWin(QMainWindow):
+    """
+    This class is the dialog box to write a block of consecutive registers or coils, or the rows of a
+    selection that is not contiguous.
+    """
+
+    def __init__(self, register_rows: list, write_func: cst, first_address: int, end_address: int, callback_method):
+        """
+        Constructor
+
+        :param register_rows: The selected rows, used as initial content. If they are not consecutive, the values
+            are written to these rows.
+        :param write_func: Modbus writing function of the range.
+        :param first_address: First address of the range.
+        :param end_address: Address following the last address of the range.
+        :param callback_method: The function to call with the list of rows to write.
+        """
+        super().__init__()
+        self.setWindowModality(Qt.WindowModality.ApplicationModal)
+        self._callback_method = callback_method
+        self._first_address = first_address
+        self._end_address = end_address
+        self._max_value = 1 if mb_protocol.is_bit_function(write_func) else 65535
+        addresses = [row.register_addr for row in register_rows]
+        self._selected_addresses = None  # Addresses written, None for consecutive addresses from the start address
+        if addresses and addresses != list(range(addresses[0], addresses[0] + len(addresses))):
+            self._selected_addresses = addresses
+
+        # UI setup
+        self._ui = self._setup_ui()
+        if self._selected_addresses is not None:
+            self._ui.start_address_edit.setEnabled(False)
+            self._ui.start_address_edit.setToolTip("The values are written to the selected rows")
+
+        self._ui.start_address_edit.set_value(register_rows[0].register_addr if register_rows else first_address)
+        self._ui.values_edit.setPlainText("\n".join(
+            "" if row.register_value is None else str(row.register_value) for row in register_rows))
+        self._on_values_edited()
+
+    def _parse_rows(self) -> list:
+        """
+        Parse the typed values, one per line, and give each one its address.
+
+        :return: The rows to write, sorted by address.
+        :raise ValueError: If a line is empty or invalid, or if the values don't fit into the range or the
+            selection.
+        """
+        values = []
+        for line_number, line in enumerate(self._ui.values_edit.toPlainText().splitlines(), 1):
+            text = line.strip().split("\t")[0].strip()  # First column of a spreadsheet paste
+            if text == "":
+                raise ValueError(f"The line {line_number} has no value")
+            try:
+                value = int(text, 0)
+            except ValueError:
+                raise ValueError(f"The line {line_number} is not a number: {text}")
+            if not 0 <= value <= self._max_value:
+                raise ValueError(f"The value {text} is out of the range 0 to {self._max_value}")
+            values.append(value)
+
+        if self._selected_addresses is not None:
+            if len(values) != len(self._selected_addresses):
+                raise ValueError(f"{len(self._selected_addresses)} values expected, one per selected row")
+            return [Row(addr=address, value=value) for address, value in zip(self._selected_addresses, values)]
+
+        starting_address = self._ui.start_address_edit.get_value()
+        if starting_address < self._first_address or starting_address + len(values) > self._end_address:
+            raise ValueError("The values don't fit into the range")
+        return [Row(addr=starting_address + i, value=value) for i, value in enumerate(values)]
+
+    def _on_values_edited(self):
+        """Display the number of values to write, or the error."""
+        try:
+            register_rows = self._parse_rows()
+            self._ui.info_label.setText(f"{len(register_rows)} value(s) to write")
+            self._ui.valid_button.setEnabled(len(register_rows) > 0)
+        except ValueError as ex:
+            self._ui.info_label.setText(str(ex))
+            self._ui.valid_button.setEnabled(False)
+
+    def _write(self):
+        try:
+            register_rows = self._parse_rows()
+        except ValueError:
+            return
+        self.close()
+        self._callback_method(register_rows)
+
+    def _cancel(self):
+        self.close()
+
+    def _setup_ui(self):
+        """Load widgets and connect them to function."""
+        ui = block_write_ui.BlockWriteUI(self)
+        ui.values_edit.textChanged.connect(self._on_values_edited)
+        ui.start_address_edit.textChanged.connect(self._on_values_edited)
+        ui.valid_button.clicked.connect(self._write)
+        ui.cancel_button.clicked.connect(self._cancel)
+
+        return ui
@@ -58,9 +58,13 @@ class ComSettingsUI(object):
         self.port_edit = QLineEdit()
         self.port_edit.setValidator(Validators.DecValidator(0, 65535))
 
+        # TCP engine
+        self.tcp_engine_cb = QCustomComboBox()
+
         flo = QFormLayout()
         flo.addRow("IP or Hostname", self.IP_edit)
         flo.addRow("Port", self.port_edit)
+        flo.addRow("Engine", self.tcp_engine_cb)
         tcp_group_layout.addLayout(flo)
 
         # ****************************
@@ -98,8 +102,14 @@ class ComSettingsUI(object):
         self.timeout = QLineEdit()
         self.timeout.setValidator(Validators.FloatValidator(0.0, 60.0))
 
+        self.coalescing_gap_edit = QLineEdit()
+        self.coalescing_gap_edit.setValidator(Validators.DecValidator(0, 125))
+        self.coalescing_gap_edit.setToolTip("Maximum number of unused addresses read to merge the readings "
+                                            "of two ranges with the same unit ID and function")
+
         flo = QFormLayout()
         flo.addRow("Timeout (sec)", self.timeout)
+        flo.addRow("Merge reads gap (addresses)", self.coalescing_gap_edit)
         other_group_layout.addLayout(flo)
 
         # ****************************
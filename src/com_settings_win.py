@@ -34,10 +34,12 @@ class ComSettingsWin(QMainWindow):
         # General Settings
         self.mode = self.MbMode.TCP
         self.timeout = 5.0
+        self.coalescing_gap = 10
 
         # TCP Settings
         self.ip = "127.0.0.1"
         self.port = 502
+        self.tcp_engine = self.TcpEngine.MODBUS_TK
 
         # RTU Settings
         self.serial_port_name = ""
@@ -60,6 +62,10 @@ class ComSettingsWin(QMainWindow):
 
         self._ui.serial_port_name_cb.add_option(None, "None found")
 
+        self._ui.tcp_engine_cb.add_option(self.TcpEngine.MODBUS_TK, "Standard (one request at a time)",
+                                          set_as_current=True)
+        self._ui.tcp_engine_cb.add_option(self.TcpEngine.ASYNCIO, "Asyncio (pipelined requests)")
+
         self._ui.data_bits_cb.add_option(serial.FIVEBITS, "5"),
         self._ui.data_bits_cb.add_option(serial.SIXBITS, "6"),
         self._ui.data_bits_cb.add_option(serial.SEVENBITS, "7"),
@@ -80,6 +86,14 @@ class ComSettingsWin(QMainWindow):
         self._ui.flow_control_cb.add_option(self.FlowControl.RTS_CTS, "RTS/CTS (hardware)"),
         self._ui.flow_control_cb.add_option(self.FlowControl.DSR_DTR, "DSR/DTR (hardware)")
 
+    def set_call_back_func(self, call_back_func):
+        """
+        Set the function to call back when new settings are applied.
+
+        :param call_back_func: The function. It takes an optional auto_connect argument.
+        """
+        self._call_back_func = call_back_func
+
     def showEvent(self, event: QShowEvent) -> None:
         """Called when the settings menu is open"""
         self._refresh_serial_port()
@@ -111,6 +125,7 @@ class ComSettingsWin(QMainWindow):
         """save the settings close the menu and call the 'call back' function"""
         # General settings
         self.timeout = float(self._ui.timeout.text())
+        self.coalescing_gap = int(self._ui.coalescing_gap_edit.text())
         if self._ui.button_mode_TCP.isChecked():
             self.mode = self.MbMode.TCP
         else:
@@ -119,6 +134,7 @@ class ComSettingsWin(QMainWindow):
         # TCP settings
         self.ip = self._ui.IP_edit.text()
         self.port = int(self._ui.port_edit.text())
+        self.tcp_engine = self._ui.tcp_engine_cb.get_current_option_value()
 
         # RTU settings
         self.serial_port_name = self._ui.serial_port_name_cb.get_current_option_value()
@@ -141,12 +157,14 @@ class ComSettingsWin(QMainWindow):
         """Set widgets with the current parameter value"""
         # General settings
         self._ui.timeout.setText(str(self.timeout))
+        self._ui.coalescing_gap_edit.setText(str(self.coalescing_gap))
         self._ui.button_mode_TCP.setChecked(self.mode == self.MbMode.TCP)
         self._ui.button_mode_RTU.setChecked(self.mode == self.MbMode.RTU)
 
         # TCP settings
         self._ui.port_edit.setText(str(self.port))
         self._ui.IP_edit.setText(self.ip)
+        self._ui.tcp_engine_cb.set_current_by_value(self.tcp_engine)
         self._on_mode_changed()
 
         # RTU settings
@@ -172,9 +190,11 @@ class ComSettingsWin(QMainWindow):
         data = {
             "mode": self.mode,
             "timeout": self.timeout,
+            "coalescing_gap": self.coalescing_gap,
 
             "ip": self.ip,
             "port": self.port,
+            "tcp_engine": self.tcp_engine,
 
             "serial_port_name": self.serial_port_name,
             "baud_rate": self.baud_rate,
@@ -197,6 +217,7 @@ class ComSettingsWin(QMainWindow):
         # Write data into the widget. Because widget have value check.
         # General
         self._ui.timeout.setText(str(data.get("timeout", self.timeout)))
+        self._ui.coalescing_gap_edit.setText(str(data.get("coalescing_gap", self.coalescing_gap)))
         mode = data.get("mode", self.mode)
         self._ui.button_mode_TCP.setChecked(mode == self.MbMode.TCP)
         self._ui.button_mode_RTU.setChecked(mode == self.MbMode.RTU)
@@ -205,6 +226,7 @@ class ComSettingsWin(QMainWindow):
         # TCP settings
         self._ui.port_edit.setText(str(data.get("port", self.port)))
         self._ui.IP_edit.setText(data.get("ip", self.ip))
+        self._ui.tcp_engine_cb.set_current_by_value(data.get("tcp_engine", self.tcp_engine))
 
         # RTU settings
         self._ui.serial_port_name_cb.set_current_by_value(data.get("serial_port_name", self.serial_port_name))
@@ -223,6 +245,7 @@ class ComSettingsWin(QMainWindow):
         # general settings
         ui.mode_button_group.idClicked.connect(self._on_mode_changed)
         ui.timeout.setText(str(self.timeout))
+        ui.coalescing_gap_edit.setText(str(self.coalescing_gap))
 
         # TCP settings
         ui.port_edit.setText(str(self.port))
@@ -240,6 +263,11 @@ class ComSettingsWin(QMainWindow):
         TCP = 0
         RTU = 1
 
+    class TcpEngine:
+        """Enum of modbus TCP client implementation."""
+        MODBUS_TK = 0
+        ASYNCIO = 1
+
     class FlowControl:
         """Enum of flow control mode for serial com."""
         NONE = 0
@@ -0,0 +1,118 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+from com_settings_win import ComSettingsWin
+from poll_scheduler import PollScheduler
+
+
+class Connection:
+    """
+    Named connection profile: the communication settings, the modbus client and its own I/O worker.
+    """
+
+    def __init__(self, name: str, com_settings_win: ComSettingsWin):
+        """
+        Constructor
+
+        :param name: Name of the profile, referenced by the ranges.
+        :param com_settings_win: Communication settings of the profile and their menu.
+        """
+        self.name = name
+        self.com_settings_win = com_settings_win
+        self.modbus_client = None  # Not none when connected
+        self.poll_scheduler = None  # Executes the reading jobs of the ranges using this connection
+
+    def start_polling(self):
+        """Start the I/O worker of the connected client."""
+        self.stop_polling()
+        self.poll_scheduler = PollScheduler(self.modbus_client, self.com_settings_win.coalescing_gap)
+        self.poll_scheduler.start()
+
+    def stop_polling(self):
+        """Stop the I/O worker, if any."""
+        if self.poll_scheduler is not None:
+            self.poll_scheduler.stop()
+            self.poll_scheduler = None
+
+    def disconnect(self):
+        """Stop the I/O worker and close the client."""
+        self.stop_polling()
+        if self.modbus_client is not None:
+            self.modbus_client.close()
+            self.modbus_client = None
+
+    def export_config(self) -> dict:
+        """
+        Export configuration
+
+        :return: Return parameters into a dictionary.
+        """
+        return {
+            "name": self.name,
+            "com_settings": self.com_settings_win.export_config()
+        }
+
+
+class ConnectionPool:
+    """Ordered set of connection profiles, by name."""
+
+    def __init__(self):
+        self._connections = []
+
+    def __iter__(self):
+        return iter(list(self._connections))
+
+    def __len__(self):
+        return len(self._connections)
+
+    def add(self, connection: Connection):
+        """
+        Add a connection profile.
+
+        :param connection: The profile to add.
+        :raise ValueError: If a profile with the same name already exists.
+        """
+        if self.get(connection.name) is not None:
+            raise ValueError("The connection '{0}' already exists.".format(connection.name))
+        self._connections.append(connection)
+
+    def get(self, name: str):
+        """
+        Get a connection profile.
+
+        :param name: Name of the profile.
+        :return: The profile, or None if it does not exist.
+        """
+        for connection in self._connections:
+            if connection.name == name:
+                return connection
+        return None
+
+    def remove(self, connection: Connection):
+        """
+        Remove a connection profile. The profile is disconnected.
+
+        :param connection: The profile to remove.
+        """
+        connection.disconnect()
+        self._connections.remove(connection)
+
+    def names(self) -> list:
+        """
+        :return: The names of the profiles.
+        """
+        return [connection.name for connection in self._connections]
@@ -0,0 +1,170 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+
+from PyQt5.QtCore import *
+
+from custome_widgets.RegisterTableModel import RegisterTableModel
+
+
+class BitfieldTableModel(QAbstractTableModel):
+    """
+    Model of the bitfield view of a register table: each expanded register is shown as 16 rows, one per bit,
+    with a name per bit. The values are taken from the register model, and only the bits of the registers whose
+    value has changed are notified.
+    """
+    REGISTER_COLUMN = 0
+    BIT_COLUMN = 1
+    NAME_COLUMN = 2
+    VALUE_COLUMN = 3
+    HEADERS = ["Register", "Bit", "Name", "Value"]
+    BITS_PER_REGISTER = 16
+
+    def __init__(self, register_model: RegisterTableModel):
+        """
+        Constructor
+
+        :param register_model: The model of the register table.
+        """
+        super(BitfieldTableModel, self).__init__()
+        self._register_model = register_model
+        self._addresses = []  # Sorted addresses of the expanded registers
+        self._bit_names = {}  # (address, bit) -> name
+        register_model.dataChanged.connect(self._on_registers_changed)
+        register_model.modelReset.connect(self._on_registers_reset)
+        register_model.rowsInserted.connect(self._on_registers_reset)
+        register_model.rowsRemoved.connect(self._on_registers_reset)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._addresses) * self.BITS_PER_REGISTER
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole and role != Qt.ItemDataRole.EditRole:
+            return None
+        address, bit = self._get_bit(index.row())
+        column = index.column()
+        if column == self.REGISTER_COLUMN:
+            return str(address)
+        if column == self.BIT_COLUMN:
+            return str(bit)
+        if column == self.NAME_COLUMN:
+            return self._bit_names.get((address, bit), "")
+        return str(self.get_bit_value(address, bit))
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        flags = Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled
+        if index.column() == self.NAME_COLUMN:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if index.column() != self.NAME_COLUMN or role != Qt.ItemDataRole.EditRole:
+            return False
+        key = self._get_bit(index.row())
+        if value:
+            self._bit_names[key] = str(value)
+        else:
+            self._bit_names.pop(key, None)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def _get_bit(self, row: int) -> (int, int):
+        """
+        :param row: Index of the row.
+        :return: The address of the register and the bit number of the row.
+        """
+        return self._addresses[row // self.BITS_PER_REGISTER], row % self.BITS_PER_REGISTER
+
+    def get_bit_value(self, address: int, bit: int):
+        """
+        :param address: Address of the register.
+        :param bit: Bit number, 0 being the least significant one.
+        :return: The value of the bit, None if the register is not in the table or has not been read.
+        """
+        index = address - self._register_model.starting_address
+        if not 0 <= index < self._register_model.rowCount():
+            return None
+        value = self._register_model.get_value(index)
+        return None if value is None else (value >> bit) & 1
+
+    def get_expanded_addresses(self) -> list:
+        """
+        :return: The sorted addresses of the expanded registers.
+        """
+        return list(self._addresses)
+
+    def set_expanded(self, addresses: list, expanded: bool):
+        """
+        Expand or collapse registers.
+
+        :param addresses: Addresses of the registers.
+        :param expanded: True to show their bits, False to hide them.
+        """
+        new_addresses = set(self._addresses)
+        if expanded:
+            new_addresses.update(addresses)
+        else:
+            new_addresses.difference_update(addresses)
+        self.beginResetModel()
+        self._addresses = sorted(new_addresses)
+        self.endResetModel()
+
+    def get_bit_names(self) -> dict:
+        """
+        :return: The names of the bits, as (address, bit) -> name.
+        """
+        return dict(self._bit_names)
+
+    def set_bit_names(self, bit_names: dict):
+        """
+        Set the names of some bits.
+
+        :param bit_names: (address, bit) -> name, an empty name removes the name.
+        """
+        for key, name in bit_names.items():
+            if name:
+                self._bit_names[key] = str(name)
+            else:
+                self._bit_names.pop(key, None)
+        if self._addresses:
+            self.dataChanged.emit(self.index(0, self.NAME_COLUMN), self.index(self.rowCount() - 1, self.NAME_COLUMN))
+
+    def _on_registers_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles: list = ()):
+        """Notify the bits of the expanded registers whose value has changed."""
+        if not self._addresses or not top_left.column() <= RegisterTableModel.VALUE_COLUMN <= bottom_right.column():
+            return
+        starting_address = self._register_model.starting_address
+        first = bisect.bisect_left(self._addresses, starting_address + top_left.row())
+        end = bisect.bisect_right(self._addresses, starting_address + bottom_right.row())
+        if first < end:
+            self.dataChanged.emit(self.index(first * self.BITS_PER_REGISTER, self.VALUE_COLUMN),
+                                  self.index(end * self.BITS_PER_REGISTER - 1, self.VALUE_COLUMN),
+                                  [Qt.ItemDataRole.DisplayRole])
+
+    def _on_registers_reset(self):
+        if self._addresses:
+            self.dataChanged.emit(self.index(0, self.VALUE_COLUMN), self.index(self.rowCount() - 1, self.VALUE_COLUMN),
+                                  [Qt.ItemDataRole.DisplayRole])
@@ -0,0 +1,76 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+
+from custome_widgets.BitfieldTableModel import BitfieldTableModel
+from custome_widgets.RegisterTableModel import RegisterTableModel
+
+
+class BitfieldTableWidget(QTableView):
+    """Table of the bits of the expanded registers. It is hidden while no register is expanded."""
+    def __init__(self, register_model: RegisterTableModel):
+        super(BitfieldTableWidget, self).__init__()
+
+        self._model = BitfieldTableModel(register_model)
+        self.setModel(self._model)
+        self.verticalHeader().hide()
+        self.horizontalHeader().setStretchLastSection(True)
+        self.setStyleSheet("QTableView { "
+                           "background-color : #CFCFCF;"
+                           "border: 2px solid black;"
+                           "}")
+        self.hide()
+
+    def set_expanded(self, addresses: list, expanded: bool):
+        """
+        Show or hide the bits of registers
+        :param addresses: addresses of the registers
+        :param expanded: True to show the bits
+        """
+        self._model.set_expanded(addresses, expanded)
+        self.setVisible(self._model.rowCount() > 0)
+
+    def export_config(self) -> dict:
+        """
+        Export the expanded registers and the bit names
+
+        :return: Return a dict with the "addresses" list and the "names" dict ("address.bit" -> name).
+        """
+        return {"addresses": self._model.get_expanded_addresses(),
+                "names": {"{0}.{1}".format(address, bit): name
+                          for (address, bit), name in self._model.get_bit_names().items()}}
+
+    def import_config(self, config: dict):
+        """
+        Import the expanded registers and the bit names
+
+        :param config: A dict with the "addresses" list and the "names" dict ("address.bit" -> name).
+        """
+        if type(config) is not dict:
+            return
+        try:
+            bit_names = {}
+            for key, name in dict(config.get("names", {})).items():
+                address, bit = str(key).split(".")
+                bit_names[(int(address), int(bit))] = name
+            addresses = [int(address) for address in config.get("addresses", [])]
+        except (TypeError, ValueError):
+            return
+        self._model.set_bit_names(bit_names)
+        self.set_expanded(addresses, True)
@@ -0,0 +1,584 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+import array
+import operator
+
+from PyQt5.QtCore import *
+import modbus_tk.defines as cst
+
+import mb_protocol
+import utils
+from bit_array import BitArray, unpacked_to_int
+from register_row import RegisterRow as Row
+from defines import NumberDisplay
+from value_decoder import DecodingLayout, DataType, ByteOrder, DATA_TYPE_NAMES, INTEGER_BIT_COUNTS
+from value_formatter import ValueFormatter
+from trend_series import TrendSeries
+
+
+class RegisterTableModel(QAbstractTableModel):
+    """
+    Model of a register table: one row per address, with the address, a label, the engineering scaling,
+    the raw value, the value decoded with the data type of the range (or of the row) and the scaled value.
+    The register values are kept in a compact array, so the arrays delivered by the readers are compared and
+    copied through memoryviews. The bit values (coils and discrete inputs) are kept packed in a BitArray, and are
+    compared as integers. When new values are set, only the cells whose value has changed are notified, so the view
+    repaints them only. With a layout computed once, only the values that cover the changed rows are decoded
+    again, or the whole block in one pass for a large update.
+    The integer values are displayed in the base of the range, and their strings are cached.
+    The scaled values (decoded value x scale + offset, with the scale and offset of the row where the value
+    starts) are computed with the decoded values, with one mapping over the whole block for a full decoding.
+    """
+    ADDRESS_COLUMN = 0
+    LABEL_COLUMN = 1
+    SCALE_COLUMN = 2
+    OFFSET_COLUMN = 3
+    UNIT_COLUMN = 4
+    VALUE_COLUMN = 5
+    DECODED_COLUMN = 6
+    SCALED_COLUMN = 7
+    HEADERS = ["Address", "Label", "Scale", "Offset", "Unit", "Value", "Decoded", "Scaled"]
+    FULL_DECODING_RATIO = 16  # The whole block is decoded when more than 1 / FULL_DECODING_RATIO rows change
+
+    # The data types, the scaling or the labels of the rows have changed (see get_trend_series)
+    decoding_changed = pyqtSignal()
+
+    def __init__(self):
+        super(RegisterTableModel, self).__init__()
+        self._starting_address = 0
+        self._labels = []
+        self._scales = array.array('d')
+        self._offsets = array.array('d')
+        self._units = []
+        self._values = array.array('H')
+        self._is_read = BitArray()  # 1 for each address whose value is known
+
+        # Decoding of the registers
+        self._data_type = DataType.UINT16
+        self._byte_order = ByteOrder.BIG
+        self._word_order = ByteOrder.BIG
+        self._row_data_types = {}  # address -> data type, for the rows that do not use the type of the range
+        self._layout = None  # None for bits
+        self._decoded = []  # Decoded value of each row where a value starts, None for the other rows
+        self._formatter = ValueFormatter()
+
+        # Engineering scaling, for each number of the layout
+        self._number_scales = array.array('d')
+        self._number_offsets = array.array('d')
+        self._scaled = []  # Scaled value of each number of the layout
+
+    @property
+    def starting_address(self) -> int:
+        return self._starting_address
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._values)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole and role != Qt.ItemDataRole.EditRole:
+            return None
+        column = index.column()
+        if column == self.ADDRESS_COLUMN:
+            return str(self._starting_address + index.row())
+        if column == self.LABEL_COLUMN:
+            return self._labels[index.row()]
+        if column == self.SCALE_COLUMN:
+            return format(self._scales[index.row()], "g")
+        if column == self.OFFSET_COLUMN:
+            return format(self._offsets[index.row()], "g")
+        if column == self.UNIT_COLUMN:
+            return self._units[index.row()]
+        if column == self.VALUE_COLUMN:
+            value = self.get_value(index.row())
+            if value is None:
+                return str(value)
+            return self._formatter.format(value, 16 if self._layout is not None else 1)
+        if column == self.DECODED_COLUMN:
+            return self._format_decoded(index.row())
+        return self._format_scaled(index.row())
+
+    def _format_decoded(self, row: int) -> str:
+        """
+        :param row: Index of the row.
+        :return: The decoded value that starts at this row, empty if there is none or if it is not read.
+        """
+        if self._layout is None or self._decoded[row] is None or not self._is_read[row]:
+            return ""
+        value = self._decoded[row]
+        data_type = self._layout.value_types[row]
+        if data_type in INTEGER_BIT_COUNTS:
+            return self._formatter.format(value, INTEGER_BIT_COUNTS[data_type])
+        if type(value) is float:
+            return format(value, ".7g" if data_type == DataType.FLOAT32 else ".15g")
+        return str(value)
+
+    def _format_scaled(self, row: int) -> str:
+        """
+        :param row: Index of the row.
+        :return: The scaled number that starts at this row with its unit, empty if there is none or if it is
+            not read.
+        """
+        if self._layout is None or row not in self._layout.numeric_positions or not self._is_read[row]:
+            return ""
+        value = self._scaled[self._layout.numeric_positions[row]]
+        return (format(value, ".10g") + " " + self._units[row]).rstrip()
+
+    def set_number_display(self, number_display: NumberDisplay):
+        """
+        Change the base of the displayed integer values.
+
+        :param number_display: The base.
+        """
+        if number_display == self._formatter.number_display:
+            return
+        self._formatter.set_number_display(number_display)
+        if len(self._values):
+            self.dataChanged.emit(self.index(0, self.VALUE_COLUMN),
+                                  self.index(len(self._values) - 1, self.SCALED_COLUMN),
+                                  [Qt.ItemDataRole.DisplayRole])
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        flags = Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled
+        if index.column() in (self.LABEL_COLUMN, self.SCALE_COLUMN, self.OFFSET_COLUMN, self.UNIT_COLUMN):
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if role != Qt.ItemDataRole.EditRole:
+            return False
+        row = index.row()
+        column = index.column()
+        if column == self.LABEL_COLUMN:
+            self._labels[row] = str(value)
+            self.decoding_changed.emit()
+        elif column == self.UNIT_COLUMN:
+            self._units[row] = str(value)
+            self.decoding_changed.emit()
+        elif column == self.SCALE_COLUMN or column == self.OFFSET_COLUMN:
+            try:
+                number = float(value)
+            except ValueError:
+                return False
+            (self._scales if column == self.SCALE_COLUMN else self._offsets)[row] = number
+            self._update_scaling()
+        else:
+            return False
+        self.dataChanged.emit(index, index)
+        self.dataChanged.emit(self.index(row, self.SCALED_COLUMN), self.index(row, self.SCALED_COLUMN))
+        return True
+
+    def set_address_set(self, starting_address: int, quantity: int, read_func: cst, keep_rows: bool):
+        """
+        Change the addresses of the table.
+        If the rows are kept and the new range overlaps the old one, only the rows at the edges are inserted or
+        removed, so the view keeps its other rows.
+
+        :param starting_address: First address.
+        :param quantity: Number of addresses.
+        :param read_func: Modbus reading function of the values.
+        :param keep_rows: If True, the labels and values of the addresses that stay in the table are kept.
+            The function must be the same as before.
+        """
+        old_starting_address = self._starting_address
+        old_end_address = old_starting_address + len(self._values)
+        is_bits = mb_protocol.is_bit_function(read_func)
+        if (not keep_rows or is_bits != isinstance(self._values, BitArray)
+                or starting_address >= old_end_address or starting_address + quantity <= old_starting_address):
+            self.beginResetModel()
+            if not keep_rows:
+                self._row_data_types.clear()
+            self._reshape(starting_address, quantity, is_bits, keep_rows)
+            self.endResetModel()
+            return
+
+        # First edge
+        if starting_address < old_starting_address:
+            self.beginInsertRows(QModelIndex(), 0, old_starting_address - starting_address - 1)
+            self._reshape(starting_address, old_end_address - starting_address, is_bits)
+            self.endInsertRows()
+        elif starting_address > old_starting_address:
+            self.beginRemoveRows(QModelIndex(), 0, starting_address - old_starting_address - 1)
+            self._reshape(starting_address, old_end_address - starting_address, is_bits)
+            self.endRemoveRows()
+
+        # Last edge
+        row_count = old_end_address - starting_address
+        if quantity > row_count:
+            self.beginInsertRows(QModelIndex(), row_count, quantity - 1)
+            self._reshape(starting_address, quantity, is_bits)
+            self.endInsertRows()
+        elif quantity < row_count:
+            self.beginRemoveRows(QModelIndex(), quantity, row_count - 1)
+            self._reshape(starting_address, quantity, is_bits)
+            self.endRemoveRows()
+
+        # The values that span an edge are decoded differently
+        self._emit_decoded_changed()
+
+    def _reshape(self, starting_address: int, quantity: int, is_bits: bool, keep_rows: bool = True):
+        """
+        Change the addresses of the rows.
+
+        :param starting_address: First address.
+        :param quantity: Number of addresses.
+        :param is_bits: True for bit values, False for registers.
+        :param keep_rows: If True, the content of the addresses that stay in the table is copied, if the type of
+            values is the same.
+        """
+        labels = [""] * quantity
+        scales = array.array('d', [1.0]) * quantity
+        offsets = array.array('d', [0.0]) * quantity
+        units = [""] * quantity
+        if is_bits:
+            values = BitArray(quantity)
+        else:
+            values = array.array('H', bytes(2 * quantity))
+        is_read = BitArray(quantity)
+        if keep_rows and type(values) is type(self._values):
+            # Copy the overlapping part of the old rows
+            first = max(starting_address, self._starting_address)
+            end = min(starting_address + quantity, self._starting_address + len(self._values))
+            if first < end:
+                old_first = first - self._starting_address
+                new_first = first - starting_address
+                labels[new_first:new_first + end - first] = self._labels[old_first:old_first + end - first]
+                scales[new_first:new_first + end - first] = self._scales[old_first:old_first + end - first]
+                offsets[new_first:new_first + end - first] = self._offsets[old_first:old_first + end - first]
+                units[new_first:new_first + end - first] = self._units[old_first:old_first + end - first]
+                values[new_first:new_first + end - first] = self._values[old_first:old_first + end - first]
+                is_read[new_first:new_first + end - first] = self._is_read[old_first:old_first + end - first]
+
+        self._starting_address = starting_address
+        self._labels = labels
+        self._scales = scales
+        self._offsets = offsets
+        self._units = units
+        self._values = values
+        self._is_read = is_read
+        self._update_layout()
+
+    def set_decoding(self, data_type: str, byte_order: str, word_order: str):
+        """
+        Change the decoding of the registers.
+
+        :param data_type: Type of the values, one of DataType.
+        :param byte_order: Order of the bytes in a register, one of ByteOrder.
+        :param word_order: Order of the registers of a value, one of ByteOrder.
+        """
+        self._data_type = data_type
+        self._byte_order = byte_order
+        self._word_order = word_order
+        self._update_layout()
+        self._emit_decoded_changed()
+
+    def get_row_data_types(self) -> dict:
+        """
+        :return: The data type set for some rows, as address -> DataType.
+        """
+        return dict(self._row_data_types)
+
+    def set_row_data_types(self, row_data_types: dict):
+        """
+        Set the data type of some rows.
+
+        :param row_data_types: Address -> DataType, or None to use the type of the range.
+        """
+        for address, data_type in row_data_types.items():
+            if data_type is None:
+                self._row_data_types.pop(address, None)
+            elif data_type in DATA_TYPE_NAMES:
+                self._row_data_types[address] = data_type
+        self._update_layout()
+        self._emit_decoded_changed()
+
+    def _update_layout(self):
+        """Compute the layout of the values, and decode the registers."""
+        if isinstance(self._values, BitArray):  # Bits are not decoded
+            self._layout = None
+            self._decoded = []
+            self._update_scaling()
+            return
+        row_data_types = {address - self._starting_address: data_type
+                          for address, data_type in self._row_data_types.items()
+                          if 0 <= address - self._starting_address < len(self._values)}
+        self._layout = DecodingLayout(len(self._values), self._data_type, row_data_types,
+                                      self._byte_order, self._word_order)
+        self._update_scaling()
+
+    def _update_scaling(self):
+        """Gather the scaling of each number of the layout, and decode and scale the registers."""
+        if self._layout is None:
+            self._number_scales = array.array('d')
+            self._number_offsets = array.array('d')
+            self._scaled = []
+        else:
+            self._number_scales = array.array('d', [self._scales[start] for start in self._layout.numeric_starts])
+            self._number_offsets = array.array('d', [self._offsets[start] for start in self._layout.numeric_starts])
+            self._decode()
+        self.decoding_changed.emit()
+
+    def _emit_decoded_changed(self):
+        if len(self._values):
+            self.dataChanged.emit(self.index(0, self.DECODED_COLUMN),
+                                  self.index(len(self._values) - 1, self.SCALED_COLUMN),
+                                  [Qt.ItemDataRole.DisplayRole])
+
+    def get_value(self, index: int):
+        """
+        :param index: Index of the row.
+        :return: The value of the row, None if it has not been read.
+        """
+        return self._values[index] if self._is_read[index] else None
+
+    def get_values(self) -> list:
+        """
+        :return: The value of every row, None for the ones that have not been read.
+        """
+        return [self.get_value(i) for i in range(len(self._values))]
+
+    def values_view(self) -> memoryview:
+        """
+        :return: A read-only view of the value buffer: the registers, or the packed bits (least significant bit
+            first). The values of the rows that have not been read are 0.
+        """
+        if isinstance(self._values, BitArray):
+            return memoryview(self._values.tobytes())
+        return memoryview(self._values).toreadonly()
+
+    def set_value(self, index: int, value):
+        """
+        Set the value of a row.
+
+        :param index: Index of the row.
+        :param value: The new value, None if unknown.
+        """
+        if not 0 <= index < len(self._values):
+            return
+        if value is None:
+            self._is_read[index] = 0
+        else:
+            self._values[index] = value
+            self._is_read[index] = 1
+        self._decode_rows([index])
+        self._emit_values_changed(index, index)
+
+    def set_values(self, values, first_index: int = 0):
+        """
+        Set the values of consecutive rows. Only the cells whose value has changed are notified.
+
+        :param values: The new values, an array (best with the typecode of mb_protocol.values_typecode) or any
+            sequence of int.
+        :param first_index: Index of the row of the first value.
+        """
+        end_index = min(first_index + len(values), len(self._values))
+        if end_index <= first_index:
+            return
+        if isinstance(self._values, BitArray):
+            self._set_bits(values[:end_index - first_index], first_index, end_index)
+            return
+        if not isinstance(values, array.array) or values.typecode != self._values.typecode:
+            values = array.array(self._values.typecode, values)
+        view = memoryview(self._values)[first_index:end_index]
+        new_view = memoryview(values)[:end_index - first_index]
+
+        if not self._is_read.all(first_index, end_index):
+            # Rows without value are displayed: repaint all of them
+            view[:] = new_view
+            self._is_read.fill(first_index, end_index, 1)
+            self._decode_rows(range(first_index, end_index))
+            self._emit_values_changed(first_index, end_index - 1)
+            return
+
+        changed_indexes = utils.find_changed_indexes(view, new_view)
+        if changed_indexes:
+            view[:] = new_view
+            indexes = [first_index + i for i in changed_indexes]
+            self._decode_rows(indexes)
+            self._emit_runs_changed(indexes)
+
+    def _set_bits(self, values, first_index: int, end_index: int):
+        """
+        Set the bits of consecutive rows. Only the cells whose value has changed are notified.
+
+        :param values: The new bits, one item 0 or 1 per bit.
+        :param first_index: Index of the row of the first bit.
+        :param end_index: Index after the row of the last bit.
+        """
+        bits = unpacked_to_int(values)
+        if not self._is_read.all(first_index, end_index):
+            self._values.set_bits(first_index, end_index, bits)
+            self._is_read.fill(first_index, end_index, 1)
+            self._emit_values_changed(first_index, end_index - 1)
+            return
+
+        changed_indexes = self._values.changed_indexes(first_index, end_index, bits)
+        if changed_indexes:
+            self._values.set_bits(first_index, end_index, bits)
+            self._emit_runs_changed([first_index + i for i in changed_indexes])
+
+    def set_changed_values(self, changes: list):
+        """
+        Set the values of some rows. The block is decoded once for all the changes.
+
+        :param changes: (index, new value) tuples, sorted by index. A value None marks the row as not read.
+        """
+        indexes = []
+        for index, value in changes:
+            if 0 <= index < len(self._values):
+                if value is None:
+                    self._is_read[index] = 0
+                else:
+                    self._values[index] = value
+                    self._is_read[index] = 1
+                indexes.append(index)
+        if indexes:
+            self._decode_rows(indexes)
+            self._emit_runs_changed(indexes)
+
+    def _decode(self):
+        """Decode and scale the whole block in one pass."""
+        if self._layout is not None:
+            self._decoded, numbers = self._layout.decode(self._values)
+            self._scaled = list(map(operator.add, map(operator.mul, numbers, self._number_scales),
+                                    self._number_offsets))
+
+    def _decode_rows(self, indexes):
+        """
+        Decode and scale only the values that cover some rows, for example the rows that have changed.
+
+        :param indexes: Indexes of the rows.
+        """
+        if self._layout is None:
+            return
+        if len(indexes) > len(self._values) // self.FULL_DECODING_RATIO:
+            self._decode()  # Faster in one pass
+            return
+        value_starts = self._layout.value_starts
+        for start in {value_starts[index] for index in indexes}:
+            if start < 0:  # Register not covered by a value
+                continue
+            value = self._layout.decode_value(self._values, start)
+            self._decoded[start] = value
+            position = self._layout.numeric_positions.get(start)
+            if position is not None:
+                self._scaled[position] = value * self._number_scales[position] + self._number_offsets[position]
+
+    def get_scaled_values(self) -> list:
+        """
+        :return: The scaled value of each number of the block, as (address, value) tuples. The values are the
+            ones computed at the last update.
+        """
+        if self._layout is None:
+            return []
+        return list(zip([self._starting_address + start for start in self._layout.numeric_starts], self._scaled))
+
+    def _emit_runs_changed(self, indexes: list):
+        """Notify the changed rows, with one notification per run of consecutive rows."""
+        run_first = run_last = None  # Current run of consecutive changed rows
+        for index in indexes:
+            if run_last is not None and index == run_last + 1:
+                run_last = index
+                continue
+            if run_first is not None:
+                self._emit_values_changed(run_first, run_last)
+            run_first = run_last = index
+        if run_first is not None:
+            self._emit_values_changed(run_first, run_last)
+
+    def _emit_values_changed(self, first_index: int, last_index: int):
+        """Notify the values of some rows, and the decoded values that cover them."""
+        last_column = self.VALUE_COLUMN
+        if self._layout is not None:
+            last_column = self.SCALED_COLUMN
+            if self._layout.value_starts[first_index] >= 0:
+                first_index = self._layout.value_starts[first_index]
+        self.dataChanged.emit(self.index(first_index, self.VALUE_COLUMN),
+                              self.index(last_index, last_column),
+                              [Qt.ItemDataRole.DisplayRole])
+
+    def get_label(self, index: int) -> str:
+        return self._labels[index]
+
+    def set_label(self, index: int, label: str):
+        self.setData(self.index(index, self.LABEL_COLUMN), label)
+
+    def get_scaling(self, index: int) -> (float, float, str):
+        """
+        :param index: Index of the row.
+        :return: The scale, the offset and the unit of the row.
+        """
+        return self._scales[index], self._offsets[index], self._units[index]
+
+    def set_scalings(self, scales: list, offsets: list, units: list):
+        """
+        Set the scaling of the first rows. Each list can be shorter than the table.
+
+        :param scales: Scale of each row.
+        :param offsets: Offset of each row.
+        :param units: Unit of each row.
+        """
+        for row, scale in enumerate(scales[:len(self._scales)]):
+            self._scales[row] = float(scale)
+        for row, offset in enumerate(offsets[:len(self._offsets)]):
+            self._offsets[row] = float(offset)
+        for row, unit in enumerate(units[:len(self._units)]):
+            self._units[row] = str(unit)
+        self._update_scaling()
+        if len(self._values):
+            self.dataChanged.emit(self.index(0, self.SCALE_COLUMN), self.index(len(self._values) - 1,
+                                                                               self.SCALED_COLUMN))
+
+    def get_trend_series(self, indexes: list) -> list:
+        """
+        Describe the numbers that cover some rows, to plot them decoded and scaled like in the table.
+
+        :param indexes: Indexes of the rows.
+        :return: One TrendSeries per number, in the order of the rows. The strings are not plotted.
+        """
+        series = []
+        starts = set()
+        for index in indexes:
+            if not 0 <= index < len(self._values):
+                continue
+            if self._layout is None:  # Bits: the raw values
+                series.append(TrendSeries(self._starting_address + index, label=self._labels[index]))
+                continue
+            start = self._layout.value_starts[index]
+            if start < 0 or start in starts or self._layout.value_types[start] == DataType.STRING:
+                continue
+            starts.add(start)
+            series.append(TrendSeries(self._starting_address + start, self._layout.value_types[start],
+                                      self._byte_order, self._word_order, self._scales[start], self._offsets[start],
+                                      self._units[start], self._labels[start]))
+        return series
+
+    def get_row(self, index: int) -> Row:
+        """
+        Get the content of a row.
+
+        :param index: Index of the row.
+        :return: The row.
+        """
+        return Row(addr=self._starting_address + index, label=self._labels[index], value=self.get_value(index))
@@ -18,26 +18,37 @@ from PyQt5.QtGui import *
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 import modbus_tk.defines as cst
+import mb_protocol
 from register_row import RegisterRow as Row
+from custome_widgets.RegisterTableModel import RegisterTableModel
+from defines import NumberDisplay
+from value_decoder import DATA_TYPE_NAMES
 
 
-class RegisterTableWidget(QTableWidget):
+class RegisterTableWidget(QTableView):
+    # Asks to show (True) or hide (False) the bits of the registers at the given addresses
+    bits_expansion_requested = pyqtSignal(list, bool)
+    # Index of the first displayed row and index after the last one, when the displayed rows change
+    visible_rows_changed = pyqtSignal(int, int)
+    # Asks to plot the values of the given addresses over time
+    trend_requested = pyqtSignal(list)
+
     def __init__(self):
         super(RegisterTableWidget, self).__init__()
 
-        self.setColumnCount(3)
-        self.setHorizontalHeaderLabels(["Address", "Label", "Value"])
+        self._model = RegisterTableModel()
+        self.setModel(self._model)
         self.verticalHeader().hide()
-        self.setStyleSheet("QTableWidget { "
+        self.horizontalHeader().setStretchLastSection(True)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self._open_context_menu)
+        self.verticalScrollBar().valueChanged.connect(self._emit_visible_rows)
+        self.setStyleSheet("QTableView { "
                            "background-color : #CFCFCF;"
                            "border: 2px solid black;"
                            "}")
 
-        self._register_values = []
-
         # Default parameters
-        self._starting_address = 0
-        self._quantity = 0
         self._read_func = None
         self._write_func = None
 
@@ -49,38 +60,134 @@ class RegisterTableWidget(QTableWidget):
         :param read_func: Modbus function for read access
         :param write_func: Modbus function for writ access
         """
+        # Keep the rows that fit into the new range.
+        self._model.set_address_set(new_starting_address, new_quantity, read_func, read_func == self._read_func)
 
-        # Save old row
-        old_row = []
-        for i in range(self._quantity):
-            old_row.append(self.get_row(i))
-
-        self._register_values.clear()
-        self.setRowCount(new_quantity)
-
-        for i in range(new_quantity):
-            # Keep the rows that fit into the new range.
-            index_of_the_old_list = (new_starting_address - self._starting_address + i)
-            if (0 <= index_of_the_old_list < self._quantity) and read_func == self._read_func:
-                # Keeps the old row.
-                self._register_values.append(old_row[index_of_the_old_list].register_value)
-                self.set_row_by_index(i, old_row[index_of_the_old_list])
-            else:
-                # Create a new row.
-                item = QTableWidgetItem(str(new_starting_address + i))
-                item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
-                self.setItem(i, 0, item)  # column 0 : modbus address
-                self.setItem(i, 1, QTableWidgetItem(""))  # column 1 : libelle
-                self._register_values.append(None)
+        # Bits are not decoded nor scaled
+        for column in (RegisterTableModel.SCALE_COLUMN, RegisterTableModel.OFFSET_COLUMN,
+                       RegisterTableModel.UNIT_COLUMN, RegisterTableModel.DECODED_COLUMN,
+                       RegisterTableModel.SCALED_COLUMN):
+            self.setColumnHidden(column, mb_protocol.is_bit_function(read_func))
 
         # save new parameters
-        self._starting_address = new_starting_address
-        self._quantity = new_quantity
         self._write_func = write_func
         self._read_func = read_func
+        self._emit_visible_rows()
+
+    def get_visible_rows(self) -> (int, int):
+        """
+        Get the displayed rows. Only these rows are rendered, whatever the size of the table.
+        :return: index of the first displayed row and index after the last one
+        """
+        row_count = self._model.rowCount()
+        if row_count == 0:
+            return 0, 0
+        first_row = self.rowAt(0)
+        last_row = self.rowAt(self.viewport().height() - 1)
+        if first_row < 0:
+            first_row = 0
+        if last_row < 0:
+            last_row = row_count - 1
+        return first_row, last_row + 1
+
+    def resizeEvent(self, event: QResizeEvent):
+        super(RegisterTableWidget, self).resizeEvent(event)
+        self._emit_visible_rows()
 
-        # Update register value
-        self.set_register_values(self._register_values)
+    def _emit_visible_rows(self):
+        self.visible_rows_changed.emit(*self.get_visible_rows())
+
+    def set_decoding(self, data_type: str, byte_order: str, word_order: str):
+        """
+        Change the decoding of the registers
+        :param data_type: type of the values, one of value_decoder.DataType
+        :param byte_order: order of the bytes in a register, one of value_decoder.ByteOrder
+        :param word_order: order of the registers of a value, one of value_decoder.ByteOrder
+        """
+        self._model.set_decoding(data_type, byte_order, word_order)
+
+    def set_number_display(self, number_display: NumberDisplay):
+        """
+        Change the base of the displayed integer values
+        :param number_display: the base
+        """
+        self._model.set_number_display(number_display)
+
+    def get_row_data_types(self) -> dict:
+        """
+        Get the data types set for some rows
+        :return: address -> data type
+        """
+        return self._model.get_row_data_types()
+
+    def set_row_data_types(self, row_data_types: dict):
+        """
+        Set the data type of some rows
+        :param row_data_types: address -> data type, None to use the type of the range
+        """
+        self._model.set_row_data_types(row_data_types)
+
+    def export_scalings(self) -> dict:
+        """
+        Export the engineering scaling of the rows
+
+        :return: A dict with the "scales", "offsets" and "units" lists, one item per row.
+        """
+        scalings = [self._model.get_scaling(i) for i in range(self._model.rowCount())]
+        return {"scales": [scaling[0] for scaling in scalings],
+                "offsets": [scaling[1] for scaling in scalings],
+                "units": [scaling[2] for scaling in scalings]}
+
+    def import_scalings(self, scalings: dict):
+        """
+        Import the engineering scaling of the rows
+
+        :param scalings: A dict with the "scales", "offsets" and "units" lists, one item per row.
+        """
+        if type(scalings) is not dict:
+            return
+        try:
+            self._model.set_scalings(list(scalings.get("scales", [])), list(scalings.get("offsets", [])),
+                                     list(scalings.get("units", [])))
+        except (TypeError, ValueError):
+            pass
+
+    def get_scaled_values(self) -> list:
+        """
+        Get the scaled values
+        :return: a list of (address, scaled value) tuples, one per decoded value
+        """
+        return self._model.get_scaled_values()
+
+    def _open_context_menu(self, position: QPoint):
+        """Opens the menu to plot the selected rows, set their data type or show their bits."""
+        addresses = [row.register_addr for row in self.get_selected_rows()]
+        if not addresses:
+            return
+
+        menu = QMenu(self)
+        action = menu.addAction("Plot trend")
+        action.triggered.connect(lambda: self.trend_requested.emit(addresses))
+        if mb_protocol.is_bit_function(self._read_func):
+            menu.exec(self.viewport().mapToGlobal(position))
+            return
+
+        menu.addSeparator()
+        type_menu = menu.addMenu("Data type")
+        action = type_menu.addAction("Type of the range")
+        action.triggered.connect(lambda: self.set_row_data_types({address: None for address in addresses}))
+        type_menu.addSeparator()
+        for data_type, name in DATA_TYPE_NAMES.items():
+            action = type_menu.addAction(name)
+            action.triggered.connect(
+                lambda checked, data_type=data_type: self.set_row_data_types(
+                    {address: data_type for address in addresses}))
+        menu.addSeparator()
+        action = menu.addAction("Show bits")
+        action.triggered.connect(lambda: self.bits_expansion_requested.emit(addresses, True))
+        action = menu.addAction("Hide bits")
+        action.triggered.connect(lambda: self.bits_expansion_requested.emit(addresses, False))
+        menu.exec(self.viewport().mapToGlobal(position))
 
     def get_row(self, index) -> Row:
         """
@@ -88,15 +195,7 @@ class RegisterTableWidget(QTableWidget):
         :param index: index of the row
         :return: the row
         """
-        try:
-            value = int(self.item(index, 2).text())
-        except ValueError:
-            value = None
-
-        row = Row(addr=int(self.item(index, 0).text()),
-                  label=(self.item(index, 1).text()),
-                  value=value)
-        return row
+        return self._model.get_row(index)
 
     def set_row_by_index(self, index: int, row: Row):
         """
@@ -105,9 +204,8 @@ class RegisterTableWidget(QTableWidget):
         :param row: the content of the row
         :return:
         """
-        self.setItem(index, 0, QTableWidgetItem(str(row.register_addr)))
-        self.setItem(index, 1, QTableWidgetItem(str(row.label)))
-        self.setItem(index, 2, QTableWidgetItem(str(row.register_value)))
+        self._model.set_label(index, row.label)
+        self._model.set_value(index, row.register_value)
 
     def set_row(self, row: Row):
         """
@@ -115,22 +213,65 @@ class RegisterTableWidget(QTableWidget):
         :param row: the content of the row
         :return:
         """
-        index = row.register_addr - self._starting_address
+        index = row.register_addr - self._model.starting_address
         self.set_row_by_index(index, row)
 
-    def set_register_values(self, values: list):
-        self._register_values = values
-        self._update_value_display()
+    def get_trend_series(self, addresses: list) -> list:
+        """
+        Describe the numbers of some rows, to plot them decoded and scaled like in the table
+        :param addresses: addresses of the rows
+        :return: one TrendSeries per number
+        """
+        return self._model.get_trend_series([address - self._model.starting_address for address in addresses])
+
+    def set_row_value(self, row: Row):
+        """
+        Set the value of a row, keeping its label
+        :param row: the address and the value of the row
+        """
+        self.set_row_values([row])
+
+    def set_row_values(self, rows: list):
+        """
+        Set the values of several rows at once, keeping their labels
+        :param rows: the addresses and the values of the rows
+        """
+        changes = sorted(((row.register_addr - self._model.starting_address, row.register_value) for row in rows),
+                         key=lambda change: change[0])
+        self._model.set_changed_values(changes)
+
+    def get_selected_rows(self) -> list:
+        """
+        Get the content of the selected rows
+        :return: the rows, sorted by address
+        """
+        indexes = sorted(set(index.row() for index in self.selectedIndexes()))
+        return [self.get_row(i) for i in indexes]
+
+    def set_register_values(self, values: list, first_index: int = 0):
+        """
+        Display new values. Only the cells whose value has changed are repainted.
+        :param values: values of consecutive rows
+        :param first_index: index of the row of the first value
+        """
+        self._model.set_values(values, first_index)
 
-    def _update_value_display(self):
-        for i in range(self._quantity):
-            # column 2 : value
-            item = QTableWidgetItem(str(self._register_values[i]))
-            item.setFlags(Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
-            self.setItem(i, 2, item)  # column 2 : value
+    def set_changed_values(self, changes: list):
+        """
+        Display the values that have changed.
+        :param changes: (index, new value) tuples, sorted by index
+        """
+        self._model.set_changed_values(changes)
 
     def get_register_values(self) -> list:
-        return self._register_values
+        return self._model.get_values()
+
+    def get_values_view(self) -> memoryview:
+        """
+        Get the displayed values without copy
+        :return: read-only view of the value buffer, 0 for the values not read
+        """
+        return self._model.values_view()
 
     def export_config(self) -> list:
         """
@@ -138,11 +279,7 @@ class RegisterTableWidget(QTableWidget):
 
         :return: Return a list of labels.
         """
-        labels = []
-        for i in range(self.rowCount()):
-            item = self.item(i, 1)
-            labels.append(item.text())
-        return labels
+        return [self._model.get_label(i) for i in range(self._model.rowCount())]
 
     def import_config(self, labels: list):
         """
@@ -153,7 +290,5 @@ class RegisterTableWidget(QTableWidget):
         if type(labels) is not list:
             return
 
-        for i in range(min(self._quantity, len(labels))):
-            # column 1 : label
-            item = QTableWidgetItem(str(labels[i]))
-            self.setItem(i, 1, item)
+        for i in range(min(self._model.rowCount(), len(labels))):
+            self._model.set_label(i, str(labels[i]))
@@ -0,0 +1,152 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+
+from history_buffer import HistoryBuffer
+from min_max_decimator import MinMaxDecimator
+from trend_series import TrendSeries
+
+
+class TrendPlotWidget(QWidget):
+    """
+    Plot of some numbers of a range over the last seconds, decoded and scaled like in the register table (see
+    TrendSeries). Each series is decimated into one min/max bucket
+    per pixel column, so the drawing cost depends on the width of the widget, not on the number of samples.
+    The buckets are computed from the history when the width or the time span changes, and updated sample by
+    sample afterwards.
+    """
+    COLORS = [Qt.GlobalColor.blue, Qt.GlobalColor.red, Qt.GlobalColor.darkGreen, Qt.GlobalColor.magenta,
+              Qt.GlobalColor.darkYellow, Qt.GlobalColor.darkCyan, Qt.GlobalColor.black, Qt.GlobalColor.darkRed]
+    MARGIN = 4  # pixel
+
+    def __init__(self):
+        super(TrendPlotWidget, self).__init__()
+        self.setMinimumSize(200, 100)
+        self._history = None
+        self._series = []  # TrendSeries of each plotted number
+        self._decimators = []  # Decimator of each series
+        self._span = 60.0  # Displayed duration, in second
+        self._last_time = None  # Time of the newest sample
+
+    def set_history(self, history: HistoryBuffer):
+        """
+        Set the history used to compute the plot when it is resized.
+        :param history: history of the range of the addresses
+        """
+        self._history = history
+        self._rebuild()
+
+    def set_series(self, series: list):
+        """
+        Set the plotted numbers
+        :param series: one TrendSeries per number
+        """
+        self._series = list(series)
+        self._rebuild()
+
+    def set_span(self, span: float):
+        """
+        Set the displayed duration
+        :param span: duration in second
+        """
+        self._span = span
+        self._rebuild()
+
+    def append(self, timestamp: float, starting_address: int, values):
+        """
+        Add a reading to the series whose address has been read.
+        :param timestamp: time.monotonic() of the reading
+        :param starting_address: address of the first value
+        :param values: values of consecutive addresses
+        """
+        for series, decimator in zip(self._series, self._decimators):
+            value = series.get_value(starting_address, values)
+            if value is not None:
+                decimator.append(timestamp, value)
+        self._last_time = timestamp
+        self.update()
+
+    def _plot_width(self) -> int:
+        return max(self.width() - 2 * self.MARGIN, 1)
+
+    def _rebuild(self):
+        """Compute the buckets of every series from the history."""
+        bucket_duration = self._span / self._plot_width()
+        self._decimators = [MinMaxDecimator(bucket_duration, self._plot_width()) for _ in self._series]
+        self._last_time = None
+        if self._history is not None and len(self._history):
+            since = self._history.get_times()[-1] - self._span
+            for series, decimator in zip(self._series, self._decimators):
+                try:
+                    times, values = series.get_history(self._history, since)
+                except IndexError:  # No longer in the range
+                    continue
+                decimator.rebuild(times, values)
+                if len(times):
+                    self._last_time = times[-1]
+        self.update()
+
+    def resizeEvent(self, event: QResizeEvent):
+        super(TrendPlotWidget, self).resizeEvent(event)
+        self._rebuild()
+
+    def paintEvent(self, event: QPaintEvent):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.GlobalColor.white)
+        series = [decimator.get_buckets() for decimator in self._decimators]
+        buckets = [bucket for buckets in series for bucket in buckets]
+        if self._last_time is None or not buckets:
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "No value")
+            return
+
+        # Vertical scale
+        minimum = min(bucket[1] for bucket in buckets)
+        maximum = max(bucket[2] for bucket in buckets)
+        if maximum == minimum:
+            minimum -= 1
+            maximum += 1
+        top = self.MARGIN
+        height = max(self.height() - 2 * self.MARGIN, 1)
+        y_scale = height / (maximum - minimum)
+
+        # The newest bucket is on the right
+        right = self.MARGIN + self._plot_width() - 1
+        last_bucket = int(self._last_time // (self._span / self._plot_width()))
+
+        for i, buckets in enumerate(series):
+            painter.setPen(QPen(self.COLORS[i % len(self.COLORS)]))
+            points = QPolygonF()
+            for bucket, bucket_minimum, bucket_maximum in buckets:
+                x = right - (last_bucket - bucket)
+                points.append(QPointF(x, top + (maximum - bucket_minimum) * y_scale))
+                points.append(QPointF(x, top + (maximum - bucket_maximum) * y_scale))
+            painter.drawPolyline(points)
+
+        # Scale and legend
+        painter.setPen(QPen(Qt.GlobalColor.gray))
+        metrics = painter.fontMetrics()
+        painter.drawText(self.MARGIN, top + metrics.ascent(), "{0:g}".format(maximum))
+        painter.drawText(self.MARGIN, top + height - metrics.descent(), "{0:g}".format(minimum))
+        x = self.MARGIN + metrics.horizontalAdvance("{0:g}".format(maximum)) + 3 * self.MARGIN
+        for i, series in enumerate(self._series):
+            painter.setPen(QPen(self.COLORS[i % len(self.COLORS)]))
+            text = series.name
+            painter.drawText(x, top + metrics.ascent(), text)
+            x += metrics.horizontalAdvance(text) + 2 * self.MARGIN
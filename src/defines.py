@@ -26,3 +26,32 @@ class NumberDisplay(Enum):
     OCT = 2  # Octal (Base-8)
     DEC = 3  # Decimal  (Base-10)
     HEX = 4  # Hexadecimal (Base-16)
+
+
+# Maximum quantity of items per read request, defined by the Modbus application protocol specification.
+MAX_READ_BITS = 2000  # FC01, FC02
+MAX_READ_REGISTERS = 125  # FC03, FC04
+
+# Maximum quantity of items per write request, defined by the Modbus application protocol specification.
+MAX_WRITE_BITS = 1968  # FC15
+MAX_WRITE_REGISTERS = 123  # FC16
+
+# Periodic readings of larger ranges only read the displayed rows, plus a margin of VISIBLE_ROWS_MARGIN rows on
+# each side, so a whole address space can be browsed live.
+MAX_FULLY_POLLED_QUANTITY = 2000
+VISIBLE_ROWS_MARGIN = 50
+
+# Limits of the poll period of a range (millisecond) and of the refresh rate of its table (refreshes per second).
+MIN_POLL_PERIOD = 10
+MAX_POLL_PERIOD = 3600000
+MIN_REFRESH_RATE = 1
+MAX_REFRESH_RATE = 100
+
+# Maximum memory used by the history of the readings of a range, in bytes. A longer history is shortened.
+MAX_HISTORY_MEMORY = 64 * 1024 * 1024
+
+# Maximum number of TCP requests sent before waiting for the first response.
+MAX_TCP_REQUESTS_IN_FLIGHT = 8
+
+# Name of the connection profile that exists at startup.
+DEFAULT_CONNECTION_NAME = "Default"
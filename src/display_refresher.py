@@ -0,0 +1,94 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+
+from custome_widgets.RegisterTableWidget import RegisterTableWidget
+
+
+class DisplayRefresher(QObject):
+    """
+    Display stage between a reader and a register table. The values received are only stored, and the table is
+    refreshed at most at the frame rate with the newest values: the samples received in between are merged,
+    so the display never lags behind the device when the reading is faster than the rendering.
+    """
+
+    def __init__(self, table_widget: RegisterTableWidget, frame_rate: int = 20):
+        """
+        Constructor
+
+        :param table_widget: The table that displays the values.
+        :param frame_rate: Maximum number of refreshes per second.
+        """
+        super(DisplayRefresher, self).__init__()
+        self._table_widget = table_widget
+        self._frame_interval = 1.0 / frame_rate  # second
+        self._last_refresh_time = 0.0
+
+        self._pending_snapshot = None  # Newest (index of the first value, array of the values read)
+        self._pending_changes = {}  # index -> newest value, changed since the pending snapshot
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.refresh)
+
+    def set_frame_rate(self, frame_rate: int):
+        """
+        :param frame_rate: Maximum number of refreshes per second.
+        """
+        self._frame_interval = 1.0 / frame_rate
+
+    def on_snapshot(self, cycle: int, first_index: int, values):
+        """Store all the values read. The older pending values are dropped."""
+        self._pending_snapshot = (first_index, values)
+        self._pending_changes.clear()
+        self._schedule_refresh()
+
+    def on_changed(self, cycle: int, changes: list):
+        """Store the changed values, over the pending ones."""
+        self._pending_changes.update(changes)
+        self._schedule_refresh()
+
+    def clear(self):
+        """Drop the pending values."""
+        self._timer.stop()
+        self._pending_snapshot = None
+        self._pending_changes.clear()
+
+    def refresh(self):
+        """Display the pending values now."""
+        self._timer.stop()
+        self._last_refresh_time = time.monotonic()
+        if self._pending_snapshot is not None:
+            first_index, values = self._pending_snapshot
+            self._table_widget.set_register_values(values, first_index)
+        if self._pending_changes:
+            self._table_widget.set_changed_values(sorted(self._pending_changes.items()))
+        self._pending_snapshot = None
+        self._pending_changes.clear()
+
+    def _schedule_refresh(self):
+        """Refresh right away if the last refresh is older than a frame, else at the next frame."""
+        if self._timer.isActive():
+            return
+        delay = self._last_refresh_time + self._frame_interval - time.monotonic()
+        if delay <= 0:
+            self.refresh()
+        else:
+            self._timer.start(int(delay * 1000) + 1)
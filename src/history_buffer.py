@@ -0,0 +1,190 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import array
+import bisect
+
+import defines
+
+
+def memory_size(quantity: int, capacity: int, typecode: str = 'H') -> int:
+    """
+    :param quantity: Number of addresses.
+    :param capacity: Number of samples kept.
+    :param typecode: Typecode of the values (see mb_protocol.values_typecode).
+    :return: The number of bytes used by a HistoryBuffer.
+    """
+    return capacity * (quantity * array.array(typecode).itemsize + array.array('d').itemsize)
+
+
+def max_capacity(quantity: int, typecode: str = 'H') -> int:
+    """
+    :param quantity: Number of addresses.
+    :param typecode: Typecode of the values (see mb_protocol.values_typecode).
+    :return: The largest number of samples of a HistoryBuffer that fits in defines.MAX_HISTORY_MEMORY.
+    """
+    return defines.MAX_HISTORY_MEMORY // memory_size(quantity, 1, typecode)
+
+
+class HistoryBuffer:
+    """
+    Keeps the last samples of a range in memory. The values are stored in a ring buffer allocated once, of
+    capacity rows (samples) x quantity columns (addresses), with the time of each sample.
+    A sample is appended in constant time, whatever the capacity: a reading of a part of the range (see
+    MbRegisterReader.set_window) is completed with the values of the previous sample.
+    The history of an address is extracted with strided memoryview slices of the buffer, without a Python
+    object per sample.
+    """
+
+    def __init__(self, starting_address: int, quantity: int, capacity: int, typecode: str = 'H'):
+        """
+        Constructor
+
+        :param starting_address: First address.
+        :param quantity: Number of addresses.
+        :param capacity: Maximum number of samples kept, limited by defines.MAX_HISTORY_MEMORY.
+        :param typecode: Typecode of the values (see mb_protocol.values_typecode).
+        :raise MemoryError: If the buffer cannot be allocated.
+        """
+        self.starting_address = starting_address
+        self.quantity = quantity
+        self.capacity = capacity = min(capacity, max_capacity(quantity, typecode))
+        self._values = array.array(typecode, bytes(capacity * quantity * array.array(typecode).itemsize))
+        self._times = array.array('d', bytes(capacity * array.array('d').itemsize))
+        self._count = 0  # Number of samples kept
+        self._next = 0  # Row of the next sample
+
+    @property
+    def typecode(self) -> str:
+        return self._values.typecode
+
+    def __len__(self) -> int:
+        return self._count
+
+    def memory_size(self) -> int:
+        """
+        :return: The number of bytes of the buffer.
+        """
+        return len(self._values) * self._values.itemsize + len(self._times) * self._times.itemsize
+
+    def clear(self):
+        """Forget every sample."""
+        self._count = 0
+        self._next = 0
+
+    def append(self, timestamp: float, starting_address: int, values):
+        """
+        Append a sample. The values outside the range are ignored.
+
+        :param timestamp: time.monotonic() of the reading.
+        :param starting_address: Address of the first value.
+        :param values: Values of consecutive addresses (array with the typecode of the buffer).
+        """
+        if self.capacity == 0:
+            return
+        quantity = self.quantity
+        row_start = self._next * quantity
+        if self._count:
+            # Start from the previous sample
+            previous_start = ((self._next - 1) % self.capacity) * quantity
+            self._values[row_start:row_start + quantity] = self._values[previous_start:previous_start + quantity]
+
+        first = max(starting_address - self.starting_address, 0)
+        end = min(starting_address - self.starting_address + len(values), quantity)
+        if first < end:
+            offset = self.starting_address - starting_address
+            self._values[row_start + first:row_start + end] = values[first + offset:end + offset]
+
+        self._times[self._next] = timestamp
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def get_times(self) -> array.array:
+        """
+        :return: The time of each sample, from the oldest.
+        """
+        oldest = (self._next - self._count) % self.capacity if self.capacity else 0
+        if oldest + self._count <= self.capacity:
+            return self._times[oldest:oldest + self._count]
+        return self._times[oldest:] + self._times[:self._next]
+
+    def get_history(self, address: int, since: float = None, until: float = None) -> (array.array, array.array):
+        """
+        Get the samples of an address, for example the last 10 minutes:
+        get_history(address, since=time.monotonic() - 600).
+
+        :param address: The address.
+        :param since: Time of the oldest sample, None for the oldest one kept.
+        :param until: Time of the newest sample, None for the newest one.
+        :return: The times and the values of the samples, from the oldest.
+        :raise IndexError: If the address is not in the range.
+        """
+        column = address - self.starting_address
+        if not 0 <= column < self.quantity:
+            raise IndexError("Address {0} is not in the history".format(address))
+        times = self.get_times()
+        first = 0 if since is None else bisect.bisect_left(times, since)
+        end = len(times) if until is None else bisect.bisect_right(times, until)
+        return times[first:end], self._get_column(column, first, max(end, first))
+
+    def _get_column(self, column: int, first: int, end: int) -> array.array:
+        """
+        :param column: Index of the address.
+        :param first: Index of the first sample, from the oldest.
+        :param end: Index after the last sample.
+        :return: The values of the address in these samples.
+        """
+        values = array.array(self._values.typecode)
+        if first >= end:
+            return values
+        view = memoryview(self._values)
+        oldest = (self._next - self._count) % self.capacity
+        first_row = (oldest + first) % self.capacity
+        end_row = (oldest + end - 1) % self.capacity + 1
+        if first_row < end_row:
+            segments = [(first_row, end_row)]
+        else:  # Wraps around the end of the buffer
+            segments = [(first_row, self.capacity), (0, end_row)]
+        for segment_first, segment_end in segments:
+            values.frombytes(view[segment_first * self.quantity + column:
+                                  (segment_end - 1) * self.quantity + column + 1:
+                                  self.quantity].tobytes())
+        return values
+
+    def reshaped(self, starting_address: int, quantity: int, capacity: int):
+        """
+        Get a copy of the buffer for other addresses or another capacity. The newest samples are kept, with the
+        values of the addresses that stay in the range.
+
+        :param starting_address: First address.
+        :param quantity: Number of addresses.
+        :param capacity: Maximum number of samples kept.
+        :return: The new buffer.
+        """
+        history = HistoryBuffer(starting_address, quantity, capacity, self._values.typecode)
+        count = min(self._count, capacity)
+        if count == 0:
+            return history
+        times = self.get_times()[-count:]
+        first = max(starting_address, self.starting_address)
+        end = min(starting_address + quantity, self.starting_address + self.quantity)
+        oldest = (self._next - count) % self.capacity
+        for i in range(count):
+            row_start = ((oldest + i) % self.capacity) * self.quantity
+            history.append(times[i], first, self._values[row_start + first - self.starting_address:
+                                                         row_start + end - self.starting_address])
+        return history
@@ -49,11 +49,17 @@ class MainWindowUI(object):
         self.action_settings_com = QAction("Settings", main_window)
         self.action_open_com = QAction("Open/Connect", main_window)
         self.action_close_com = QAction("Close/Disconnect", main_window)
+        self.action_add_connection = QAction("Add connection", main_window)
+        self.action_remove_connection = QAction("Remove connection", main_window)
 
         com_menu = menu_bar.addMenu('Communication')
+        self.connection_menu = com_menu.addMenu("Connection")  # Selection of the current connection
         com_menu.addAction(self.action_settings_com)
         com_menu.addAction(self.action_open_com)
         com_menu.addAction(self.action_close_com)
+        com_menu.addSeparator()
+        com_menu.addAction(self.action_add_connection)
+        com_menu.addAction(self.action_remove_connection)
 
         # Ranges
         self.action_add_range = QAction("Add Range", main_window)
@@ -61,6 +67,14 @@ class MainWindowUI(object):
         range_menu = menu_bar.addMenu('Range')
         range_menu.addAction(self.action_add_range)
 
+        # Tools
+        self.action_address_scanner = QAction("Address scanner", main_window)
+        self.action_unit_scanner = QAction("Unit ID scanner", main_window)
+
+        tools_menu = menu_bar.addMenu('Tools')
+        tools_menu.addAction(self.action_address_scanner)
+        tools_menu.addAction(self.action_unit_scanner)
+
         # ****************************
         # Status bar
         # ****************************
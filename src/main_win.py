@@ -25,10 +25,14 @@ import json
 from datetime import datetime
 
 from com_settings_win import ComSettingsWin
+from async_tcp_master import AsyncTcpMaster
 import main_ui
 import about_win
 from connection_thread import ConnectionThread
+from connection_pool import Connection, ConnectionPool
 from range_win import RangeWin
+from scan_win import ScanWin
+import defines
 import version
 
 
@@ -38,52 +42,132 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super(MainWindow, self).__init__()
 
-        # Instantiates the communication parameters and their menu.
-        self._com_settings_win = ComSettingsWin(self, self._on_settings_update)
+        # Connection profiles. Each one has its communication parameters, its menu and its client.
+        self._connection_pool = ConnectionPool()
+        self._current_connection = None  # Connection used by the settings, connect and disconnect commands
 
-        self._modbus_client = None  # Modbus client
+        self._connecting_connection = None  # Connection waiting for the connection thread
         self._connection_thread = None
         self._msgbox_connection = None
         self._range_win_list = []
 
         self._ui = self._setup_ui()
+        self._select_connection(self._add_connection(defines.DEFAULT_CONNECTION_NAME))
         self._ui.status_bar.showMessage("Welcome")
 
+    def _add_connection(self, name: str) -> Connection:
+        """
+        Create a connection profile with default settings.
+
+        :param name: Name of the profile.
+        :return: The new profile.
+        """
+        com_settings_win = ComSettingsWin(self, None)
+        com_settings_win.setWindowTitle(f"Communication settings - {name}")
+        connection = Connection(name, com_settings_win)
+        com_settings_win.set_call_back_func(
+            lambda auto_connect=False: self._on_settings_update(connection, auto_connect))
+        self._connection_pool.add(connection)
+        self._refresh_connection_menu()
+        return connection
+
+    def _add_connection_dialog(self):
+        """Ask for a name and add a connection profile."""
+        name, ok = QInputDialog.getText(self, "Add connection", "Connection name")
+        name = name.strip()
+        if not ok or name == "":
+            return
+        if self._connection_pool.get(name) is not None:
+            self._ui.status_bar.showMessage(f"The connection '{name}' already exists.")
+            return
+        connection = self._add_connection(name)
+        self._select_connection(connection)
+        self._open_settings_com()
+
+    def _remove_current_connection(self):
+        """Remove the selected connection profile. The last profile, or one used by a range, can't be removed."""
+        if len(self._connection_pool) <= 1:
+            self._ui.status_bar.showMessage("The last connection can't be removed.")
+            return
+        range_count = sum(range_win.connection_name == self._current_connection.name
+                          for range_win in self._range_win_list)
+        if range_count:
+            self._ui.status_bar.showMessage(
+                f"The connection '{self._current_connection.name}' is used by {range_count} range(s).")
+            return
+        self._connection_pool.remove(self._current_connection)
+        self._current_connection.com_settings_win.deleteLater()
+        self._select_connection(next(iter(self._connection_pool)))
+        self._refresh_connection_menu()
+
+    def _select_connection(self, connection: Connection):
+        """
+        Select the connection used by the settings, connect and disconnect commands.
+
+        :param connection: The profile to select.
+        """
+        self._current_connection = connection
+        self._refresh_connection_menu()
+        self._ui.status_bar.showMessage(f"Connection '{connection.name}' selected.")
+
+    def _refresh_connection_menu(self):
+        """List the connection profiles in the connection selection menu."""
+        self._ui.connection_menu.clear()
+        action_group = QActionGroup(self._ui.connection_menu)
+        for connection in self._connection_pool:
+            action = QAction(connection.name, action_group)
+            action.setCheckable(True)
+            action.setChecked(connection is self._current_connection)
+            action.triggered.connect(lambda checked, c=connection: self._select_connection(c))
+            self._ui.connection_menu.addAction(action)
+
     def _open_settings_com(self):
         """Opens the communications configuration menu."""
-        self._com_settings_win.show()
+        self._current_connection.com_settings_win.show()
 
-    def _on_settings_update(self, auto_connect: bool = False):
-        """Is called when the new communications configuration is validated"""
-        self._modbus_client = None  # New settings -> client not connected
-        self._update_range_client_objet()
+    def _on_settings_update(self, connection: Connection, auto_connect: bool = False):
+        """Is called when the new communications configuration of a connection is validated"""
+        connection.stop_polling()
+        connection.modbus_client = None  # New settings -> client not connected
         if auto_connect:
+            self._select_connection(connection)
             self._attempt_connect_client()
 
     def _attempt_connect_client(self):
-        """Try to connect the modbus client. To the server via TCP, or opening the serial port."""
+        """Try to connect the modbus client of the selected connection.
+        To the server via TCP, or opening the serial port."""
+        connection = self._current_connection
+        com_settings_win = connection.com_settings_win
+        connection.stop_polling()
 
         msg = ""
         # TCP MODE
-        if self._com_settings_win.mode == ComSettingsWin.MbMode.TCP:
+        if com_settings_win.mode == ComSettingsWin.MbMode.TCP:
             # print message
-            msg = f"Attempt to connecting to {self._com_settings_win.ip} ..."
+            msg = f"Attempt to connecting to {com_settings_win.ip} ..."
             print(msg)
             self._ui.status_bar.showMessage(msg)
             self.repaint()
 
             # setup client
-            self._modbus_client = modbus_tcp.TcpMaster(
-                self._com_settings_win.ip,
-                self._com_settings_win.port,
-                self._com_settings_win.timeout
-            )
+            if com_settings_win.tcp_engine == ComSettingsWin.TcpEngine.ASYNCIO:
+                connection.modbus_client = AsyncTcpMaster(
+                    com_settings_win.ip,
+                    com_settings_win.port,
+                    com_settings_win.timeout
+                )
+            else:
+                connection.modbus_client = modbus_tcp.TcpMaster(
+                    com_settings_win.ip,
+                    com_settings_win.port,
+                    com_settings_win.timeout
+                )
 
         # RTU MODE
-        if self._com_settings_win.mode == ComSettingsWin.MbMode.RTU:
+        if com_settings_win.mode == ComSettingsWin.MbMode.RTU:
 
             # Print message
-            msg = f"Attempt to opening {self._com_settings_win.serial_port_name} ..."
+            msg = f"Attempt to opening {com_settings_win.serial_port_name} ..."
             print(msg)
             self._ui.status_bar.showMessage(msg)
             self.repaint()
@@ -91,17 +175,17 @@ class MainWindow(QMainWindow):
             # setup client
             serial_port = serial.Serial(
                 port=None,  # Set null to avoid automatic opening
-                baudrate=self._com_settings_win.baud_rate,
-                bytesize=self._com_settings_win.data_bits,
-                parity=self._com_settings_win.parity,
-                stopbits=self._com_settings_win.stop_bits,
-                xonxoff=(self._com_settings_win.flow_control == ComSettingsWin.FlowControl.XON_XOFF),
-                rtscts=(self._com_settings_win.flow_control == ComSettingsWin.FlowControl.RTS_CTS),
-                dsrdtr=(self._com_settings_win.flow_control == ComSettingsWin.FlowControl.DSR_DTR)
+                baudrate=com_settings_win.baud_rate,
+                bytesize=com_settings_win.data_bits,
+                parity=com_settings_win.parity,
+                stopbits=com_settings_win.stop_bits,
+                xonxoff=(com_settings_win.flow_control == ComSettingsWin.FlowControl.XON_XOFF),
+                rtscts=(com_settings_win.flow_control == ComSettingsWin.FlowControl.RTS_CTS),
+                dsrdtr=(com_settings_win.flow_control == ComSettingsWin.FlowControl.DSR_DTR)
             )
-            serial_port.port = self._com_settings_win.serial_port_name
-            self._modbus_client = modbus_rtu.RtuMaster(serial_port)
-            self._modbus_client.set_timeout(self._com_settings_win.timeout, True)
+            serial_port.port = com_settings_win.serial_port_name
+            connection.modbus_client = modbus_rtu.RtuMaster(serial_port)
+            connection.modbus_client.set_timeout(com_settings_win.timeout, True)
 
         # Prepare msgbox
         self._msgbox_connection = QMessageBox()
@@ -111,9 +195,10 @@ class MainWindow(QMainWindow):
         self._msgbox_connection.setIcon(QMessageBox.Information)
         self._msgbox_connection.finished.connect(self._on_connection_canceled)
         # Prepare thread
-        self._connection_thread = ConnectionThread(self._modbus_client)
-        self._connection_thread.success.connect(self._on_connection_success)
-        self._connection_thread.fail.connect(self._on_connection_fail)
+        self._connecting_connection = connection
+        self._connection_thread = ConnectionThread(connection.modbus_client)
+        self._connection_thread.success.connect(lambda: self._on_connection_success(connection))
+        self._connection_thread.fail.connect(lambda ex: self._on_connection_fail(connection, ex))
         # Execute
         self._connection_thread.start()
         self._msgbox_connection.exec()
@@ -122,13 +207,13 @@ class MainWindow(QMainWindow):
         if not self._connection_thread.isFinished():
             self._connection_thread.terminate()
             print("connection cancel")
-            self._modbus_client = None
+            self._connecting_connection.modbus_client = None
 
-    def _on_connection_success(self):
+    def _on_connection_success(self, connection: Connection):
         print("connection success")
         if self._msgbox_connection is not None:
             self._msgbox_connection.close()
-        self._update_range_client_objet()
+        connection.start_polling()
 
         msg_box = QMessageBox()
         msg_box.setDefaultButton(QMessageBox.Ok)
@@ -137,11 +222,11 @@ class MainWindow(QMainWindow):
         msg_box.setIcon(QMessageBox.Information)
         msg_box.exec()
 
-    def _on_connection_fail(self, ex):
+    def _on_connection_fail(self, connection: Connection, ex):
         print("connection fail")
         if self._msgbox_connection is not None:
             self._msgbox_connection.close()
-        self._modbus_client = None
+        connection.modbus_client = None
 
         msg_box = QMessageBox()
         msg_box.setDefaultButton(QMessageBox.Ok)
@@ -151,22 +236,38 @@ class MainWindow(QMainWindow):
         msg_box.exec()
 
     def _try_disconnect_client(self):
-        """Disconnect the modbus client"""
-        if self._modbus_client is None:
+        """Disconnect the modbus client of the selected connection"""
+        if self._current_connection.modbus_client is None:
             self._ui.status_bar.showMessage("Already disconnected.")
             return
 
         self._ui.status_bar.showMessage("Disconnection...")
-        self._modbus_client.close()
-        self._modbus_client = None
-        self._update_range_client_objet()
+        self._current_connection.disconnect()
         self._ui.status_bar.showMessage("Disconnected.")
 
+    def closeEvent(self, event: QCloseEvent) -> None:
+        for connection in self._connection_pool:
+            connection.stop_polling()
+
     def _add_range_win(self):
         """Adds modbus range."""
-        range_win = RangeWin(self, self._modbus_client)
+        range_win = self._create_range_win()
+
+        # open settings
+        range_win.open_settings()
+
+    def _create_range_win(self, settings: dict = None) -> RangeWin:
+        """
+        Create a modbus range and dock it as tab.
+
+        :param settings: Modbus settings of the range, like in an exported configuration.
+        :return: The new range.
+        """
+        range_win = RangeWin(self, self._connection_pool)
         range_win.closed_event.connect(self._del_range_win)
         self._range_win_list.append(range_win)
+        if settings is not None:
+            range_win.import_config({"settings": settings})
 
         # Dock the range as tab
         self.addDockWidget(Qt.DockWidgetArea.TopDockWidgetArea, range_win)
@@ -174,9 +275,15 @@ class MainWindow(QMainWindow):
             self.tabifyDockWidget(self._range_win_list[0], range_win)
             range_win.show()
             range_win.raise_()  # show + raise : move tab to the front
+        return range_win
 
-        # open settings
-        range_win.open_settings()
+    def _open_scan_win(self, tab: int):
+        """
+        Opens the scanner.
+
+        :param tab: One of ScanWin.Tab.
+        """
+        self._scan_win.show_tab(tab)
 
     def _del_range_win(self, range_win: RangeWin):
         """
@@ -188,11 +295,6 @@ class MainWindow(QMainWindow):
         except ValueError:
             pass
 
-    def _update_range_client_objet(self):
-        """Updates the modbus client object for each modbus range."""
-        for addr_range in self._range_win_list:
-            addr_range.modbus_client = self._modbus_client
-
     def _export_config(self):
         """Export configuration"""
 
@@ -207,7 +309,9 @@ class MainWindow(QMainWindow):
             return
 
         # Prepare data
-        com_settings_data = self._com_settings_win.export_config()
+        connection_data_list = []
+        for connection in self._connection_pool:
+            connection_data_list.append(connection.export_config())
         range_data_list = []
         for range_win in self._range_win_list:
             range_data_list.append(range_win.export_config())
@@ -215,7 +319,8 @@ class MainWindow(QMainWindow):
         data = {
             "export_date": str(datetime.now()),
             "app_version": version.__VERSION__,
-            "com_settings": com_settings_data,
+            "com_settings": connection_data_list[0]["com_settings"],  # Settings of the first connection
+            "connections": connection_data_list,
             "range_win": range_data_list
         }
 
@@ -254,8 +359,13 @@ class MainWindow(QMainWindow):
             data = json.load(file_objet)
             file_objet.close()
 
-            # import com settings
-            self._com_settings_win.import_config(data.get("com_settings", None))
+            # import connections
+            connection_data_list = data.get("connections", None)
+            if connection_data_list is None:
+                # Single connection, from version 1.5.0 and earlier
+                connection_data_list = [{"name": defines.DEFAULT_CONNECTION_NAME,
+                                         "com_settings": data.get("com_settings", None)}]
+            self._import_connections(connection_data_list)
 
             # import new range
             new_range_win = []
@@ -266,11 +376,14 @@ class MainWindow(QMainWindow):
 
             for range_win_data in range_data_list:
                 # Create range
-                range_win = RangeWin(self, self._modbus_client)
+                range_win = RangeWin(self, self._connection_pool)
                 range_win.closed_event.connect(self._del_range_win)
                 new_range_win.append(range_win)
                 # import range data
                 range_win.import_config(range_win_data)
+                if self._connection_pool.get(range_win.connection_name) is None:
+                    # The imported connections don't contain the one of the range
+                    range_win.set_connection_name(next(iter(self._connection_pool)).name)
                 # Dock the range as tab
                 self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, range_win)
                 if len(new_range_win) > 1:
@@ -298,6 +411,25 @@ class MainWindow(QMainWindow):
         finally:
             msg_box.exec()
 
+    def _import_connections(self, connection_data_list: list):
+        """
+        Replace the connection profiles by the imported ones.
+
+        :param connection_data_list: List of dict that contain the name and the settings of each profile.
+        """
+        for connection in self._connection_pool:
+            self._connection_pool.remove(connection)
+            connection.com_settings_win.deleteLater()
+
+        for connection_data in connection_data_list:
+            name = str(connection_data.get("name", defines.DEFAULT_CONNECTION_NAME))
+            if self._connection_pool.get(name) is None:
+                connection = self._add_connection(name)
+                connection.com_settings_win.import_config(connection_data.get("com_settings", None))
+        if len(self._connection_pool) == 0:
+            self._add_connection(defines.DEFAULT_CONNECTION_NAME)
+        self._select_connection(next(iter(self._connection_pool)))
+
     def _setup_ui(self):
         """Load widgets and connect them to function."""
         ui = main_ui.MainWindowUI(self)
@@ -317,7 +449,14 @@ class MainWindow(QMainWindow):
         ui.action_settings_com.triggered.connect(self._open_settings_com)
         ui.action_open_com.triggered.connect(self._attempt_connect_client)
         ui.action_close_com.triggered.connect(self._try_disconnect_client)
+        ui.action_add_connection.triggered.connect(self._add_connection_dialog)
+        ui.action_remove_connection.triggered.connect(self._remove_current_connection)
         ui.action_add_range.triggered.connect(self._add_range_win)
+
+        # tools
+        self._scan_win = ScanWin(self, self._connection_pool, self._create_range_win)
+        ui.action_address_scanner.triggered.connect(lambda: self._open_scan_win(ScanWin.Tab.ADDRESSES))
+        ui.action_unit_scanner.triggered.connect(lambda: self._open_scan_win(ScanWin.Tab.UNIT_IDS))
         return ui
 
 
@@ -0,0 +1,509 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import array
+import socket
+import struct
+import sys
+import time
+
+import modbus_tk.modbus
+from modbus_tk import modbus_rtu, modbus_tcp
+from modbus_tk.utils import flush_socket
+from modbus_tk.exceptions import *
+import modbus_tk.defines as cst
+
+import defines
+
+
+def max_read_quantity(read_func: cst) -> int:
+    """
+    Get the maximum quantity of items that a single request can read.
+
+    :param read_func: Modbus reading function.
+    :return: The protocol limit for this function.
+    """
+    if read_func == cst.READ_COILS or read_func == cst.READ_DISCRETE_INPUTS:
+        return defines.MAX_READ_BITS
+    return defines.MAX_READ_REGISTERS
+
+
+def split_range(read_func: cst, starting_address: int, quantity: int) -> list:
+    """
+    Split an address range into chunks that respect the protocol limits.
+
+    :param read_func: Modbus reading function.
+    :param starting_address: First address of the range.
+    :param quantity: Number of addresses in the range.
+    :return: A list of (starting_address, quantity) tuples.
+    """
+    chunk_size = max_read_quantity(read_func)
+    chunks = []
+    offset = 0
+    while offset < quantity:
+        chunk_quantity = min(chunk_size, quantity - offset)
+        chunks.append((starting_address + offset, chunk_quantity))
+        offset += chunk_quantity
+    return chunks
+
+
+def is_bit_function(function_code: cst) -> bool:
+    """
+    :param function_code: Modbus function.
+    :return: True if the function accesses coils or discrete inputs, False if it accesses registers.
+    """
+    return function_code in (cst.READ_COILS, cst.READ_DISCRETE_INPUTS,
+                             cst.WRITE_SINGLE_COIL, cst.WRITE_MULTIPLE_COILS)
+
+
+def multiple_write_function(write_func: cst) -> cst:
+    """
+    Get the function that writes several items of the same kind as a writing function.
+
+    :param write_func: Modbus writing function.
+    :return: WRITE_MULTIPLE_COILS (FC15) or WRITE_MULTIPLE_REGISTERS (FC16).
+    """
+    return cst.WRITE_MULTIPLE_COILS if is_bit_function(write_func) else cst.WRITE_MULTIPLE_REGISTERS
+
+
+def split_values(write_func: cst, starting_address: int, values: list) -> list:
+    """
+    Split the values to write into chunks that respect the protocol limits.
+
+    :param write_func: Modbus writing function for multiple items.
+    :param starting_address: Address of the first value.
+    :param values: The values to write.
+    :return: A list of (starting_address, values) tuples.
+    """
+    chunk_size = defines.MAX_WRITE_BITS if is_bit_function(write_func) else defines.MAX_WRITE_REGISTERS
+    return [(starting_address + offset, values[offset:offset + chunk_size])
+            for offset in range(0, len(values), chunk_size)]
+
+
+def error_message(ex: Exception) -> str:
+    """
+    Get a readable message for an exception raised by a modbus client.
+
+    :param ex: The exception.
+    :return: The message.
+    """
+    if isinstance(ex, ModbusError):
+        error = ex.get_exception_code()
+        names = {
+            1: "Illegal Function",
+            2: "Illegal data address",
+            3: "Illegal data value",
+            4: "Slave device failure",
+            5: "Acknowledge",
+            6: "Slave device busy",
+            8: "Memory parity error",
+            10: "Gateway path unavailable",
+            11: "Gateway target device failed to respond",
+        }
+        return "MB exception " + str(error) + ": " + names.get(error, "Unknown exception")
+    if isinstance(ex, ModbusInvalidResponseError):
+        return "Modbus invalid response exception: " + str(ex)
+    return str(ex)
+
+
+def coalesce_ranges(ranges: list, max_gap: int) -> list:
+    """
+    Merge overlapping, adjacent or close address ranges.
+
+    :param ranges: A list of (starting_address, quantity) tuples.
+    :param max_gap: Maximum number of unused addresses bridged between two merged ranges.
+    :return: A list of (starting_address, quantity, members) tuples, sorted by address.
+        members is the list of indexes (in the ranges list) of the ranges covered by the merged range.
+    """
+    merged = []
+    for index in sorted(range(len(ranges)), key=lambda i: ranges[i][0]):
+        starting_address, quantity = ranges[index]
+        if merged and starting_address <= merged[-1][0] + merged[-1][1] + max_gap:
+            merged_address, merged_quantity, members = merged[-1]
+            end_address = max(merged_address + merged_quantity, starting_address + quantity)
+            merged[-1] = (merged_address, end_address - merged_address, members)
+            members.append(index)
+        else:
+            merged.append((starting_address, quantity, [index]))
+    return merged
+
+
+def build_request_pdu(function_code: cst, starting_address: int, quantity_of_x=0, output_value=0) -> bytes:
+    """
+    Build the PDU of a request, like modbus_tk Master.execute does.
+
+    :param function_code: Modbus function.
+    :param starting_address: First address.
+    :param quantity_of_x: Number of items to read.
+    :param output_value: Value, or list of values, to write.
+    :return: The request PDU.
+    :raise ModbusFunctionNotSupportedError: If the function is not supported.
+    """
+    if function_code in (cst.READ_COILS, cst.READ_DISCRETE_INPUTS,
+                         cst.READ_HOLDING_REGISTERS, cst.READ_INPUT_REGISTERS):
+        return struct.pack(">BHH", function_code, starting_address, quantity_of_x)
+
+    if function_code == cst.WRITE_SINGLE_COIL:
+        return struct.pack(">BHH", function_code, starting_address, 0xff00 if output_value != 0 else 0)
+
+    if function_code == cst.WRITE_SINGLE_REGISTER:
+        return struct.pack(">BH" + ("H" if output_value >= 0 else "h"), function_code, starting_address, output_value)
+
+    if function_code == cst.WRITE_MULTIPLE_COILS:
+        packed = pack_bits(output_value)
+        return struct.pack(">BHHB", function_code, starting_address, len(output_value), len(packed)) + packed
+
+    if function_code == cst.WRITE_MULTIPLE_REGISTERS:
+        pdu = struct.pack(">BHHB", function_code, starting_address, len(output_value), 2 * len(output_value))
+        for value in output_value:
+            pdu += struct.pack(">" + ("H" if value >= 0 else "h"), value)
+        return pdu
+
+    raise ModbusFunctionNotSupportedError("The {0} function code is not supported. ".format(function_code))
+
+
+def parse_response_pdu(function_code: cst, quantity_of_x: int, response_pdu: bytes) -> tuple:
+    """
+    Decode the PDU of a response, like modbus_tk Master.execute does.
+
+    :param function_code: Modbus function of the request.
+    :param quantity_of_x: Number of items read by the request.
+    :param response_pdu: The response PDU.
+    :return: The values read, or the address and value/quantity echoed by a writing function.
+    :raise ModbusError: If the server/slave answers with an exception.
+    """
+    if function_code in (cst.READ_COILS, cst.READ_DISCRETE_INPUTS,
+                         cst.READ_HOLDING_REGISTERS, cst.READ_INPUT_REGISTERS):
+        return tuple(parse_read_response(function_code, quantity_of_x, response_pdu))
+
+    (return_code, byte_2) = struct.unpack(">BB", response_pdu[0:2])
+    if return_code > 0x80:
+        raise ModbusError(byte_2)
+    return struct.unpack(">HH", response_pdu[1:5])
+
+
+def values_typecode(read_func: cst) -> str:
+    """
+    :param read_func: Modbus reading function.
+    :return: The array typecode of the values read by this function: 'B' for bits, 'H' for registers.
+    """
+    return 'B' if is_bit_function(read_func) else 'H'
+
+
+def parse_read_response(read_func: cst, quantity: int, response_pdu: bytes) -> array.array:
+    """
+    Decode the PDU of a reading response into an array, without creating a Python object per value.
+
+    :param read_func: Modbus reading function of the request.
+    :param quantity: Number of items read by the request.
+    :param response_pdu: The response PDU.
+    :return: The values read, in an array with the typecode given by values_typecode().
+    :raise ModbusError: If the server/slave answers with an exception.
+    """
+    (return_code, byte_count) = struct.unpack(">BB", response_pdu[0:2])
+    if return_code > 0x80:
+        raise ModbusError(byte_count)
+
+    data = response_pdu[2:]
+    if byte_count != len(data):
+        raise ModbusInvalidResponseError(
+            "Byte count is {0} while actual number of bytes is {1}. ".format(byte_count, len(data)))
+    expected_byte_count = (quantity + 7) // 8 if is_bit_function(read_func) else 2 * quantity
+    if byte_count != expected_byte_count:
+        raise ModbusInvalidResponseError(
+            "Byte count is {0} while {1} bytes were expected. ".format(byte_count, expected_byte_count))
+
+    if is_bit_function(read_func):
+        return array.array('B', b"".join([_UNPACKED_BYTES[byte] for byte in data])[:quantity])
+    values = array.array('H', data)
+    if sys.byteorder == "little":
+        values.byteswap()  # Modbus registers are big-endian
+    return values
+
+
+# The 8 bits of every byte value, as one byte per bit, least significant bit first
+_UNPACKED_BYTES = [bytes((byte >> i) & 1 for i in range(8)) for byte in range(256)]
+
+
+def pack_bits(bits: list) -> bytes:
+    """
+    Pack bits into bytes, least significant bit first.
+
+    :param bits: List of bit values.
+    :return: The packed bytes.
+    """
+    packed = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            packed[i >> 3] |= 1 << (i & 7)
+    return bytes(packed)
+
+
+def read_range(modbus_client: modbus_tk.modbus.Master,
+               unit_id: int,
+               read_func: cst,
+               starting_address: int,
+               quantity: int) -> array.array:
+    """
+    Read an address range of any size. The range is split into protocol-legal chunks and the
+    results are reassembled. On TCP, several chunks are kept in flight at once.
+
+    :param modbus_client: Connected modbus client.
+    :param unit_id: Unit identifier of the server/slave.
+    :param read_func: Modbus reading function.
+    :param starting_address: First address of the range.
+    :param quantity: Number of addresses in the range.
+    :return: The values of the whole range, in an array with the typecode given by values_typecode().
+    :raise ModbusError: If the server/slave answers with an exception.
+    """
+    chunks = split_range(read_func, starting_address, quantity)
+
+    if len(chunks) > 1 and is_pipelined(modbus_client):
+        results = probe_chunks(modbus_client, unit_id, read_func, chunks)
+    else:
+        results = [modbus_client.execute(unit_id, read_func, chunk_address, chunk_quantity)
+                   for chunk_address, chunk_quantity in chunks]
+
+    values = array.array(values_typecode(read_func))
+    for chunk_values in results:
+        if isinstance(chunk_values, Exception):
+            raise chunk_values
+        values.extend(chunk_values)
+    return values
+
+
+def is_pipelined(modbus_client: modbus_tk.modbus.Master) -> bool:
+    """
+    :param modbus_client: Connected modbus client.
+    :return: True if several requests can be in flight at the same time with this client.
+    """
+    return hasattr(modbus_client, "probe_chunks") or isinstance(modbus_client, modbus_tcp.TcpMaster)
+
+
+def probe_chunks(modbus_client: modbus_tk.modbus.Master, unit_id: int, read_func: cst, chunks: list) -> list:
+    """
+    Read several chunks, and get the result of each one. Each chunk is read even if a previous one failed.
+    On TCP, the requests are pipelined.
+
+    :param modbus_client: Connected modbus client.
+    :param unit_id: Unit identifier of the server/slave.
+    :param read_func: Modbus reading function.
+    :param chunks: List of (starting_address, quantity) tuples, each one within the protocol limits.
+    :return: For each chunk, the values (array or tuple) or the ModbusError/ModbusInvalidResponseError raised.
+    :raise OSError: If the communication fails (timeout, connection lost, ...).
+    """
+    if hasattr(modbus_client, "probe_chunks"):  # Client with pipelined requests
+        return modbus_client.probe_chunks(unit_id, read_func, chunks)
+    if isinstance(modbus_client, modbus_tcp.TcpMaster):
+        return TcpPipeline(modbus_client).probe_chunks(unit_id, read_func, chunks)
+
+    results = []
+    for chunk_address, chunk_quantity in chunks:
+        try:
+            results.append(modbus_client.execute(unit_id, read_func, chunk_address, chunk_quantity))
+        except (ModbusError, ModbusInvalidResponseError) as ex:
+            results.append(ex)
+    return results
+
+
+def probe_units(modbus_client: modbus_tk.modbus.Master, read_func: cst, address: int, unit_ids: list) -> list:
+    """
+    Send the same single-item read to several unit ids, and get the answer of each one.
+    A unit that does not answer within the timeout of the client is not an error. On TCP, the requests are
+    pipelined, so the silent units cost a single timeout.
+
+    :param modbus_client: Connected modbus client.
+    :param read_func: Modbus reading function.
+    :param address: Address to read.
+    :param unit_ids: Unit identifiers to probe.
+    :return: For each unit, a (result, response time in second) tuple. The result is the values read or the
+        ModbusError raised, or None (with a None response time) if the unit has not answered.
+    :raise OSError: If the connection is lost.
+    """
+    if hasattr(modbus_client, "probe_units"):  # Client with pipelined requests
+        return modbus_client.probe_units(read_func, address, unit_ids)
+    if isinstance(modbus_client, modbus_tcp.TcpMaster):
+        return TcpPipeline(modbus_client).probe_units(read_func, address, unit_ids)
+
+    results = []
+    for unit_id in unit_ids:
+        start_time = time.monotonic()
+        try:
+            result = modbus_client.execute(unit_id, read_func, address, 1)
+        except ModbusError as ex:
+            result = ex
+        except (ModbusInvalidResponseError, socket.timeout):
+            # modbus_tk reports a silent serial slave with an invalid response of length 0
+            results.append((None, None))
+            continue
+        results.append((result, time.monotonic() - start_time))
+    return results
+
+
+def set_timeout(modbus_client: modbus_tk.modbus.Master, timeout_in_sec: float):
+    """
+    Change the timeout of a client, keeping the other timeout settings of a serial client.
+
+    :param modbus_client: Modbus client.
+    :param timeout_in_sec: The new timeout.
+    """
+    if isinstance(modbus_client, modbus_rtu.RtuMaster):
+        modbus_client.set_timeout(timeout_in_sec, modbus_client.use_sw_timeout)
+    else:
+        modbus_client.set_timeout(timeout_in_sec)
+
+
+class TcpPipeline:
+    """
+    Sends several read requests on the socket of a modbus_tk TcpMaster before waiting for the responses.
+    Responses are matched to their request by transaction identifier, so they can come back in any order.
+    """
+    _last_transaction_id = 0
+
+    def __init__(self, modbus_client: modbus_tcp.TcpMaster, max_in_flight=defines.MAX_TCP_REQUESTS_IN_FLIGHT):
+        """
+        Constructor
+
+        :param modbus_client: The TCP master that owns the socket.
+        :param max_in_flight: Maximum number of requests waiting for a response.
+        """
+        self._modbus_client = modbus_client
+        self._max_in_flight = max_in_flight
+
+    def probe_chunks(self, unit_id: int, read_func: cst, chunks: list) -> list:
+        """
+        Read all chunks, and get the result of each one.
+
+        :param unit_id: Unit identifier of the server/slave.
+        :param read_func: Modbus reading function.
+        :param chunks: List of (starting_address, quantity) tuples.
+        :return: For each chunk, the array of values or the ModbusError/ModbusInvalidResponseError raised.
+        """
+        self._modbus_client.open()
+        try:
+            return self._probe_chunks(self._modbus_client._sock, unit_id, read_func, chunks)
+        except Exception:
+            # The responses still in flight would be received by the next request: drop the connection with
+            # them, the next request reconnects.
+            self._modbus_client.close()
+            raise
+
+    def _probe_chunks(self, sock, unit_id: int, read_func: cst, chunks: list) -> list:
+        results = [None] * len(chunks)
+        pending = {}  # transaction id -> chunk index
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            # Fill the pipe. The frames are sent with a single call, so Nagle's algorithm does not hold
+            # the following ones until the first is acknowledged.
+            frames = []
+            while next_chunk < len(chunks) and len(pending) < self._max_in_flight:
+                chunk_address, chunk_quantity = chunks[next_chunk]
+                transaction_id = self._get_transaction_id()
+                pdu = build_request_pdu(read_func, chunk_address, chunk_quantity)
+                frames.append(struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, unit_id) + pdu)
+                pending[transaction_id] = next_chunk
+                next_chunk += 1
+            if frames:
+                sock.sendall(b"".join(frames))
+
+            # Wait for one response
+            transaction_id, response_pdu = self._recv_response(sock)
+            index = pending.pop(transaction_id, None)
+            if index is None:
+                continue  # Late response of an older request
+            try:
+                results[index] = parse_read_response(read_func, chunks[index][1], response_pdu)
+            except (ModbusError, ModbusInvalidResponseError) as ex:
+                results[index] = ex  # Keep receiving the pending responses so the socket stays in sync.
+        return results
+
+    def probe_units(self, read_func: cst, address: int, unit_ids: list) -> list:
+        """
+        Send the same single-item read to every unit id, and wait for the answers until the timeout of the client.
+
+        :param read_func: Modbus reading function.
+        :param address: Address to read.
+        :param unit_ids: Unit identifiers to probe.
+        :return: For each unit, a (result, response time in second) tuple, (None, None) if it has not answered.
+        """
+        self._modbus_client.open()
+        try:
+            flush_socket(self._modbus_client._sock, 3)  # Late answers of a previous request
+        except Exception:  # The server keeps sending: start again on a new connection
+            self._modbus_client.close()
+            self._modbus_client.open()
+        sock = self._modbus_client._sock
+        timeout = self._modbus_client.get_timeout()
+
+        pdu = build_request_pdu(read_func, address, 1)
+        pending = {}  # transaction id -> unit index
+        frames = []
+        for index, unit_id in enumerate(unit_ids):
+            transaction_id = self._get_transaction_id()
+            frames.append(struct.pack(">HHHB", transaction_id, 0, len(pdu) + 1, unit_id) + pdu)
+            pending[transaction_id] = index
+        start_time = time.monotonic()
+        sock.sendall(b"".join(frames))
+
+        results = [(None, None)] * len(unit_ids)
+        try:
+            while pending:
+                remaining_time = start_time + timeout - time.monotonic()
+                if remaining_time <= 0:
+                    break
+                sock.settimeout(remaining_time)
+                try:
+                    transaction_id, response_pdu = self._recv_response(sock)
+                except socket.timeout:
+                    break
+                index = pending.pop(transaction_id, None)
+                if index is None:
+                    continue
+                try:
+                    result = parse_read_response(read_func, 1, response_pdu)
+                except (ModbusError, ModbusInvalidResponseError) as ex:
+                    result = ex
+                results[index] = (result, time.monotonic() - start_time)
+        finally:
+            sock.settimeout(timeout)
+            if pending:  # Not answered in time, or the reception failed
+                # A late answer would be received by the next request: drop the connection with it
+                self._modbus_client.close()
+        return results
+
+    @staticmethod
+    def _get_transaction_id() -> int:
+        TcpPipeline._last_transaction_id = (TcpPipeline._last_transaction_id + 1) & 0xffff
+        return TcpPipeline._last_transaction_id
+
+    @staticmethod
+    def _recv_exactly(sock, length: int) -> bytes:
+        data = b""
+        while len(data) < length:
+            received = sock.recv(length - len(data))
+            if not received:
+                raise ModbusInvalidResponseError("Connection closed by the server")
+            data += received
+        return data
+
+    def _recv_response(self, sock) -> (int, bytes):
+        """Receive one response frame and return its transaction id and its PDU."""
+        mbap = self._recv_exactly(sock, 7)
+        transaction_id, protocol_id, length, unit_id = struct.unpack(">HHHB", mbap)
+        if length < 2:
+            raise ModbusInvalidResponseError("Invalid MBAP length: {0}".format(length))
+        return transaction_id, self._recv_exactly(sock, length - 1)
@@ -18,74 +18,145 @@ see <https://www.gnu.org/licenses/>.
 import time
 
 import modbus_tk.modbus
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import QObject, pyqtSignal
 from modbus_tk.exceptions import *
 import modbus_tk.defines as cst
 
+import mb_protocol
+import utils
 
-class MbRegisterReader(QThread):
+
+class MbRegisterReader(QObject):
+    """
+    Read job of an address range. The job is executed by the PollScheduler of the connection,
+    and is queued again at a fixed rate (one poll period after its previous due time) while the loop is enabled.
+    The job keeps the values of its previous reading: the first reading is delivered as a snapshot of the whole
+    range, the next ones as the list of the values that have changed.
+    A looping job can be restricted to a window of its range (for example the rows displayed of a large range):
+    only the window is read, and a snapshot of the window is delivered when the window changes.
+    The values are carried in an array (typecode 'H' for registers, 'B' for bits), that is passed by reference
+    to the receiving thread and is never modified afterwards.
+    """
     # pyqtSignal should be not in the __init__ !
     log_progress = pyqtSignal(str)
-    success = pyqtSignal(list)
+    snapshot = pyqtSignal(int, int, object)  # Reading cycle number, index of the first value, array of the values
+    changed = pyqtSignal(int, list)  # Reading cycle number, (index, new value) tuples of the changed values
+    # Emitted for every successful reading, from the thread of the reading: connect it with a direct connection
+    # to a slot that does not wait. Monotonic time of the reading, index of the first value, array of the values
+    sampled = pyqtSignal(float, int, object)
     fail = pyqtSignal()
+    timing = pyqtSignal(float, float)  # Queue waiting time and execution time, in millisecond
+    overrun = pyqtSignal(int)  # Number of poll periods missed because the reading was too long
+    finished = pyqtSignal()
 
     def __init__(self,
-                 modbus_client: modbus_tk.modbus.Master,
                  unit_id: int,
                  read_func: modbus_tk.defines,
                  starting_address: int,
                  quantity: int,
-                 delay: int,
+                 period: int,
                  loop=False):
         super(MbRegisterReader, self).__init__()
 
-        self.modbus_client = modbus_client
         self.unit_id = unit_id
         self.read_func = read_func
         self.starting_address = starting_address
         self.quantity = quantity
-        self.delay = delay
+        self.period = period  # Poll period in millisecond
         self.loop = loop
 
-    def run(self):
-        while True:
-            self.log_progress.emit("Reading...")
-
-            try:
-                # Reading data
-                datas = self.modbus_client.execute(
-                    self.unit_id,
-                    self.read_func,
-                    self.starting_address,
-                    self.quantity)
-                self.success.emit(list(datas))
-                self.log_progress.emit("Successful reading")
-            except ModbusError as ex:
-                error = ex.get_exception_code()
-                if error == 1:
-                    self.log_progress.emit("MB exception " + str(error) + ": Illegal Function")
-                if error == 2:
-                    self.log_progress.emit("MB exception " + str(error) + ": Illegal data address")
-                if error == 3:
-                    self.log_progress.emit("MB exception " + str(error) + ": Illegal data value")
-                if error == 4:
-                    self.log_progress.emit("MB exception " + str(error) + ": Slave device failure")
-                self.fail.emit()
-            except ModbusInvalidResponseError as ex:
-                self.log_progress.emit("Modbus invalid response exception: " + str(ex))
-                self.fail.emit()
-            except OSError as ex:
-                self.log_progress.emit(str(ex))
-                self.fail.emit()
-
-            if not self.loop:
-                print("stop")
-                return #  Exit loop
-            else:
-                print("continue")
-            time.sleep(self.delay / 1000)  # millisecond to second
-            print("end loop")
+        self._window = None  # (index of the first value, quantity) read while looping, None for the whole range
+        self._cycle = 0  # Number of successful readings
+        self._previous_datas = None
+        self._previous_address = None  # Starting address of the previous reading
+        self._snapshot_requested = True
+
+    def execute(self, modbus_client: modbus_tk.modbus.Master):
+        """
+        Execute one reading.
+
+        :param modbus_client: The connected modbus client.
+        """
+        self.report_reading()
+        starting_address, quantity = self.get_read_range()
+        try:
+            # Reading data, split into protocol-legal chunks
+            datas = mb_protocol.read_range(
+                modbus_client,
+                self.unit_id,
+                self.read_func,
+                starting_address,
+                quantity)
+        except Exception as ex:  # Modbus exception, invalid response or MBAP (socket out of sync), timeout...
+            self.report_error(ex)
+        else:
+            self.report_success(datas, starting_address)
+
+    def set_window(self, window):
+        """
+        Restrict the looping readings to a part of the range. Can be called from any thread: the window is taken
+        into account from the next reading.
+
+        :param window: (index of the first value, quantity), or None to read the whole range.
+        """
+        if window is not None:
+            first_index = min(max(window[0], 0), self.quantity - 1)
+            window = (first_index, max(min(window[1], self.quantity - first_index), 1))
+        self._window = window
+
+    def get_read_range(self) -> (int, int):
+        """
+        :return: The starting address and the quantity of the next reading: the window while looping, else the
+            whole range.
+        """
+        window = self._window
+        if window is None or not self.loop:
+            return self.starting_address, self.quantity
+        return self.starting_address + window[0], window[1]
+
+    def report_reading(self):
+        """Signal that the reading has started."""
+        self.log_progress.emit("Reading...")
+
+    def report_success(self, datas, starting_address: int = None):
+        """
+        Deliver the values read for this range: all of them if a snapshot is due, else only the changed ones.
+
+        :param datas: Array of the values read.
+        :param starting_address: Address of the first value, None for the starting address of the range.
+        """
+        if starting_address is None:
+            starting_address = self.starting_address
+        first_index = starting_address - self.starting_address
+        self.sampled.emit(time.monotonic(), first_index, datas)
+        self._cycle += 1
+        previous_datas = self._previous_datas
+        previous_address = self._previous_address
+        self._previous_datas = datas
+        self._previous_address = starting_address
+        if (self._snapshot_requested or previous_datas is None or len(previous_datas) != len(datas)
+                or previous_datas.typecode != datas.typecode or previous_address != starting_address):
+            self._snapshot_requested = False
+            self.snapshot.emit(self._cycle, first_index, datas)
+        else:
+            changes = [(first_index + index, datas[index])
+                       for index in utils.find_changed_indexes(previous_datas, datas)]
+            if changes:
+                self.changed.emit(self._cycle, changes)
+        self.log_progress.emit("Successful reading")
+
+    def request_snapshot(self):
+        """Deliver all the values at the next successful reading, for example when the display was modified."""
+        self._snapshot_requested = True
+
+    def report_error(self, ex: Exception):
+        """
+        Report a failed reading.
+
+        :param ex: The exception raised by the modbus client.
+        """
+        self.log_progress.emit(mb_protocol.error_message(ex))
+        self.fail.emit()
 
     def set_loop(self, loop):
-        print(f"loop: {loop}")
         self.loop = loop
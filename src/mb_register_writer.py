@@ -0,0 +1,99 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+from PyQt5.QtCore import QObject, pyqtSignal
+import modbus_tk.defines as cst
+
+import mb_protocol
+
+
+class MbRegisterWriter(QObject):
+    """
+    Write job of consecutive registers or coils. The job is executed by the PollScheduler of the connection,
+    before any reading job.
+    """
+    # pyqtSignal should be not in the __init__ !
+    log_progress = pyqtSignal(str)
+    success = pyqtSignal(list)  # The written rows
+    fail = pyqtSignal()
+    finished = pyqtSignal()
+
+    def __init__(self, unit_id: int, write_func: cst, register_rows: list):
+        """
+        Constructor
+
+        :param unit_id: Unit identifier of the server/slave.
+        :param write_func: Modbus writing function selected for the range.
+        :param register_rows: The rows to write, with consecutive addresses.
+        """
+        super(MbRegisterWriter, self).__init__()
+
+        self.unit_id = unit_id
+        self.write_func = write_func
+        self.register_rows = register_rows
+
+    @property
+    def starting_address(self) -> int:
+        return self.register_rows[0].register_addr
+
+    @property
+    def end_address(self) -> int:
+        """Address following the last written address."""
+        return self.register_rows[-1].register_addr + 1
+
+    def can_merge(self, other) -> bool:
+        """
+        Check if an other job can be written by the same request, just after this one.
+
+        :param other: The job that follows this one in the queue.
+        """
+        return (other.unit_id == self.unit_id
+                and mb_protocol.is_bit_function(other.write_func) == mb_protocol.is_bit_function(self.write_func)
+                and other.starting_address == self.end_address)
+
+    def report_writing(self):
+        """Signal that the writing has started."""
+        self.log_progress.emit("Writing...")
+
+    def report_result(self, failed_chunks: list, chunk_count: int):
+        """
+        Report the result of the writing.
+
+        :param failed_chunks: List of (starting_address, end_address, exception) tuples of the requests that
+            failed. The end address is the address following the last address of the request.
+        :param chunk_count: Number of requests used for the writing.
+        """
+        failed = False
+        for starting_address, end_address, ex in failed_chunks:
+            if starting_address < self.end_address and end_address > self.starting_address:
+                failed = True
+                if chunk_count == 1:
+                    self.log_progress.emit(mb_protocol.error_message(ex))
+                else:
+                    self.log_progress.emit(f"Writing of addresses {starting_address} to {end_address - 1} failed: "
+                                           + mb_protocol.error_message(ex))
+
+        written_rows = [row for row in self.register_rows
+                        if not any(start <= row.register_addr < end for start, end, _ in failed_chunks)]
+        if written_rows:
+            if len(self.register_rows) == 1:
+                self.log_progress.emit("Successful writing")
+            else:
+                self.log_progress.emit(f"Successful writing of {len(written_rows)}/{len(self.register_rows)} values")
+            self.success.emit(written_rows)
+        if failed:
+            self.fail.emit()
@@ -0,0 +1,110 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import collections
+
+
+class MinMaxDecimator:
+    """
+    Decimation of a time series for display: the time is divided into buckets of a fixed duration (the duration
+    of a pixel), and only the minimum and the maximum of the samples of each bucket are kept. So a series of
+    millions of samples is drawn with a few points per pixel, without losing its peaks.
+    The buckets can be built at once from a history, then a new sample only updates the last bucket.
+    """
+
+    def __init__(self, bucket_duration: float, bucket_count: int):
+        """
+        Constructor
+
+        :param bucket_duration: Duration of a bucket, in second.
+        :param bucket_count: Number of buckets kept, the older ones are dropped.
+        """
+        self.bucket_duration = bucket_duration
+        self.bucket_count = bucket_count
+        self._buckets = collections.deque()  # Number of each bucket: time // bucket_duration
+        self._minimums = collections.deque()
+        self._maximums = collections.deque()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def clear(self):
+        self._buckets.clear()
+        self._minimums.clear()
+        self._maximums.clear()
+
+    def rebuild(self, times, values):
+        """
+        Compute the buckets of a series. Each bucket is found by bisection and its minimum and maximum are
+        computed on a slice, so every sample is visited once, but by the builtin min and max: the Python steps
+        are proportional to the number of buckets, not of samples.
+
+        :param times: Time of each sample, sorted (array of float).
+        :param values: Value of each sample (array).
+        """
+        self.clear()
+        if not len(times) or self.bucket_count <= 0:
+            return
+        last_bucket = int(times[-1] // self.bucket_duration)
+        bucket = max(int(times[0] // self.bucket_duration), last_bucket - self.bucket_count + 1)
+        first = bisect.bisect_left(times, bucket * self.bucket_duration)
+        while bucket <= last_bucket:
+            if bucket == last_bucket:
+                end = len(times)
+            else:
+                end = bisect.bisect_left(times, (bucket + 1) * self.bucket_duration, first)
+            if first < end:
+                samples = values[first:end]
+                self._buckets.append(bucket)
+                self._minimums.append(min(samples))
+                self._maximums.append(max(samples))
+                first = end
+                bucket += 1
+            elif first < len(times):  # Skip the empty buckets
+                # The floor division can give the current bucket for a time on the boundary of the next one
+                bucket = max(bucket + 1, int(times[first] // self.bucket_duration))
+            else:
+                break
+
+    def append(self, timestamp: float, value):
+        """
+        Add a sample, more recent than the previous ones.
+
+        :param timestamp: Time of the sample.
+        :param value: Value of the sample.
+        """
+        bucket = int(timestamp // self.bucket_duration)
+        if self._buckets and self._buckets[-1] == bucket:
+            if value < self._minimums[-1]:
+                self._minimums[-1] = value
+            elif value > self._maximums[-1]:
+                self._maximums[-1] = value
+            return
+        self._buckets.append(bucket)
+        self._minimums.append(value)
+        self._maximums.append(value)
+        while self._buckets[0] <= bucket - self.bucket_count:
+            self._buckets.popleft()
+            self._minimums.popleft()
+            self._maximums.popleft()
+
+    def get_buckets(self) -> list:
+        """
+        :return: A (bucket number, minimum, maximum) tuple per bucket, from the oldest.
+        """
+        return list(zip(self._buckets, self._minimums, self._maximums))
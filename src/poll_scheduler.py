@@ -0,0 +1,332 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+import modbus_tk.modbus
+import modbus_tk.defines as cst
+from PyQt5.QtCore import QThread
+from modbus_tk.exceptions import *
+
+import mb_protocol
+from mb_regesiter_reader import MbRegisterReader
+from mb_register_writer import MbRegisterWriter
+
+
+class PollScheduler(QThread):
+    """
+    Executes the read jobs of every range of one connection, one after the other, on a single thread.
+    So the modbus client is never used by two threads at the same time.
+    Due jobs with the same unit id and reading function are merged into as few requests as possible.
+    Write jobs have priority over read jobs, and consecutive writes to adjacent addresses are merged.
+    Long tasks (like scans) are executed step by step, alternately with the due read jobs.
+    """
+
+    def __init__(self, modbus_client: modbus_tk.modbus.Master, coalescing_gap: int = 0):
+        """
+        Constructor
+
+        :param modbus_client: The connected modbus client used for every job.
+        :param coalescing_gap: Maximum number of unused addresses read to merge two jobs.
+        """
+        super(PollScheduler, self).__init__()
+        self.modbus_client = modbus_client
+        self.coalescing_gap = coalescing_gap
+
+        self._condition = threading.Condition()
+        self._queue = []  # Heap of (due time, sequence number, reader)
+        self._write_queue = collections.deque()  # Write jobs, in submission order
+        self._task_queue = collections.deque()  # Long tasks, in submission order
+        self._sequence = itertools.count()  # Keeps the submission order for jobs with the same due time
+        self._running = True
+
+    def submit(self, reader: MbRegisterReader, delay: float = 0.0) -> bool:
+        """
+        Queue a read job.
+
+        :param reader: The job to execute.
+        :param delay: Time to wait before the job is due, in seconds.
+        :return: False if the scheduler is stopped and the job has not been queued.
+        """
+        return self._push(reader, time.monotonic() + delay)
+
+    def _push(self, reader: MbRegisterReader, due_time: float) -> bool:
+        """
+        Queue a read job at a due time.
+
+        :param reader: The job to execute.
+        :param due_time: Time at which the job is due, on the time.monotonic() clock.
+        :return: False if the scheduler is stopped and the job has not been queued.
+        """
+        with self._condition:
+            if not self._running:
+                return False
+            heapq.heappush(self._queue, (due_time, next(self._sequence), reader))
+            self._condition.notify()
+        return True
+
+    def submit_write(self, writer: MbRegisterWriter) -> bool:
+        """
+        Queue a write job. It is executed before the due read jobs.
+
+        :param writer: The job to execute.
+        :return: False if the scheduler is stopped and the job has not been queued.
+        """
+        with self._condition:
+            if not self._running:
+                return False
+            self._write_queue.append(writer)
+            self._condition.notify()
+        return True
+
+    def submit_task(self, task) -> bool:
+        """
+        Queue a long task. The task must have an execute(modbus_client) method that executes one step and returns
+        True while there are more steps, a log_progress signal and a finished signal.
+
+        :param task: The task to execute.
+        :return: False if the scheduler is stopped and the task has not been queued.
+        """
+        with self._condition:
+            if not self._running:
+                return False
+            self._task_queue.append(task)
+            self._condition.notify()
+        return True
+
+    def cancel(self, reader: MbRegisterReader):
+        """
+        Stop a job. The job is removed from the queue, or will not be queued again if it is being executed.
+
+        :param reader: The job to stop.
+        """
+        reader.set_loop(False)
+        with self._condition:
+            queue_length = len(self._queue)
+            self._queue = [entry for entry in self._queue if entry[2] is not reader]
+            heapq.heapify(self._queue)
+            was_queued = len(self._queue) != queue_length
+        if was_queued:
+            reader.finished.emit()
+
+    def stop(self):
+        """Stop the scheduler thread. The queued jobs are finished without being executed."""
+        with self._condition:
+            self._running = False
+            pending = [entry[2] for entry in self._queue] + list(self._write_queue) + list(self._task_queue)
+            self._queue.clear()
+            self._write_queue.clear()
+            self._task_queue.clear()
+            self._condition.notify()
+        self.wait()
+        for job in pending:
+            job.finished.emit()
+
+    def run(self):
+        last_was_task = False
+        while True:
+            with self._condition:
+                # Wait for a write job, a task or the next due read job
+                while self._running:
+                    now = time.monotonic()
+                    reads_due = bool(self._queue) and self._queue[0][0] <= now
+                    if self._write_queue or self._task_queue or reads_due:
+                        break
+                    self._condition.wait(self._queue[0][0] - now if self._queue else None)
+                if not self._running:
+                    return
+                writers = self._pop_adjacent_writes()
+                task = None
+                if not writers and self._task_queue and not (reads_due and last_was_task):
+                    task = self._task_queue.popleft()
+                elif not writers:
+                    jobs = self._pop_due_jobs(now)
+
+            if writers:
+                self._execute_writes(writers)
+                continue
+
+            last_was_task = task is not None
+            if task is not None:
+                # Execute one step, then let the due read jobs run before the next step.
+                try:
+                    has_more_steps = task.execute(self.modbus_client)
+                except Exception as ex:  # The task is ended, so an unexpected error does not stop this thread
+                    task.log_progress.emit(mb_protocol.error_message(ex))
+                    has_more_steps = False
+                if not (has_more_steps and self._push_task(task)):
+                    task.finished.emit()
+                continue
+
+            # Execute the jobs right away, without idle gap.
+            start_time = time.monotonic()
+            if len(jobs) == 1:
+                self._execute_read(jobs[0][1])
+            else:
+                self._execute_coalesced([reader for _, reader in jobs])
+            end_time = time.monotonic()
+
+            for due_time, reader in jobs:
+                reader.timing.emit((start_time - due_time) * 1000, (end_time - start_time) * 1000)  # in millisecond
+                if not (reader.loop and self._push(reader, self._next_due_time(reader, due_time, end_time))):
+                    reader.finished.emit()
+
+    @staticmethod
+    def _next_due_time(reader: MbRegisterReader, due_time: float, end_time: float) -> float:
+        """
+        Compute the next due time of a looping job on a fixed-rate clock, so the period does not drift with
+        the reading latency. The poll periods that are already over are skipped and reported as overrun.
+
+        :param reader: The looping job.
+        :param due_time: The due time of the reading that has just been executed.
+        :param end_time: The end time of this reading.
+        :return: The next due time.
+        """
+        period = max(reader.period, 1) / 1000  # millisecond to second
+        missed_periods = int((end_time - due_time) // period)
+        if missed_periods > 0:
+            reader.overrun.emit(missed_periods)
+        return due_time + (missed_periods + 1) * period
+
+    def _push_task(self, task) -> bool:
+        """
+        Queue again a task that has more steps.
+
+        :return: False if the scheduler is stopped and the task has not been queued.
+        """
+        with self._condition:
+            if not self._running:
+                return False
+            self._task_queue.append(task)
+        return True
+
+    def _pop_adjacent_writes(self) -> list:
+        """
+        Pop the first write job and the following ones that write just after it.
+        Must be called with the condition locked.
+
+        :return: The write jobs, empty if there is none.
+        """
+        writers = []
+        while self._write_queue and (not writers or writers[-1].can_merge(self._write_queue[0])):
+            writers.append(self._write_queue.popleft())
+        return writers
+
+    def _execute_writes(self, writers: list):
+        """
+        Write the values of consecutive write jobs. Several values are written with the multiple writing function
+        (FC15 or FC16), split into protocol-legal requests.
+
+        :param writers: Jobs with the same unit id, that write adjacent addresses.
+        """
+        for writer in writers:
+            writer.report_writing()
+
+        values = [row.register_value for writer in writers for row in writer.register_rows]
+        write_func = writers[0].write_func
+        if len(values) == 1 and write_func in (cst.WRITE_SINGLE_COIL, cst.WRITE_SINGLE_REGISTER):
+            chunks = [(writers[0].starting_address, values[0])]
+        elif len(values) == 1:  # The multiple writing functions (FC15, FC16) take a list of values
+            chunks = [(writers[0].starting_address, values)]
+        else:
+            write_func = mb_protocol.multiple_write_function(writers[0].write_func)
+            chunks = mb_protocol.split_values(write_func, writers[0].starting_address, values)
+
+        # Each request is executed even if a previous one failed.
+        failed_chunks = []
+        for starting_address, output_value in chunks:
+            try:
+                self.modbus_client.execute(writers[0].unit_id, write_func, starting_address,
+                                           output_value=output_value)
+            except Exception as ex:  # Reported to the writers, so an unexpected error does not stop this thread
+                quantity = len(output_value) if type(output_value) is list else 1
+                failed_chunks.append((starting_address, starting_address + quantity, ex))
+
+        for writer in writers:
+            writer.report_result(failed_chunks, len(chunks))
+            writer.finished.emit()
+
+    def _pop_due_jobs(self, now: float) -> list:
+        """
+        Pop the next due job and every other due job that reads the same unit id with the same function.
+        Must be called with the condition locked.
+
+        :param now: Current time.
+        :return: A list of (due time, reader) tuples.
+        """
+        due_time, _, reader = heapq.heappop(self._queue)
+        jobs = [(due_time, reader)]
+        others = []
+        while self._queue and self._queue[0][0] <= now:
+            entry = heapq.heappop(self._queue)
+            if entry[2].unit_id == reader.unit_id and entry[2].read_func == reader.read_func:
+                jobs.append((entry[0], entry[2]))
+            else:
+                others.append(entry)
+        for entry in others:
+            heapq.heappush(self._queue, entry)
+        return jobs
+
+    def _execute_read(self, reader: MbRegisterReader):
+        """
+        Execute a read job alone. An unexpected error is reported to the job, so it does not stop this thread.
+
+        :param reader: The job to execute.
+        """
+        try:
+            reader.execute(self.modbus_client)
+        except Exception as ex:
+            reader.report_error(ex)
+
+    def _execute_coalesced(self, readers: list):
+        """
+        Read the ranges of several jobs with merged requests, and deliver to each job its part of the values.
+        If a merged request fails with a modbus exception (for example because the bridged gap is not readable),
+        the jobs of this request are executed separately.
+
+        :param readers: Jobs with the same unit id and reading function.
+        """
+        ranges = [reader.get_read_range() for reader in readers]
+        for starting_address, quantity, members in mb_protocol.coalesce_ranges(ranges, self.coalescing_gap):
+            if len(members) == 1:
+                self._execute_read(readers[members[0]])
+                continue
+
+            for index in members:
+                readers[index].report_reading()
+            try:
+                datas = mb_protocol.read_range(
+                    self.modbus_client,
+                    readers[0].unit_id,
+                    readers[0].read_func,
+                    starting_address,
+                    quantity)
+            except ModbusError:
+                for index in members:
+                    self._execute_read(readers[index])
+            except Exception as ex:  # Invalid response, communication failure or unexpected error
+                for index in members:
+                    readers[index].report_error(ex)
+            else:
+                # Fan out the values
+                for index in members:
+                    offset = ranges[index][0] - starting_address
+                    readers[index].report_success(datas[offset:offset + ranges[index][1]], ranges[index][0])
@@ -19,6 +19,7 @@ from PyQt5.QtWidgets import *
 from custome_widgets.QCustomComboBox import QCustomComboBox
 from custome_widgets.IntegerLineEdit import QIntegerLineEdit
 import custome_widgets.CustomQValidators as Validators
+import defines
 
 
 class RangeSettingsWin(object):
@@ -41,9 +42,34 @@ class RangeSettingsWin(object):
         self.unit_id_edit = QLineEdit()
         self.unit_id_edit.setValidator(Validators.DecValidator(0, 255))
 
+        # poll period
+        self.poll_period_edit = QIntegerLineEdit()
+        self.poll_period_edit.setValidator(Validators.DecValidator(defines.MIN_POLL_PERIOD, defines.MAX_POLL_PERIOD))
+        self.poll_period_edit.setToolTip("Period of the periodic reading")
+
+        # display refresh rate
+        self.refresh_rate_edit = QIntegerLineEdit()
+        self.refresh_rate_edit.setValidator(Validators.DecValidator(defines.MIN_REFRESH_RATE, defines.MAX_REFRESH_RATE))
+        self.refresh_rate_edit.setToolTip("Maximum number of table refreshes per second.\n"
+                                          "Only the newest values are displayed when the reading is faster.")
+
+        # history
+        self.history_size_edit = QIntegerLineEdit()
+        self.history_size_edit.setValidator(Validators.DecValidator(0, 1000000))
+        self.history_size_edit.setToolTip("Number of readings kept in memory, 0 to keep none")
+        self.history_memory_label = QLabel()
+
         form_layout = QFormLayout()
+        # connection
+        self.connection_cb = QCustomComboBox()
+
         form_layout.addRow("Range name", self.range_name_edit)
+        form_layout.addRow("Connection", self.connection_cb)
         form_layout.addRow("Unit ID", self.unit_id_edit)
+        form_layout.addRow("Poll period (ms)", self.poll_period_edit)
+        form_layout.addRow("Refresh rate (fps)", self.refresh_rate_edit)
+        form_layout.addRow("History (readings)", self.history_size_edit)
+        form_layout.addRow("History memory", self.history_memory_label)
         main_layout.addLayout(form_layout)
 
         # ****************************
@@ -75,7 +101,7 @@ class RangeSettingsWin(object):
 
         # Quantity edit
         self.quantity_edit = QIntegerLineEdit()
-        self.quantity_edit.setValidator(Validators.DecValidator(1, 2000))
+        self.quantity_edit.setValidator(Validators.DecValidator(1, 65536))
 
         # form Layout
         form_layout = QFormLayout()
@@ -103,6 +129,34 @@ class RangeSettingsWin(object):
         form_layout.addRow("Write function", self.write_func_cb)
         md_fn_group_box.setLayout(form_layout)
 
+        # ****************************
+        # Value decoding group
+        # ****************************
+        self.decoding_group_box = QGroupBox("Value decoding")
+        main_layout.addWidget(self.decoding_group_box)
+
+        self.data_type_cb = QCustomComboBox()
+        self.data_type_cb.setToolTip("Type of the values. A row can use another type (right click in the table).")
+
+        self.byte_order_cb = QCustomComboBox()
+        self.byte_order_cb.setToolTip("Order of the 2 bytes of a register")
+
+        self.word_order_cb = QCustomComboBox()
+        self.word_order_cb.setToolTip("Order of the registers of a value of 32 or 64 bits")
+
+        self.value_display_cb = QCustomComboBox()
+        self.value_display_cb.setToolTip("Base of the displayed integer values")
+
+        form_layout = QFormLayout()
+        form_layout.addRow("Data type", self.data_type_cb)
+        form_layout.addRow("Byte order", self.byte_order_cb)
+        form_layout.addRow("Word order", self.word_order_cb)
+        self.decoding_group_box.setLayout(form_layout)
+
+        form_layout = QFormLayout()
+        form_layout.addRow("Value display", self.value_display_cb)
+        main_layout.addLayout(form_layout)
+
         # ****************************
         # Main buttons
         # ****************************
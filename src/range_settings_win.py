@@ -20,6 +20,11 @@ from PyQt5.QtGui import *
 import modbus_tk.defines as cst
 
 import range_settings_ui
+import defines
+from defines import NumberDisplay
+import mb_protocol
+import history_buffer
+from value_decoder import DATA_TYPE_NAMES, DataType, ByteOrder
 import custome_widgets.CustomQValidators as Validators
 
 
@@ -41,11 +46,20 @@ class RangeSettingsUI(QMainWindow):
 
         # Settings
         self.name = "New task"
+        self.connection_name = defines.DEFAULT_CONNECTION_NAME
+        self._connection_names = [defines.DEFAULT_CONNECTION_NAME]
         self.unit_id = 1
         self.starting_address = 0
         self.quantity = 10
+        self.poll_period = 5000  # millisecond
+        self.refresh_rate = 20  # table refreshes per second
+        self.history_size = 1000  # readings kept in memory
         self.read_func = cst.READ_HOLDING_REGISTERS
         self.write_func = cst.WRITE_SINGLE_REGISTER
+        self.data_type = DataType.UINT16
+        self.byte_order = ByteOrder.BIG
+        self.word_order = ByteOrder.BIG
+        self.value_display = NumberDisplay.DEC
 
         # UI setup
         self._ui = self._setup_ui()
@@ -57,17 +71,39 @@ class RangeSettingsUI(QMainWindow):
         self._ui.read_func_cb.add_option(cst.READ_INPUT_REGISTERS, "(FC04) Input Registers")
         self._on_read_func_cb_change(0)
 
+        # setup value decoding combo boxes
+        for data_type, name in DATA_TYPE_NAMES.items():
+            self._ui.data_type_cb.add_option(data_type, name)
+        for order_cb in (self._ui.byte_order_cb, self._ui.word_order_cb):
+            order_cb.add_option(ByteOrder.BIG, "Big endian (most significant first)")
+            order_cb.add_option(ByteOrder.LITTLE, "Little endian (least significant first)")
+        self._ui.value_display_cb.add_option(NumberDisplay.DEC, "Decimal")
+        self._ui.value_display_cb.add_option(NumberDisplay.HEX, "Hexadecimal")
+        self._ui.value_display_cb.add_option(NumberDisplay.BIN, "Binary")
+        self._ui.value_display_cb.add_option(NumberDisplay.OCT, "Octal")
+
         self.update_widgets()
 
     def _validation(self):
         """save the settings close the menu and call the 'call back' function"""
         self.name = self._ui.range_name_edit.text()
+        self.connection_name = self._ui.connection_cb.get_current_option_value()
         self.unit_id = int(self._ui.unit_id_edit.text())
         self.starting_address = self._ui.start_address_edit.get_value()
         self.quantity = int(self._ui.quantity_edit.text())
+        # The validators are bypassed by an imported or an empty field
+        self.poll_period = min(max(self._ui.poll_period_edit.get_value(), defines.MIN_POLL_PERIOD),
+                               defines.MAX_POLL_PERIOD)
+        self.refresh_rate = min(max(self._ui.refresh_rate_edit.get_value(), defines.MIN_REFRESH_RATE),
+                                defines.MAX_REFRESH_RATE)
+        self.history_size = self._ui.history_size_edit.get_value()
 
         self.read_func = self._ui.read_func_cb.get_current_option_value()
         self.write_func = self._ui.write_func_cb.get_current_option_value()
+        self.data_type = self._ui.data_type_cb.get_current_option_value()
+        self.byte_order = self._ui.byte_order_cb.get_current_option_value()
+        self.word_order = self._ui.word_order_cb.get_current_option_value()
+        self.value_display = self._ui.value_display_cb.get_current_option_value()
 
         self.close()
         self.call_back_func()
@@ -83,13 +119,39 @@ class RangeSettingsUI(QMainWindow):
     def update_widgets(self):
         """Set widgets with the current parameter value"""
         self._ui.range_name_edit.setText(self.name)
+        self._refresh_connection_options()
         self._ui.unit_id_edit.setText(str(self.unit_id))
+        self._ui.poll_period_edit.set_value(self.poll_period)
+        self._ui.refresh_rate_edit.set_value(self.refresh_rate)
+        self._ui.history_size_edit.set_value(self.history_size)
         self._ui.start_address_edit.set_value(self.starting_address)
         self._ui.quantity_edit.setText(str(self.quantity))
         self._on_quantity_edited()
 
         self._ui.read_func_cb.set_current_by_value(self.read_func)
         self._on_read_func_cb_change(self._ui.read_func_cb.currentIndex())
+        self._ui.data_type_cb.set_current_by_value(self.data_type)
+        self._ui.byte_order_cb.set_current_by_value(self.byte_order)
+        self._ui.word_order_cb.set_current_by_value(self.word_order)
+        self._ui.value_display_cb.set_current_by_value(self.value_display)
+
+    def set_connection_names(self, names: list):
+        """
+        Set the connection profiles that can be selected.
+
+        :param names: Names of the available connection profiles.
+        """
+        self._connection_names = names
+        self._refresh_connection_options()
+
+    def _refresh_connection_options(self):
+        """Setup options of the connection combo box. The connection of the range is always an option."""
+        self._ui.connection_cb.clear_options()
+        for name in self._connection_names:
+            self._ui.connection_cb.add_option(name, name)
+        if self.connection_name not in self._connection_names:
+            self._ui.connection_cb.add_option(self.connection_name, self.connection_name)
+        self._ui.connection_cb.set_current_by_value(self.connection_name)
 
     def _on_read_func_cb_change(self, current_index):
         """Setup options of the writing func combo box, according to the modbus reading function."""
@@ -108,6 +170,10 @@ class RangeSettingsUI(QMainWindow):
             self._ui.write_func_cb.setEnabled(False)
             self._ui.write_func_cb.add_option(None, "Not available")
 
+        # Bits are not decoded
+        self._ui.decoding_group_box.setEnabled(not mb_protocol.is_bit_function(read_func))
+        self._update_history_memory()
+
     def _on_address_display_change(self):
         """
         Is called when the address display mode has been changed.
@@ -129,9 +195,8 @@ class RangeSettingsUI(QMainWindow):
         if start_value >= end_value:
             self._ui.end_address_edit.set_value(start_value)
             quantity = 1
-        elif quantity > 2000:
-            self._ui.end_address_edit.set_value(start_value + 1999)
         self._ui.quantity_edit.set_value(quantity)
+        self._update_history_memory()
 
     def _on_end_address_edited(self):
         """
@@ -143,9 +208,8 @@ class RangeSettingsUI(QMainWindow):
         if start_value >= end_value:
             self._ui.start_address_edit.set_value(end_value)
             quantity = 1
-        elif quantity > 2000:
-            self._ui.start_address_edit.set_value(end_value - 1999)
         self._ui.quantity_edit.set_value(quantity)
+        self._update_history_memory()
 
     def _on_quantity_edited(self):
         """
@@ -158,6 +222,25 @@ class RangeSettingsUI(QMainWindow):
             end_value = 65535
             self._ui.quantity_edit.set_value(end_value - start_value + 1)
         self._ui.end_address_edit.set_value(end_value)
+        self._update_history_memory()
+
+    def _update_history_memory(self):
+        """Display the memory used by the history with the typed quantity and history size."""
+        read_func = self._ui.read_func_cb.get_current_option_value()
+        if read_func is None:
+            return
+        quantity = self._ui.quantity_edit.get_value()
+        typecode = mb_protocol.values_typecode(read_func)
+        history_size = self._ui.history_size_edit.get_value()
+        max_history_size = history_buffer.max_capacity(quantity, typecode)
+        size = history_buffer.memory_size(quantity, min(history_size, max_history_size), typecode)
+        if size < 1e6:
+            text = "{0:.1f} kB".format(size / 1e3)
+        else:
+            text = "{0:.1f} MB".format(size / 1e6)
+        if history_size > max_history_size:
+            text += " (limited to {0} readings)".format(max_history_size)
+        self._ui.history_memory_label.setText(text)
 
     def export_config(self) -> dict:
         """
@@ -167,11 +250,19 @@ class RangeSettingsUI(QMainWindow):
         """
         data = {
             "task_name": self.name,
+            "connection": self.connection_name,
             "unit_id": self.unit_id,
             "starting_address": self.starting_address,
             "quantity": self.quantity,
+            "poll_period": self.poll_period,
+            "refresh_rate": self.refresh_rate,
+            "history_size": self.history_size,
             "read_func": self.read_func,
             "write_func": self.write_func,
+            "data_type": self.data_type,
+            "byte_order": self.byte_order,
+            "word_order": self.word_order,
+            "value_display": self.value_display.value,
         }
         return data
 
@@ -185,13 +276,23 @@ class RangeSettingsUI(QMainWindow):
             return
         # Write data into the widget. Because widget have value check.
         self._ui.range_name_edit.setText(str(data.get("task_name", self.name)))
+        self.connection_name = str(data.get("connection", self.connection_name))
+        self._refresh_connection_options()
         self._ui.unit_id_edit.setText(str(data.get("unit_id", self.unit_id)))
         self._ui.start_address_edit.setText(str(data.get("starting_address", self.starting_address)))
         self._ui.quantity_edit.setText(str(data.get("quantity", self.quantity)))
+        self._ui.poll_period_edit.setText(str(data.get("poll_period", self.poll_period)))
+        self._ui.refresh_rate_edit.setText(str(data.get("refresh_rate", self.refresh_rate)))
+        self._ui.history_size_edit.setText(str(data.get("history_size", self.history_size)))
 
         self._ui.read_func_cb.set_current_by_value(data.get("read_func", self.read_func))
         self._on_read_func_cb_change(self._ui.read_func_cb.currentIndex())
         self._ui.write_func_cb.set_current_by_value(data.get("write_func", self.write_func))
+        self._ui.data_type_cb.set_current_by_value(data.get("data_type", self.data_type))
+        self._ui.byte_order_cb.set_current_by_value(data.get("byte_order", self.byte_order))
+        self._ui.word_order_cb.set_current_by_value(data.get("word_order", self.word_order))
+        if data.get("value_display", None) in [number_display.value for number_display in NumberDisplay]:
+            self._ui.value_display_cb.set_current_by_value(NumberDisplay(data["value_display"]))
 
         self._validation()
 
@@ -205,6 +306,7 @@ class RangeSettingsUI(QMainWindow):
         ui.start_address_edit.editingFinished.connect(self._on_start_address_edited)
         ui.end_address_edit.editingFinished.connect(self._on_end_address_edited)
         ui.quantity_edit.editingFinished.connect(self._on_quantity_edited)
+        ui.history_size_edit.textChanged.connect(self._update_history_memory)
         ui.button_group.idClicked.connect(self._on_address_display_change)
         ui.valid_button.clicked.connect(self._validation)
         ui.cancel_button.clicked.connect(self._cancel)
@@ -19,6 +19,8 @@ from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from datetime import datetime
 from custome_widgets.RegisterTableWidget import RegisterTableWidget
+from custome_widgets.BitfieldTableWidget import BitfieldTableWidget
+from custome_widgets.QCustomComboBox import QCustomComboBox
 
 from utils import *
 
@@ -53,11 +55,66 @@ class RangeUI(object):
         self.toggle_read_button.setCheckable(True)
         h_layout.addWidget(self.toggle_read_button)
 
+        self.timing_label = QLabel()
+        self.timing_label.setToolTip("Duration of the last reading (time waited in the connection queue)")
+        h_layout.addWidget(self.timing_label)
+
+        self.record_button = QCheckBox()
+        self.record_button.setText("Record")
+        self.record_button.setToolTip("Record every reading into a file")
+        h_layout.addWidget(self.record_button)
+
+        self.overrun_label = QLabel()
+        self.overrun_label.setStyleSheet("color : red")
+        self.overrun_label.setToolTip("Number of poll periods missed because the reading took longer than the period")
+        h_layout.addWidget(self.overrun_label)
+
+        self.replay_button = QPushButton()
+        self.replay_button.setText("Replay")
+        self.replay_button.setToolTip("Replay a recording in this range")
+        h_layout.addWidget(self.replay_button)
+
+        self.write_block_button = QPushButton()
+        self.write_block_button.setText("Write block")
+        self.write_block_button.setToolTip("Write the selected rows, or a pasted column of values")
+        h_layout.addWidget(self.write_block_button)
+
         self.open_settings_btn = QToolButton()
         self.open_settings_btn.setIcon(QIcon(resource_path("icons/tune_FILL0_wght400_GRAD0_opsz48.svg")))
         self.open_settings_btn.setToolTip("Range parameters")
         h_layout.addWidget(self.open_settings_btn)
 
+        # ****************************
+        # Replay buttons
+        # ****************************
+        self.replay_widget = QWidget()
+        self.replay_widget.hide()
+        h_layout = QHBoxLayout()
+        h_layout.setContentsMargins(0, 0, 0, 0)
+        self.replay_widget.setLayout(h_layout)
+        v_layout.addWidget(self.replay_widget)
+
+        self.replay_play_button = QPushButton()
+        self.replay_play_button.setText("Play")
+        self.replay_play_button.setCheckable(True)
+        h_layout.addWidget(self.replay_play_button)
+
+        self.replay_step_button = QPushButton()
+        self.replay_step_button.setText("Step")
+        self.replay_step_button.setToolTip("Replay the next reading")
+        h_layout.addWidget(self.replay_step_button)
+
+        self.replay_speed_cb = QCustomComboBox()
+        self.replay_speed_cb.setToolTip("Speed of the replay")
+        h_layout.addWidget(self.replay_speed_cb)
+
+        self.replay_position_label = QLabel()
+        h_layout.addWidget(self.replay_position_label)
+
+        self.replay_stop_button = QPushButton()
+        self.replay_stop_button.setText("Stop replay")
+        h_layout.addWidget(self.replay_stop_button)
+
         # ****************************
         # plain text
         # ****************************
@@ -75,6 +132,12 @@ class RangeUI(object):
         self.table_widget = RegisterTableWidget()
         v_layout.addWidget(self.table_widget)
 
+        # ****************************
+        # bits of the expanded registers
+        # ****************************
+        self.bitfield_widget = BitfieldTableWidget(self.table_widget.model())
+        v_layout.addWidget(self.bitfield_widget)
+
     def log_print(self, text):
         """insert log into the plain text widget"""
         now = datetime.now()
@@ -17,13 +17,25 @@ see <https://www.gnu.org/licenses/>.
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import QCloseEvent
 from modbus_tk.exceptions import *
-from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtCore import pyqtSignal, QModelIndex, Qt
 
 import range_ui
 import range_settings_win
 import write_win
+import block_write_win
+import defines
+import recorder
+import mb_protocol
+from history_buffer import HistoryBuffer, max_capacity
+from record_file import RecordFile
+from session_replayer import SessionReplayer
+from trend_win import TrendWin
 from mb_regesiter_reader import MbRegisterReader
+from mb_register_writer import MbRegisterWriter
+from connection_pool import ConnectionPool
+from display_refresher import DisplayRefresher
 from register_row import RegisterRow as Row
+from custome_widgets.RegisterTableModel import RegisterTableModel
 
 
 class RangeWin(QDockWidget):
@@ -33,11 +45,18 @@ class RangeWin(QDockWidget):
     range_counter = 0
     closed_event = pyqtSignal(object)
 
-    def __init__(self, parent, modbus_client):
+    def __init__(self, parent, connection_pool: ConnectionPool):
         super(RangeWin, self).__init__("New range", parent)
-        self.modbus_client = modbus_client
+        self._connection_pool = connection_pool
 
-        self._reading_thread = None
+        self._reader = None
+        self._reader_scheduler = None  # Scheduler that executes the reading job
+        self._writers = []  # Write jobs not yet finished
+        self._overrun_count = 0
+        self._recorder = None  # Recorder of the readings, None when not recording
+        self._history = None  # Last readings kept in memory
+        self._trend_wins = []  # Opened trend windows
+        self._replayer = None  # Replayer of a recording, None when not replaying
 
         # Instantiates the modbus parameters and their menu.
         self._settings = range_settings_win.RangeSettingsUI(self, self._on_settings_update)
@@ -47,61 +66,206 @@ class RangeWin(QDockWidget):
         self._settings.update_widgets()
 
         self._ui = self._setup_ui()
+        self._display_refresher = DisplayRefresher(self._ui.table_widget, self._settings.refresh_rate)
         self._on_settings_update()
 
+    @property
+    def history(self) -> HistoryBuffer:
+        """Last readings of the range, kept in memory."""
+        return self._history
+
+    @property
+    def connection_name(self) -> str:
+        """Name of the connection used by the range."""
+        return self._settings.connection_name
+
+    def set_connection_name(self, name: str):
+        """
+        Use another connection. The running reading of the previous connection is stopped.
+
+        :param name: Name of the connection.
+        """
+        self._settings.set_connection_names(self._connection_pool.names())
+        self._settings.import_config({"connection": name})
+
+    @property
+    def modbus_client(self):
+        """Modbus client of the connection used by the range. None if not connected."""
+        connection = self._connection_pool.get(self._settings.connection_name)
+        return None if connection is None else connection.modbus_client
+
+    @property
+    def poll_scheduler(self):
+        """Scheduler of the connection used by the range. None if not connected."""
+        connection = self._connection_pool.get(self._settings.connection_name)
+        return None if connection is None else connection.poll_scheduler
+
     def open_settings(self):
         """Opens the modbus configuration menu."""
+        self._settings.set_connection_names(self._connection_pool.names())
         self._settings.show()
 
     def _on_settings_update(self):
         """Is called when the new modbus configuration is validated. Update widgets"""
         # Update dock title
         self.setWindowTitle(self._settings.name)
+        self._display_refresher.set_frame_rate(self._settings.refresh_rate)
+
+        # A recording is only made of the readings of one range
+        if self._recorder is not None and not self._is_recorded(self._settings.unit_id, self._settings.read_func,
+                                                                 self._settings.starting_address,
+                                                                 self._settings.quantity):
+            self._stop_recording()
+
+        # A replay only displays the range of its recording
+        if self._replayer is not None and not self._is_replayed(self._settings.unit_id, self._settings.read_func,
+                                                                self._settings.starting_address,
+                                                                self._settings.quantity):
+            self._stop_replay()
+
+        # Update the running periodic reading
+        if self._reader is not None:
+            self._reader.period = self._settings.poll_period
+            self._reader.request_snapshot()  # The table is rebuilt
+            if self._reader_scheduler is not self.poll_scheduler:  # Connection changed
+                self._reader_scheduler.cancel(self._reader)
+        if self._replayer is not None:
+            self._replayer.request_snapshot()
+
+        # Keep the history of the addresses that stay in the range
+        typecode = mb_protocol.values_typecode(self._settings.read_func)
+        capacity = min(self._settings.history_size, max_capacity(self._settings.quantity, typecode))
+        try:
+            if self._history is None or self._history.typecode != typecode:
+                self._history = HistoryBuffer(self._settings.starting_address, self._settings.quantity,
+                                              capacity, typecode)
+            elif (self._history.starting_address, self._history.quantity, self._history.capacity) != \
+                    (self._settings.starting_address, self._settings.quantity, capacity):
+                self._history = self._history.reshaped(self._settings.starting_address, self._settings.quantity,
+                                                       capacity)
+        except MemoryError:
+            self._ui.log_print("Not enough memory for the history, no reading is kept")
+            self._history = HistoryBuffer(self._settings.starting_address, self._settings.quantity, 0, typecode)
+        for trend_win in self._trend_wins:
+            trend_win.set_history(self._history)
 
         # update table
+        self._display_refresher.clear()
         self._ui.table_widget.change_address_set(self._settings.starting_address,
                                                  self._settings.quantity,
                                                  self._settings.read_func,
                                                  self._settings.write_func)
+        self._ui.table_widget.set_decoding(self._settings.data_type,
+                                           self._settings.byte_order,
+                                           self._settings.word_order)
+        self._ui.table_widget.set_number_display(self._settings.value_display)
 
     def _mb_reading_execute(self):
-        if self.modbus_client is None:
+        if self.poll_scheduler is None:
             self._ui.log_print("Client not connected")
             return
 
-        if self._reading_thread is not None:  # not none when running
+        if self._reader is not None:  # not none when running
+            return
+
+        if self._replayer is not None:
+            self._ui.log_print("Stop the replay before reading")
             return
 
         self._ui.read_button.setEnabled(False)
 
-        # Creating thread
-        self._reading_thread = MbRegisterReader(
-            self.modbus_client,
+        # Creating job
+        self._reader = MbRegisterReader(
             self._settings.unit_id,
             self._settings.read_func,
             self._settings.starting_address,
             self._settings.quantity,
-            5000,
+            self._settings.poll_period,
             loop=self._ui.toggle_read_button.isChecked()
         )
 
         # Connect signal
-        self._reading_thread.finished.connect(self._reading_thread.deleteLater)
-        self._reading_thread.finished.connect(self._on_reading_finished)
-        self._reading_thread.log_progress.connect(self._ui.log_print)
-        self._reading_thread.success.connect(self._ui.table_widget.set_register_values)
+        self._reader.finished.connect(self._on_reading_finished)
+        self._reader.log_progress.connect(self._ui.log_print)
+        self._reader.snapshot.connect(self._display_refresher.on_snapshot)
+        self._reader.changed.connect(self._display_refresher.on_changed)
+        self._reader.sampled.connect(
+            lambda timestamp, first_index, values, starting_address=self._reader.starting_address:
+            self._on_reading_sampled(timestamp, starting_address + first_index, values))
+        self._reader.timing.connect(self._on_reading_timing)
+        self._reader.overrun.connect(self._on_reading_overrun)
+        self._overrun_count = 0
+        self._ui.overrun_label.clear()
+        self._update_read_window(*self._ui.table_widget.get_visible_rows())
+        self._connect_recorder()
+
+        # Queue the job in the scheduler of the connection
+        self._reader_scheduler = self.poll_scheduler
+        self._reader_scheduler.submit(self._reader)
+
+    def _on_reading_sampled(self, timestamp: float, starting_address: int, values):
+        """Keep the values read in the history."""
+        if values.typecode == self._history.typecode:
+            self._history.append(timestamp, starting_address, values)
+            for trend_win in self._trend_wins:
+                trend_win.append(timestamp, starting_address, values)
+
+    def _open_trend(self, addresses: list):
+        """Opens a window that plots the values of addresses over time."""
+        trend_win = TrendWin(self, "Trend - " + self._settings.name, addresses,
+                             self._ui.table_widget.get_trend_series(addresses), self._history)
+        trend_win.closed_event.connect(self._trend_wins.remove)
+        self._trend_wins.append(trend_win)
+        trend_win.show()
+
+    def _update_trend_series(self):
+        """Plot the numbers of the trend windows with the new decoding or scaling of their rows."""
+        for trend_win in self._trend_wins:
+            trend_win.set_series(self._ui.table_widget.get_trend_series(trend_win.addresses))
+
+    def _update_read_window(self, first_row: int, end_row: int):
+        """
+        Restrict the periodic reading of a large range to the displayed rows.
 
-        self._reading_thread.start()
+        :param first_row: Index of the first displayed row.
+        :param end_row: Index after the last displayed row.
+        """
+        if self._reader is None:
+            return
+        if self._reader.quantity <= defines.MAX_FULLY_POLLED_QUANTITY or self._recorder is not None:
+            self._reader.set_window(None)
+            return
+        first_row = max(first_row - defines.VISIBLE_ROWS_MARGIN, 0)
+        end_row = end_row + defines.VISIBLE_ROWS_MARGIN
+        self._reader.set_window((first_row, end_row - first_row))
 
     def _on_reading_finished(self):
-        self._ui.read_button.setEnabled(True)
-        self._reading_thread = None
+        self._ui.read_button.setEnabled(self._replayer is None)
+        self._reader = None
+        self._reader_scheduler = None
+
+    def _on_reading_timing(self, waiting_time: float, execution_time: float):
+        """Display the timing of the last reading, in millisecond."""
+        self._ui.timing_label.setText(f"{execution_time:.1f} ms ({waiting_time:.1f} ms)")
+
+    def _on_reading_overrun(self, missed_periods: int):
+        """Display the number of poll periods missed since the start of the periodic reading."""
+        self._overrun_count += missed_periods
+        self._ui.overrun_label.setText(f"{self._overrun_count} overrun(s)")
 
     def _mb_writing_execute(self, register_row: Row):
         """Execute modbus writing function"""
+        self._mb_block_writing_execute([register_row])
+
+    def _mb_block_writing_execute(self, register_rows: list):
+        """
+        Queue modbus writing jobs in the scheduler of the connection, one per run of consecutive rows.
+
+        :param register_rows: The rows to write, sorted by address.
+        """
 
         # Checking client
-        if self.modbus_client is None:
+        if self.poll_scheduler is None:
             self._ui.log_print("Client not connected")
             return
         # Checking available function
@@ -109,43 +273,59 @@ class RangeWin(QDockWidget):
             self._ui.log_print("No writing function available")
             return
         # Checking data
-        if register_row.register_value is None:
+        if len(register_rows) == 0 or any(row.register_value is None for row in register_rows):
             self._ui.log_print("Value none in data")
             return
 
-        try:
-            # write data in one shot
-            self._ui.log_print("Writing...")
-            self.repaint()
-            feedback = self.modbus_client.execute(
-                self._settings.unit_id,
-                self._settings.write_func,
-                register_row.register_addr,
-                output_value=register_row.register_value
-            )
-            self._ui.log_print("Successful writing")
-            self._ui.table_widget.set_row(register_row)
-
-        except ModbusError as ex:
-            error = ex.get_exception_code()
-            if error == 1:
-                self._ui.log_print("MB exception " + str(error) + ": Illegal Function")
-            if error == 2:
-                self._ui.log_print("MB exception " + str(error) + ": Illegal data address")
-            if error == 3:
-                self._ui.log_print("MB exception " + str(error) + ": Illegal data value")
-            if error == 4:
-                self._ui.log_print("MB exception " + str(error) + ": Slave device failure")
-        except OSError as ex:
-            self._ui.log_print(str(ex))
-
-    def _on_table_cell_clicked(self, row: int, column: int):
-        if column == 2 and self._settings.write_func is not None:
-            self._write_dialog = write_win.WriteWin(self._ui.table_widget.get_row(row),
+        # Each writer writes consecutive addresses
+        runs = [[register_rows[0]]]
+        for register_row in register_rows[1:]:
+            if register_row.register_addr == runs[-1][-1].register_addr + 1:
+                runs[-1].append(register_row)
+            else:
+                runs.append([register_row])
+
+        for run in runs:
+            writer = MbRegisterWriter(self._settings.unit_id, self._settings.write_func, run)
+            writer.log_progress.connect(self._ui.log_print)
+            writer.success.connect(self._on_writing_success)
+            writer.finished.connect(lambda writer=writer: self._writers.remove(writer))
+            self._writers.append(writer)  # Keep the job alive until it is finished
+            self.poll_scheduler.submit_write(writer)
+
+    def _on_writing_success(self, register_rows: list):
+        """Display the written values"""
+        self._display_refresher.clear()  # Older than the written values
+        self._ui.table_widget.set_row_values(register_rows)
+        if self._reader is not None:
+            # The displayed values are no longer the ones of the previous reading.
+            self._reader.request_snapshot()
+
+    def _on_table_cell_clicked(self, index: QModelIndex):
+        if self._replayer is not None:  # The displayed values are not the ones of the device
+            return
+        if index.column() == RegisterTableModel.VALUE_COLUMN and self._settings.write_func is not None:
+            self._write_dialog = write_win.WriteWin(self._ui.table_widget.get_row(index.row()),
                                                     self._settings.write_func,
                                                     self._mb_writing_execute)
             self._write_dialog.show()
 
+    def _open_block_write(self):
+        """Opens the dialog box to write the selected rows."""
+        if self._replayer is not None:
+            self._ui.log_print("No writing during a replay")
+            return
+        if self._settings.write_func is None:
+            self._ui.log_print("No writing function available")
+            return
+        self._block_write_dialog = block_write_win.BlockWriteWin(
+            self._ui.table_widget.get_selected_rows(),
+            self._settings.write_func,
+            self._settings.starting_address,
+            self._settings.starting_address + self._settings.quantity,
+            self._mb_block_writing_execute)
+        self._block_write_dialog.show()
+
     def export_config(self) -> dict:
         """
         Export configuration
@@ -154,7 +334,11 @@ class RangeWin(QDockWidget):
         """
         config = {
             "settings": self._settings.export_config(),
-            "labels": self._ui.table_widget.export_config()
+            "labels": self._ui.table_widget.export_config(),
+            "scalings": self._ui.table_widget.export_scalings(),
+            "bitfield": self._ui.bitfield_widget.export_config(),
+            "row_data_types": {str(address): data_type
+                               for address, data_type in self._ui.table_widget.get_row_data_types().items()},
         }
         return config
 
@@ -172,20 +356,220 @@ class RangeWin(QDockWidget):
         # import label
         self._ui.table_widget.import_config(data.get("labels", None))
 
+        # import the engineering scaling of the rows
+        self._ui.table_widget.import_scalings(data.get("scalings", None))
+
+        # import the expanded registers and the bit names
+        self._ui.bitfield_widget.import_config(data.get("bitfield", None))
+
+        # import the data type of the rows
+        row_data_types = data.get("row_data_types", None)
+        if type(row_data_types) is dict:
+            self._ui.table_widget.set_row_data_types({int(address): data_type
+                                                      for address, data_type in row_data_types.items()})
+
     def closeEvent(self, event: QCloseEvent) -> None:
-        if self._reading_thread is not None:
-            self._reading_thread.set_loop(False)
+        if self._reader is not None:
+            self._reader_scheduler.cancel(self._reader)
+        if self._recorder is not None:
+            self._stop_recording()
+        self._stop_replay()
+        for trend_win in list(self._trend_wins):
+            trend_win.close()
         self.closed_event.emit(self)
 
+    def _on_record_toggle(self):
+        """Start recording the readings into a file selected by the user, or stop recording."""
+        if not self._ui.record_button.isChecked():
+            self._stop_recording()
+            return
+
+        # File selection dialog
+        file_dialog = QFileDialog()
+        file_dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptSave)
+        file_dialog.setFileMode(QFileDialog.FileMode.AnyFile)
+        file_dialog.setNameFilter("*" + recorder.FILE_EXTENSION)
+        file_dialog.setDefaultSuffix(recorder.FILE_EXTENSION[1:])
+        if file_dialog.exec_():
+            file_path = file_dialog.selectedFiles()[0]
+        else:  # Canceled
+            self._ui.record_button.setChecked(False)
+            return
+
+        self._recorder = recorder.Recorder(file_path,
+                                           self._settings.unit_id,
+                                           self._settings.read_func,
+                                           self._settings.starting_address,
+                                           self._settings.quantity)
+        self._recorder.error.connect(self._on_recording_error)
+        self._recorder.start()
+        self._ui.log_print("Recording into " + file_path)
+        self._connect_recorder()
+
+    def _connect_recorder(self):
+        """Record the readings of the running reader, if it reads the recorded range."""
+        if self._recorder is None or self._reader is None:
+            return
+        if not self._is_recorded(self._reader.unit_id, self._reader.read_func, self._reader.starting_address,
+                                 self._reader.quantity):
+            return
+        # The whole range is read while recording
+        self._update_read_window(*self._ui.table_widget.get_visible_rows())
+        # Called by the poll thread: the recorder only queues the reading
+        self._reader.sampled.connect(self._recorder.append, Qt.ConnectionType.DirectConnection)
+
+    def _is_recorded(self, unit_id: int, read_func: int, starting_address: int, quantity: int) -> bool:
+        """
+        :return: True if the range described is the one of the recording.
+        """
+        return ((unit_id, read_func, starting_address, quantity) ==
+                (self._recorder.unit_id, self._recorder.read_func, self._recorder.starting_address,
+                 self._recorder.quantity))
+
+    def _stop_recording(self):
+        """Stop the recording and close its file."""
+        if self._recorder is None:
+            return
+        stopped_recorder = self._recorder
+        self._recorder = None
+        if self._reader is not None:
+            try:
+                self._reader.sampled.disconnect(stopped_recorder.append)
+            except TypeError:  # Not connected
+                pass
+        stopped_recorder.stop()
+        self._ui.record_button.setChecked(False)
+        self._ui.log_print("Recording stopped: {0} sample(s) written, {1} dropped".format(
+            stopped_recorder.sample_count, stopped_recorder.dropped_count))
+        self._update_read_window(*self._ui.table_widget.get_visible_rows())
+
+    def _on_recording_error(self, message: str):
+        self._ui.log_print("Recording failed: " + message)
+        self._stop_recording()
+
+    def _open_replay(self):
+        """Replay in the range a recording selected by the user, instead of reading the device."""
+        # File selection dialog
+        file_dialog = QFileDialog()
+        file_dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptOpen)
+        file_dialog.setFileMode(QFileDialog.FileMode.ExistingFile)
+        file_dialog.setNameFilter("*" + recorder.FILE_EXTENSION)
+        if file_dialog.exec_():
+            file_path = file_dialog.selectedFiles()[0]
+        else:  # Canceled
+            return
+
+        try:
+            record_file = RecordFile(file_path)
+        except (ValueError, OSError) as ex:
+            self._ui.log_print("Cannot replay {0}: {1}".format(file_path, ex))
+            return
+
+        # The device is no longer read
+        self._stop_replay()
+        if self._reader is not None:
+            self._reader_scheduler.cancel(self._reader)
+        self._stop_recording()
+
+        self._replayer = SessionReplayer(record_file)
+        self._replayer.set_speed(self._ui.replay_speed_cb.get_current_option_value())
+        self._replayer.log_progress.connect(self._ui.log_print)
+        self._replayer.snapshot.connect(self._display_refresher.on_snapshot)
+        self._replayer.changed.connect(self._display_refresher.on_changed)
+        self._replayer.sampled.connect(
+            lambda timestamp, first_index, values, starting_address=record_file.starting_address:
+            self._on_reading_sampled(timestamp, starting_address + first_index, values))
+        self._replayer.position.connect(self._on_replay_position)
+
+        # Display the range of the recording, without the readings of the device
+        self._settings.import_config({"unit_id": record_file.unit_id,
+                                      "read_func": record_file.read_func,
+                                      "starting_address": record_file.starting_address,
+                                      "quantity": record_file.quantity})
+        self._history.clear()
+        for trend_win in self._trend_wins:
+            trend_win.set_history(self._history)
+
+        self._ui.read_button.setEnabled(False)
+        self._ui.toggle_read_button.setEnabled(False)
+        self._ui.record_button.setEnabled(False)
+        self._ui.replay_play_button.setChecked(False)
+        self._ui.replay_widget.show()
+        self._ui.log_print("Replaying {0}: {1} sample(s)".format(file_path, len(record_file)))
+        self._on_replay_position(0, len(record_file))
+
+    def _is_replayed(self, unit_id: int, read_func: int, starting_address: int, quantity: int) -> bool:
+        """
+        :return: True if the range described is the one of the replayed recording.
+        """
+        record_file = self._replayer.record_file
+        return ((unit_id, read_func, starting_address, quantity) ==
+                (record_file.unit_id, record_file.read_func, record_file.starting_address, record_file.quantity))
+
+    def _stop_replay(self):
+        """Stop the replay and close its recording."""
+        if self._replayer is None:
+            return
+        stopped_replayer = self._replayer
+        self._replayer = None
+        stopped_replayer.stop()
+        self._display_refresher.clear()
+        self._history.clear()
+        for trend_win in self._trend_wins:
+            trend_win.set_history(self._history)
+        self._ui.replay_widget.hide()
+        self._ui.read_button.setEnabled(self._reader is None)
+        self._ui.toggle_read_button.setEnabled(True)
+        self._ui.record_button.setEnabled(True)
+        self._ui.log_print("Replay stopped")
+
+    def _on_replay_play_toggle(self):
+        if self._replayer is None:
+            return
+        if self._ui.replay_play_button.isChecked():
+            self._replayer.play()
+        else:
+            self._replayer.pause()
+
+    def _on_replay_step(self):
+        if self._replayer is None:
+            return
+        self._ui.replay_play_button.setChecked(False)
+        self._replayer.step()
+
+    def _on_replay_speed_change(self):
+        if self._replayer is not None:
+            self._replayer.set_speed(self._ui.replay_speed_cb.get_current_option_value())
+
+    def _on_replay_position(self, sample_index: int, sample_count: int):
+        """Display the number of samples replayed."""
+        self._ui.replay_position_label.setText(f"{sample_index} / {sample_count}")
+        if self._replayer is not None and not self._replayer.is_playing:
+            self._ui.replay_play_button.setChecked(False)
+
     def _on_reading_loop_toggle(self):
-        if self._reading_thread is not None:
-            self._reading_thread.set_loop(self._ui.toggle_read_button.isChecked())
+        if self._reader is not None:
+            self._reader.set_loop(self._ui.toggle_read_button.isChecked())
 
     def _setup_ui(self):
         """Load widgets and connect them to function."""
         ui = range_ui.RangeUI(self)
         ui.read_button.clicked.connect(self._mb_reading_execute)
+        ui.write_block_button.clicked.connect(self._open_block_write)
         ui.open_settings_btn.clicked.connect(self.open_settings)
-        ui.table_widget.cellClicked.connect(self._on_table_cell_clicked)
+        ui.table_widget.clicked.connect(self._on_table_cell_clicked)
+        ui.table_widget.bits_expansion_requested.connect(ui.bitfield_widget.set_expanded)
+        ui.table_widget.visible_rows_changed.connect(self._update_read_window)
+        ui.table_widget.trend_requested.connect(self._open_trend)
+        ui.table_widget.model().decoding_changed.connect(self._update_trend_series)
         ui.toggle_read_button.clicked.connect(self._on_reading_loop_toggle)
+        ui.record_button.clicked.connect(self._on_record_toggle)
+
+        for speed in [1, 10, 100]:
+            ui.replay_speed_cb.add_option(speed, f"{speed}x", set_as_current=speed == 1)
+        ui.replay_button.clicked.connect(self._open_replay)
+        ui.replay_play_button.clicked.connect(self._on_replay_play_toggle)
+        ui.replay_step_button.clicked.connect(self._on_replay_step)
+        ui.replay_speed_cb.currentIndexChanged.connect(self._on_replay_speed_change)
+        ui.replay_stop_button.clicked.connect(self._stop_replay)
         return ui
@@ -0,0 +1,258 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import array
+import bisect
+import json
+import mmap
+import struct
+import sys
+
+import recorder
+
+
+class RecordFile:
+    """
+    Read-only access to a recording (see recorder.Recorder), mapped in memory: the file is never loaded, only
+    the pages that are accessed are read by the system.
+    The chunks have a fixed size, so the header of any chunk is found without reading the others: a time is
+    found by bisection over the chunk headers, then over the times of one chunk, in O(log n). The values of an
+    address are contiguous in each chunk, so a window of values only touches the pages of this window.
+    """
+
+    def __init__(self, file_path: str):
+        """
+        Constructor
+
+        :param file_path: The recording file.
+        :raise OSError: If the file cannot be opened.
+        :raise ValueError: If the file is not a recording.
+        """
+        self.file_path = file_path
+        self._file = open(file_path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # Empty file
+            self._file.close()
+            raise ValueError("Not a recording file")
+        try:
+            self._load_header()
+        except (ValueError, KeyError, TypeError, UnicodeDecodeError, struct.error):
+            self.close()
+            raise ValueError("Not a recording file")
+
+    def _load_header(self):
+        """Read the header and find the chunks that are complete."""
+        magic_size = len(recorder.FILE_MAGIC)
+        if self._mmap[:magic_size] != recorder.FILE_MAGIC:
+            raise ValueError("Bad magic")
+        header_start = magic_size + recorder.HEADER_LENGTH.size
+        if len(self._mmap) < header_start:
+            raise ValueError("Truncated header")
+        header_length, = recorder.HEADER_LENGTH.unpack_from(self._mmap, magic_size)
+        if len(self._mmap) < header_start + header_length:
+            raise ValueError("Truncated header")
+        self.header = json.loads(self._mmap[header_start:header_start + header_length].decode())
+
+        self.unit_id = int(self.header["unit_id"])
+        self.read_func = int(self.header["read_func"])
+        self.starting_address = int(self.header["starting_address"])
+        self.quantity = int(self.header["quantity"])
+        self.typecode = self.header["typecode"]
+        self.chunk_samples = int(self.header["chunk_samples"])
+        if self.typecode not in ("H", "B") or self.quantity <= 0 or self.chunk_samples <= 0:
+            raise ValueError("Bad header")
+        self._itemsize = array.array(self.typecode).itemsize
+
+        # Layout of the chunks
+        self._data_start = header_start + header_length
+        self._chunk_size = recorder.chunk_size(self.header)
+        self._values_offset = recorder.CHUNK_HEADER.size + 8 * self.chunk_samples
+        self.chunk_count = max(len(self._mmap) - self._data_start, 0) // self._chunk_size  # Complete chunks
+        # The last chunk may be missing if the recording was interrupted
+        while self.chunk_count and self._chunk_header(self.chunk_count - 1)[0] != recorder.CHUNK_MAGIC:
+            self.chunk_count -= 1
+        self._last_chunk_samples = self._chunk_header(self.chunk_count - 1)[1] if self.chunk_count else 0
+        if self._last_chunk_samples > self.chunk_samples:
+            raise ValueError("Bad chunk header")
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self) -> int:
+        """Number of samples."""
+        if self.chunk_count == 0:
+            return 0
+        return (self.chunk_count - 1) * self.chunk_samples + self._last_chunk_samples
+
+    @property
+    def first_time(self) -> float:
+        """Time of the first sample, None if there is none."""
+        return self._chunk_header(0)[2] if self.chunk_count else None
+
+    @property
+    def last_time(self) -> float:
+        """Time of the last sample, None if there is none."""
+        return self._chunk_header(self.chunk_count - 1)[3] if self.chunk_count else None
+
+    def to_wall_clock(self, timestamp: float) -> float:
+        """
+        :param timestamp: A time of the recording (time.monotonic() of the recording computer).
+        :return: The matching time.time().
+        """
+        return timestamp - self.header["origin_monotonic"] + self.header["origin_time"]
+
+    def _chunk_header(self, chunk: int) -> tuple:
+        """
+        :param chunk: Index of the chunk.
+        :return: The magic, the number of samples, the time of the first and of the last sample of the chunk.
+        """
+        return recorder.CHUNK_HEADER.unpack_from(self._mmap, self._data_start + chunk * self._chunk_size)
+
+    def _view(self, offset: int, typecode: str, count: int):
+        """
+        :param offset: Offset of the first item in the file.
+        :param typecode: Type of the items.
+        :param count: Number of items.
+        :return: The items, without copy if the byte order of the computer is the one of the file.
+        """
+        size = array.array(typecode).itemsize
+        view = memoryview(self._mmap)[offset:offset + count * size]
+        if sys.byteorder == "little":
+            return view.cast(typecode)
+        items = array.array(typecode, view.tobytes())
+        view.release()
+        items.byteswap()
+        return items
+
+    def _chunk_times(self, chunk: int):
+        """
+        :param chunk: Index of the chunk.
+        :return: The times of the samples of the chunk.
+        """
+        sample_count = self.chunk_samples if chunk < self.chunk_count - 1 else self._last_chunk_samples
+        offset = self._data_start + chunk * self._chunk_size + recorder.CHUNK_HEADER.size
+        return self._view(offset, 'd', sample_count)
+
+    def find_sample(self, timestamp: float, after: bool = False) -> int:
+        """
+        :param timestamp: A time.
+        :param after: If True, the samples at this time are skipped.
+        :return: The index of the first sample at (or after) this time, len(self) if there is none.
+        """
+        # Bisection over the time of the last sample of each chunk
+        low, high = 0, self.chunk_count
+        while low < high:
+            middle = (low + high) // 2
+            last_time = self._chunk_header(middle)[3]
+            if last_time < timestamp or (after and last_time == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.chunk_count:
+            return len(self)
+        bisect_function = bisect.bisect_right if after else bisect.bisect_left
+        return low * self.chunk_samples + bisect_function(self._chunk_times(low), timestamp)
+
+    def _spans(self, first: int, end: int):
+        """
+        Split a span of samples along the chunks.
+
+        :param first: Index of the first sample.
+        :param end: Index after the last sample.
+        :return: (chunk, index of the first sample in the chunk, index after the last sample) tuples.
+        """
+        first = max(first, 0)
+        end = min(end, len(self))
+        while first < end:
+            chunk, chunk_first = divmod(first, self.chunk_samples)
+            chunk_end = min(self.chunk_samples, chunk_first + end - first)
+            yield chunk, chunk_first, chunk_end
+            first += chunk_end - chunk_first
+
+    def get_times(self, first: int, end: int) -> array.array:
+        """
+        :param first: Index of the first sample.
+        :param end: Index after the last sample.
+        :return: The times of the samples.
+        """
+        times = array.array('d')
+        for chunk, chunk_first, chunk_end in self._spans(first, end):
+            offset = self._data_start + chunk * self._chunk_size + recorder.CHUNK_HEADER.size + 8 * chunk_first
+            times.extend(self._view(offset, 'd', chunk_end - chunk_first))
+        return times
+
+    def get_values(self, address: int, first: int, end: int) -> array.array:
+        """
+        :param address: The address.
+        :param first: Index of the first sample.
+        :param end: Index after the last sample.
+        :return: The values of the address in the samples.
+        :raise IndexError: If the address is not recorded.
+        """
+        column = address - self.starting_address
+        if not 0 <= column < self.quantity:
+            raise IndexError("Address {0} is not recorded".format(address))
+        values = array.array(self.typecode)
+        for chunk, chunk_first, chunk_end in self._spans(first, end):
+            offset = (self._data_start + chunk * self._chunk_size + self._values_offset
+                      + (column * self.chunk_samples + chunk_first) * self._itemsize)
+            values.extend(self._view(offset, self.typecode, chunk_end - chunk_first))
+        return values
+
+    def get_history(self, address: int, since: float = None, until: float = None) -> (array.array, array.array):
+        """
+        Get the samples of an address in a time window, like HistoryBuffer.get_history.
+
+        :param address: The address.
+        :param since: Time of the oldest sample, None for the first one.
+        :param until: Time of the newest sample, None for the last one.
+        :return: The times and the values of the samples.
+        :raise IndexError: If the address is not recorded.
+        """
+        first = 0 if since is None else self.find_sample(since)
+        end = len(self) if until is None else self.find_sample(until, after=True)
+        return self.get_times(first, end), self.get_values(address, first, end)
+
+    def get_sample_rows(self, first: int, end: int) -> array.array:
+        """
+        Get every value of consecutive samples, one row (all the addresses) per sample.
+
+        :param first: Index of the first sample.
+        :param end: Index after the last sample.
+        :return: The rows of the samples, one after the other.
+        """
+        rows = array.array(self.typecode)
+        for chunk, chunk_first, chunk_end in self._spans(first, end):
+            count = chunk_end - chunk_first
+            offset = self._data_start + chunk * self._chunk_size + self._values_offset
+            columns = self._view(offset, self.typecode, self.quantity * self.chunk_samples)
+            chunk_rows = array.array(self.typecode, bytes(count * self.quantity * self._itemsize))
+            for column in range(self.quantity):
+                start = column * self.chunk_samples
+                chunk_rows[column::self.quantity] = array.array(
+                    self.typecode, bytes(columns[start + chunk_first:start + chunk_end]))
+            del columns
+            rows.extend(chunk_rows)
+        return rows
@@ -0,0 +1,215 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import array
+import collections
+import json
+import struct
+import sys
+import threading
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+import modbus_tk.defines as cst
+
+import mb_protocol
+
+# File format of a recording (little-endian), with a fixed layout so it can be read through mmap
+# (see record_file.RecordFile):
+#   FILE_MAGIC, header length (uint32), header (JSON, see Recorder.header, padded with spaces to a multiple of 8
+#   bytes)
+#   then chunks of chunk_size() bytes, each one:
+#     CHUNK_HEADER: CHUNK_MAGIC, number of samples, time of the first and of the last sample
+#     time of each sample (float64, time.monotonic() of the reading)
+#     the values, column by column: the samples of the first address, then of the second, ...
+#       (uint16 for registers, uint8 for bits)
+#     padding to a multiple of 8 bytes
+# Every chunk has room for header["chunk_samples"] samples. Only the last one can be partly filled, the unused
+# times and values are 0.
+FILE_EXTENSION = ".mbrec"
+FILE_MAGIC = b"MBREC001"
+HEADER_LENGTH = struct.Struct("<I")
+CHUNK_MAGIC = b"CHNK"
+CHUNK_HEADER = struct.Struct("<4sIdd")
+
+CHUNK_BYTES = 1 << 20  # Approximate size of the values of a chunk
+MAX_CHUNK_SAMPLES = 1024
+MAX_PENDING_BYTES = 16 << 20  # Samples waiting to be written, above which new samples are dropped
+
+
+def align(size: int) -> int:
+    """
+    :param size: A size in bytes.
+    :return: The size rounded up to a multiple of 8 bytes, so every column of a chunk is aligned.
+    """
+    return (size + 7) & ~7
+
+
+def chunk_size(header: dict) -> int:
+    """
+    :param header: The header of a recording.
+    :return: The size in bytes of each chunk.
+    """
+    itemsize = array.array(header["typecode"]).itemsize
+    return align(CHUNK_HEADER.size + header["chunk_samples"] * (8 + header["quantity"] * itemsize))
+
+
+class Recorder(QThread):
+    """
+    Records the readings of a range into an append-only file, on its own thread.
+    The readings are queued by append(), that is called by the poll thread and never waits for the disk.
+    The writing thread keeps the values of the whole range, updates them with each reading (all of them, or
+    the window read), and buffers one row per reading. The rows are written as a chunk of columns when the chunk
+    is full, so the memory used does not grow with the duration of the recording.
+    If the disk is too slow, the newest readings are dropped rather than delaying the polling.
+    """
+    error = pyqtSignal(str)
+
+    def __init__(self, file_path: str, unit_id: int, read_func: cst, starting_address: int, quantity: int):
+        """
+        Constructor
+
+        :param file_path: File to create.
+        :param unit_id: Unit identifier of the range.
+        :param read_func: Modbus reading function of the range.
+        :param starting_address: Starting address of the range.
+        :param quantity: Number of addresses of the range.
+        """
+        super(Recorder, self).__init__()
+        self.file_path = file_path
+        self.unit_id = unit_id
+        self.read_func = read_func
+        self.starting_address = starting_address
+        self.quantity = quantity
+        typecode = mb_protocol.values_typecode(read_func)
+        self.header = {
+            "unit_id": unit_id,
+            "read_func": read_func,
+            "starting_address": starting_address,
+            "quantity": quantity,
+            "typecode": typecode,
+            "chunk_samples": max(1, min(MAX_CHUNK_SAMPLES,
+                                        CHUNK_BYTES // (quantity * array.array(typecode).itemsize))),
+            # Wall-clock time of the monotonic time origin_monotonic, to convert the sample times
+            "origin_time": time.time(),
+            "origin_monotonic": time.monotonic(),
+        }
+        self.sample_count = 0  # Number of samples written
+        self.dropped_count = 0  # Number of readings dropped because the disk was too slow
+
+        self._condition = threading.Condition()
+        self._pending = collections.deque()  # (time, index of the first value, array of the values)
+        self._pending_bytes = 0
+        self._running = True
+
+    def append(self, timestamp: float, first_index: int, values):
+        """
+        Queue a reading. Can be called from any thread, never waits for the disk.
+
+        :param timestamp: time.monotonic() of the reading.
+        :param first_index: Index of the first value in the range.
+        :param values: Array of the values read, that must not be modified afterwards.
+        """
+        size = len(values) * values.itemsize
+        with self._condition:
+            if not self._running:
+                return
+            if self._pending_bytes + size > MAX_PENDING_BYTES:
+                self.dropped_count += 1
+                return
+            self._pending.append((timestamp, first_index, values))
+            self._pending_bytes += size
+            self._condition.notify()
+
+    def stop(self):
+        """Write the queued readings, close the file and stop the thread."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        try:
+            with open(self.file_path, "wb") as file:
+                header = json.dumps(self.header).encode()
+                header += b" " * (align(len(FILE_MAGIC) + HEADER_LENGTH.size + len(header))
+                                  - len(FILE_MAGIC) - HEADER_LENGTH.size - len(header))
+                file.write(FILE_MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+                file.flush()
+                self._record(file)
+        except OSError as ex:
+            with self._condition:
+                self._running = False
+                self._pending.clear()
+            self.error.emit(str(ex))
+
+    def _record(self, file):
+        """Write the queued readings until the recorder is stopped."""
+        typecode = self.header["typecode"]
+        chunk_samples = self.header["chunk_samples"]
+        values = array.array(typecode, bytes(self.quantity * array.array(typecode).itemsize))
+        times = array.array('d')
+        rows = array.array(typecode)  # One row of values per sample
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._pending:  # Stopped and every reading written
+                    break
+                readings = list(self._pending)
+                self._pending.clear()
+                self._pending_bytes = 0
+
+            for timestamp, first_index, new_values in readings:
+                if first_index < 0 or first_index + len(new_values) > self.quantity:
+                    continue  # Not a reading of this range
+                values[first_index:first_index + len(new_values)] = new_values
+                times.append(timestamp)
+                rows.extend(values)
+                if len(times) == chunk_samples:
+                    self._write_chunk(file, times, rows)
+                    times = array.array('d')
+                    rows = array.array(typecode)
+
+        if times:
+            self._write_chunk(file, times, rows)
+
+    def _write_chunk(self, file, times: array.array, rows: array.array):
+        """
+        Write the buffered samples as a chunk, with the values transposed into columns.
+        A partial chunk is padded to the size of a full one.
+
+        :param file: The recording file.
+        :param times: Time of each sample.
+        :param rows: Values of each sample, row after row.
+        """
+        sample_count = len(times)
+        chunk_header = CHUNK_HEADER.pack(CHUNK_MAGIC, sample_count, times[0], times[-1])
+        missing_samples = self.header["chunk_samples"] - sample_count
+        if missing_samples:
+            times = times + array.array('d', bytes(8 * missing_samples))
+            rows = rows + array.array(rows.typecode, bytes(missing_samples * self.quantity * rows.itemsize))
+        columns = array.array(rows.typecode)
+        for i in range(self.quantity):
+            columns.extend(rows[i::self.quantity])
+        if sys.byteorder == "big":
+            times.byteswap()
+            columns.byteswap()
+        data = chunk_header + times.tobytes() + columns.tobytes()
+        file.write(data + bytes(align(len(data)) - len(data)))
+        file.flush()
+        self.sample_count += sample_count
@@ -0,0 +1,171 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+
+from custome_widgets.QCustomComboBox import QCustomComboBox
+from custome_widgets.IntegerLineEdit import QIntegerLineEdit
+import custome_widgets.CustomQValidators as Validators
+
+
+class ScanUI(object):
+    """This class contains all the widgets and configures them for the scanner window."""
+    def __init__(self, main_window):
+        main_window.setWindowTitle('Scanner')
+        main_window.resize(400, 500)
+        main_layout = QVBoxLayout()
+        widget = QWidget()
+        widget.setLayout(main_layout)
+        main_window.setCentralWidget(widget)
+
+        self.connection_cb = QCustomComboBox()
+        form_layout = QFormLayout()
+        form_layout.addRow("Connection", self.connection_cb)
+        main_layout.addLayout(form_layout)
+
+        self.tab_widget = QTabWidget()
+        main_layout.addWidget(self.tab_widget)
+
+        # ****************************
+        # Address scan settings
+        # ****************************
+        address_layout = QVBoxLayout()
+        address_tab = QWidget()
+        address_tab.setLayout(address_layout)
+        self.tab_widget.addTab(address_tab, "Addresses")
+
+        self.unit_id_edit = QIntegerLineEdit()
+        self.unit_id_edit.setValidator(Validators.DecValidator(0, 255))
+
+        self.read_func_cb = QCustomComboBox()
+
+        self.start_address_edit = QIntegerLineEdit()
+        self.start_address_edit.setValidator(Validators.DecValidator(0, 65535))
+
+        self.end_address_edit = QIntegerLineEdit()
+        self.end_address_edit.setValidator(Validators.DecValidator(0, 65535))
+
+        form_layout = QFormLayout()
+        form_layout.addRow("Unit ID", self.unit_id_edit)
+        form_layout.addRow("Read function", self.read_func_cb)
+        form_layout.addRow("Starting address", self.start_address_edit)
+        form_layout.addRow("End address", self.end_address_edit)
+        address_layout.addLayout(form_layout)
+
+        # ****************************
+        # Address scan buttons
+        # ****************************
+        h_layout = QHBoxLayout()
+        address_layout.addLayout(h_layout)
+
+        self.scan_button = QPushButton()
+        self.scan_button.setText("Scan")
+        h_layout.addWidget(self.scan_button)
+
+        self.stop_button = QPushButton()
+        self.stop_button.setText("Stop")
+        self.stop_button.setEnabled(False)
+        h_layout.addWidget(self.stop_button)
+
+        self.progress_bar = QProgressBar()
+        address_layout.addWidget(self.progress_bar)
+
+        self.log_label = QLabel()
+        address_layout.addWidget(self.log_label)
+
+        # ****************************
+        # Address scan results
+        # ****************************
+        self.result_table = QTableWidget()
+        self.result_table.setColumnCount(3)
+        self.result_table.setHorizontalHeaderLabels(["Starting address", "End address", "Quantity"])
+        self.result_table.verticalHeader().hide()
+        self.result_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.result_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        address_layout.addWidget(self.result_table)
+
+        self.create_ranges_button = QPushButton()
+        self.create_ranges_button.setText("Create ranges")
+        self.create_ranges_button.setToolTip("Create a range for each selected result, or for every result")
+        address_layout.addWidget(self.create_ranges_button)
+
+        # ****************************
+        # Unit ID scan settings
+        # ****************************
+        unit_layout = QVBoxLayout()
+        unit_tab = QWidget()
+        unit_tab.setLayout(unit_layout)
+        self.tab_widget.addTab(unit_tab, "Unit IDs")
+
+        self.first_unit_id_edit = QIntegerLineEdit()
+        self.first_unit_id_edit.setValidator(Validators.DecValidator(0, 255))
+
+        self.last_unit_id_edit = QIntegerLineEdit()
+        self.last_unit_id_edit.setValidator(Validators.DecValidator(0, 255))
+
+        self.probe_read_func_cb = QCustomComboBox()
+
+        self.probe_address_edit = QIntegerLineEdit()
+        self.probe_address_edit.setValidator(Validators.DecValidator(0, 65535))
+
+        form_layout = QFormLayout()
+        form_layout.addRow("First unit ID", self.first_unit_id_edit)
+        form_layout.addRow("Last unit ID", self.last_unit_id_edit)
+        form_layout.addRow("Probe function", self.probe_read_func_cb)
+        form_layout.addRow("Probe address", self.probe_address_edit)
+        unit_layout.addLayout(form_layout)
+
+        # ****************************
+        # Unit ID scan buttons
+        # ****************************
+        h_layout = QHBoxLayout()
+        unit_layout.addLayout(h_layout)
+
+        self.unit_scan_button = QPushButton()
+        self.unit_scan_button.setText("Scan")
+        h_layout.addWidget(self.unit_scan_button)
+
+        self.unit_stop_button = QPushButton()
+        self.unit_stop_button.setText("Stop")
+        self.unit_stop_button.setEnabled(False)
+        h_layout.addWidget(self.unit_stop_button)
+
+        self.unit_progress_bar = QProgressBar()
+        unit_layout.addWidget(self.unit_progress_bar)
+
+        self.unit_log_label = QLabel()
+        unit_layout.addWidget(self.unit_log_label)
+
+        # ****************************
+        # Unit ID scan results
+        # ****************************
+        self.unit_result_table = QTableWidget()
+        self.unit_result_table.setColumnCount(3)
+        self.unit_result_table.setHorizontalHeaderLabels(["Unit ID", "Response time", "Answer"])
+        self.unit_result_table.verticalHeader().hide()
+        self.unit_result_table.horizontalHeader().setStretchLastSection(True)
+        self.unit_result_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.unit_result_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.unit_result_table.setToolTip("Double click to scan the addresses of a unit")
+        unit_layout.addWidget(self.unit_result_table)
+
+        self.unit_create_ranges_button = QPushButton()
+        self.unit_create_ranges_button.setText("Create ranges")
+        self.unit_create_ranges_button.setToolTip(
+            "Create a range at the probe address for each selected unit, or for every unit")
+        unit_layout.addWidget(self.unit_create_ranges_button)
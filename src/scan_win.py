@@ -0,0 +1,249 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+import modbus_tk.defines as cst
+
+import scan_ui
+from address_scanner import AddressScanner
+from unit_scanner import UnitScanner
+from connection_pool import ConnectionPool
+
+
+class ScanWin(QMainWindow):
+    """
+    Window to discover the unit ids that answer and the readable addresses of a device, and to create ranges
+    from them.
+    """
+    class Tab:
+        ADDRESSES = 0
+        UNIT_IDS = 1
+
+    def __init__(self, parent, connection_pool: ConnectionPool, create_range_func):
+        """
+        Constructor
+
+        :param parent: The parent window.
+        :param connection_pool: The connection profiles.
+        :param create_range_func: The function to call with the settings dict of a range to create.
+        """
+        super(ScanWin, self).__init__(parent)
+        self._connection_pool = connection_pool
+        self._create_range_func = create_range_func
+        self._scanner = None
+        self._results = []  # Readable ranges, as (starting_address, quantity) tuples
+        self._unit_scanner = None
+        self._unit_results = []  # Answering units, as (unit_id, response time, answer) tuples
+
+        # UI setup
+        self._ui = self._setup_ui()
+
+        self._ui.read_func_cb.add_option(cst.READ_COILS, "(FC01) Coils")
+        self._ui.read_func_cb.add_option(cst.READ_DISCRETE_INPUTS, "(FC02) Discrete input")
+        self._ui.read_func_cb.add_option(cst.READ_HOLDING_REGISTERS, "(FC03) Holding Registers", set_as_current=True)
+        self._ui.read_func_cb.add_option(cst.READ_INPUT_REGISTERS, "(FC04) Input Registers")
+
+        self._ui.probe_read_func_cb.add_option(cst.READ_COILS, "(FC01) Coils")
+        self._ui.probe_read_func_cb.add_option(cst.READ_DISCRETE_INPUTS, "(FC02) Discrete input")
+        self._ui.probe_read_func_cb.add_option(cst.READ_HOLDING_REGISTERS, "(FC03) Holding Registers",
+                                               set_as_current=True)
+        self._ui.probe_read_func_cb.add_option(cst.READ_INPUT_REGISTERS, "(FC04) Input Registers")
+
+        self._ui.unit_id_edit.set_value(1)
+        self._ui.start_address_edit.set_value(0)
+        self._ui.end_address_edit.set_value(65535)
+        self._ui.first_unit_id_edit.set_value(1)
+        self._ui.last_unit_id_edit.set_value(247)
+        self._ui.probe_address_edit.set_value(0)
+
+    def show_tab(self, tab: int):
+        """
+        Open the window on a tab.
+
+        :param tab: One of ScanWin.Tab.
+        """
+        self._ui.tab_widget.setCurrentIndex(tab)
+        self.show()
+        self.activateWindow()
+
+    def showEvent(self, event: QShowEvent) -> None:
+        """Called when the window is open"""
+        current_name = self._ui.connection_cb.get_current_option_value() if self._ui.connection_cb.count() else None
+        self._ui.connection_cb.clear_options()
+        for name in self._connection_pool.names():
+            self._ui.connection_cb.add_option(name, name)
+        self._ui.connection_cb.set_current_by_value(current_name)
+
+    def _get_poll_scheduler(self):
+        """
+        :return: The scheduler of the selected connection, None if it is not connected.
+        """
+        connection = self._connection_pool.get(self._ui.connection_cb.get_current_option_value())
+        if connection is None:
+            return None
+        return connection.poll_scheduler
+
+    def _start_scan(self):
+        """Queue the scan task in the scheduler of the selected connection."""
+        if self._scanner is not None:
+            return
+        poll_scheduler = self._get_poll_scheduler()
+        if poll_scheduler is None:
+            self._ui.log_label.setText("Client not connected")
+            return
+
+        starting_address = self._ui.start_address_edit.get_value()
+        end_address = max(starting_address, self._ui.end_address_edit.get_value())
+
+        self._scanner = AddressScanner(
+            self._ui.unit_id_edit.get_value(),
+            self._ui.read_func_cb.get_current_option_value(),
+            starting_address,
+            end_address)
+        self._scanner.log_progress.connect(self._ui.log_label.setText)
+        self._scanner.progress.connect(self._on_progress)
+        self._scanner.found.connect(self._on_found)
+        self._scanner.finished.connect(self._on_scan_finished)
+
+        self._ui.progress_bar.setValue(0)
+        self._ui.log_label.setText("Scanning...")
+        self._ui.scan_button.setEnabled(False)
+        self._ui.stop_button.setEnabled(True)
+        poll_scheduler.submit_task(self._scanner)
+
+    def _stop_scan(self):
+        if self._scanner is not None:
+            self._scanner.cancel()
+
+    def _on_progress(self, scanned_quantity: int, total_quantity: int):
+        self._ui.progress_bar.setMaximum(total_quantity)
+        self._ui.progress_bar.setValue(scanned_quantity)
+
+    def _on_found(self, ranges: list):
+        """Display the readable ranges."""
+        self._results = ranges
+        self._ui.result_table.setRowCount(len(ranges))
+        for i, (starting_address, quantity) in enumerate(ranges):
+            self._ui.result_table.setItem(i, 0, QTableWidgetItem(str(starting_address)))
+            self._ui.result_table.setItem(i, 1, QTableWidgetItem(str(starting_address + quantity - 1)))
+            self._ui.result_table.setItem(i, 2, QTableWidgetItem(str(quantity)))
+
+    def _on_scan_finished(self):
+        self._scanner = None
+        self._ui.scan_button.setEnabled(True)
+        self._ui.stop_button.setEnabled(False)
+
+    def _create_ranges(self):
+        """Create a range for each selected result, or for every result if none is selected."""
+        indexes = sorted(set(index.row() for index in self._ui.result_table.selectedIndexes()))
+        if not indexes:
+            indexes = range(len(self._results))
+
+        for i in indexes:
+            starting_address, quantity = self._results[i]
+            self._create_range_func({
+                "connection": self._ui.connection_cb.get_current_option_value(),
+                "unit_id": self._ui.unit_id_edit.get_value(),
+                "read_func": self._ui.read_func_cb.get_current_option_value(),
+                "starting_address": starting_address,
+                "quantity": quantity,
+            })
+
+    def _start_unit_scan(self):
+        """Queue the unit id scan task in the scheduler of the selected connection."""
+        if self._unit_scanner is not None:
+            return
+        poll_scheduler = self._get_poll_scheduler()
+        if poll_scheduler is None:
+            self._ui.unit_log_label.setText("Client not connected")
+            return
+
+        first_unit_id = self._ui.first_unit_id_edit.get_value()
+        self._unit_scanner = UnitScanner(
+            self._ui.probe_read_func_cb.get_current_option_value(),
+            self._ui.probe_address_edit.get_value(),
+            first_unit_id,
+            max(first_unit_id, self._ui.last_unit_id_edit.get_value()))
+        self._unit_scanner.log_progress.connect(self._ui.unit_log_label.setText)
+        self._unit_scanner.progress.connect(self._on_unit_progress)
+        self._unit_scanner.found.connect(self._on_units_found)
+        self._unit_scanner.finished.connect(self._on_unit_scan_finished)
+
+        self._ui.unit_progress_bar.setValue(0)
+        self._ui.unit_log_label.setText("Scanning...")
+        self._ui.unit_scan_button.setEnabled(False)
+        self._ui.unit_stop_button.setEnabled(True)
+        poll_scheduler.submit_task(self._unit_scanner)
+
+    def _stop_unit_scan(self):
+        if self._unit_scanner is not None:
+            self._unit_scanner.cancel()
+
+    def _on_unit_progress(self, probed_quantity: int, total_quantity: int):
+        self._ui.unit_progress_bar.setMaximum(total_quantity)
+        self._ui.unit_progress_bar.setValue(probed_quantity)
+
+    def _on_units_found(self, units: list):
+        """Display the answering units."""
+        self._unit_results = units
+        self._ui.unit_result_table.setRowCount(len(units))
+        for i, (unit_id, response_time, answer) in enumerate(units):
+            self._ui.unit_result_table.setItem(i, 0, QTableWidgetItem(str(unit_id)))
+            self._ui.unit_result_table.setItem(i, 1, QTableWidgetItem(f"{response_time:.1f} ms"))
+            self._ui.unit_result_table.setItem(i, 2, QTableWidgetItem(answer))
+
+    def _on_unit_scan_finished(self):
+        self._unit_scanner = None
+        self._ui.unit_scan_button.setEnabled(True)
+        self._ui.unit_stop_button.setEnabled(False)
+
+    def _scan_unit_addresses(self, index: QModelIndex):
+        """Prepare the address scan of a found unit."""
+        self._ui.unit_id_edit.set_value(self._unit_results[index.row()][0])
+        self._ui.read_func_cb.set_current_by_value(self._ui.probe_read_func_cb.get_current_option_value())
+        self._ui.tab_widget.setCurrentIndex(self.Tab.ADDRESSES)
+
+    def _create_unit_ranges(self):
+        """Create a range at the probe address for each selected unit, or for every unit if none is selected."""
+        indexes = sorted(set(index.row() for index in self._ui.unit_result_table.selectedIndexes()))
+        if not indexes:
+            indexes = range(len(self._unit_results))
+
+        for i in indexes:
+            self._create_range_func({
+                "connection": self._ui.connection_cb.get_current_option_value(),
+                "unit_id": self._unit_results[i][0],
+                "read_func": self._ui.probe_read_func_cb.get_current_option_value(),
+                "starting_address": self._ui.probe_address_edit.get_value(),
+            })
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        self._stop_scan()
+        self._stop_unit_scan()
+
+    def _setup_ui(self):
+        """Load widgets and connect them to function."""
+        ui = scan_ui.ScanUI(self)
+        ui.scan_button.clicked.connect(self._start_scan)
+        ui.stop_button.clicked.connect(self._stop_scan)
+        ui.create_ranges_button.clicked.connect(self._create_ranges)
+        ui.unit_scan_button.clicked.connect(self._start_unit_scan)
+        ui.unit_stop_button.clicked.connect(self._stop_unit_scan)
+        ui.unit_result_table.doubleClicked.connect(self._scan_unit_addresses)
+        ui.unit_create_ranges_button.clicked.connect(self._create_unit_ranges)
+        return ui
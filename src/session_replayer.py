@@ -0,0 +1,144 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import time
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+import utils
+from record_file import RecordFile
+
+
+class SessionReplayer(QObject):
+    """
+    Replays a recording with the signals of MbRegisterReader, so it drives the same display path as a live
+    reading: the first sample is delivered as a snapshot, the next ones as the values that have changed, and
+    every sample as sampled.
+    The replay follows the recorded times at a speed factor, or sample by sample. The samples are read from the
+    file as they are replayed. At each tick, only the newest sample is compared with the displayed one, so the
+    display keeps up at high speed; if the replay is too late, the oldest samples of the tick are skipped.
+    """
+    log_progress = pyqtSignal(str)
+    snapshot = pyqtSignal(int, int, object)  # Replay cycle number, index of the first value, array of the values
+    changed = pyqtSignal(int, list)  # Replay cycle number, (index, new value) tuples of the changed values
+    sampled = pyqtSignal(float, int, object)  # Recorded time, index of the first value, array of the values
+    position = pyqtSignal(int, int)  # Number of samples replayed, number of samples of the recording
+    finished = pyqtSignal()
+
+    TICK_INTERVAL = 20  # millisecond
+    MAX_SAMPLES_PER_TICK = 1000
+
+    def __init__(self, record_file: RecordFile):
+        """
+        Constructor
+
+        :param record_file: The recording to replay, closed by the replayer.
+        """
+        super(SessionReplayer, self).__init__()
+        self.record_file = record_file
+        self.speed = 1
+        self._next_sample = 0  # Index of the next sample to replay
+        self._cycle = 0  # Number of samples delivered
+        self._displayed_values = None  # Values of the last sample delivered
+        self._play_clock = 0.0  # time.monotonic() when the replay was started or its speed changed
+        self._play_time = 0.0  # Recorded time replayed at _play_clock
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(self.TICK_INTERVAL)
+        self._timer.timeout.connect(self._on_tick)
+
+    @property
+    def is_playing(self) -> bool:
+        return self._timer.isActive()
+
+    def play(self):
+        """Replay the samples at the speed factor, from the next one."""
+        if self._next_sample >= len(self.record_file):
+            return
+        self._play_clock = time.monotonic()
+        self._play_time = self.record_file.get_times(self._next_sample, self._next_sample + 1)[0]
+        self._timer.start()
+        self._on_tick()
+
+    def pause(self):
+        self._timer.stop()
+
+    def step(self):
+        """Replay the next sample."""
+        self.pause()
+        self._deliver(self._next_sample + 1)
+
+    def set_speed(self, speed: int):
+        """
+        :param speed: Speed factor of the replay, 1 for the recorded speed.
+        """
+        if self.is_playing:  # Keep the current position
+            now = time.monotonic()
+            self._play_time += (now - self._play_clock) * self.speed
+            self._play_clock = now
+        self.speed = speed
+
+    def stop(self):
+        """Stop the replay and close the recording."""
+        self.pause()
+        self.record_file.close()
+        self.finished.emit()
+
+    def _on_tick(self):
+        replayed_time = self._play_time + (time.monotonic() - self._play_clock) * self.speed
+        self._deliver(self.record_file.find_sample(replayed_time, after=True))
+
+    def _deliver(self, end: int):
+        """
+        Deliver the samples up to a sample.
+
+        :param end: Index after the last sample to deliver.
+        """
+        sample_count = len(self.record_file)
+        end = min(end, sample_count)
+        first = max(self._next_sample, end - self.MAX_SAMPLES_PER_TICK)
+        if end <= first:
+            return
+
+        quantity = self.record_file.quantity
+        times = self.record_file.get_times(first, end)
+        rows = self.record_file.get_sample_rows(first, end)
+        for i, timestamp in enumerate(times):
+            self.sampled.emit(timestamp, 0, rows[i * quantity:(i + 1) * quantity])
+
+        # Display the newest sample
+        values = rows[-quantity:]
+        self._cycle += end - first
+        if self._displayed_values is None:
+            self.snapshot.emit(self._cycle, 0, values)
+        else:
+            changes = [(index, values[index])
+                       for index in utils.find_changed_indexes(self._displayed_values, values)]
+            if changes:
+                self.changed.emit(self._cycle, changes)
+        self._displayed_values = values
+
+        self._next_sample = end
+        if end == sample_count:
+            self.pause()
+        self.position.emit(end, sample_count)
+        if end == sample_count:
+            self.log_progress.emit("End of the replay")
+
+    def request_snapshot(self):
+        """Deliver all the values at the next sample, for example when the display was modified."""
+        self._displayed_values = None
@@ -0,0 +1,110 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import array
+import math
+
+import value_decoder
+from history_buffer import HistoryBuffer
+from value_decoder import DataType, ByteOrder
+
+
+class TrendSeries:
+    """
+    A number plotted over time, decoded and scaled like in the register table: the registers of the number are
+    decoded with its data type and byte/word order, then the scale and the offset of its first row are applied.
+    The samples that are not finite numbers (float NaN or infinity) are not plotted.
+    """
+
+    def __init__(self, address: int, data_type: str = None, byte_order: str = ByteOrder.BIG,
+                 word_order: str = ByteOrder.BIG, scale: float = 1.0, offset: float = 0.0, unit: str = "",
+                 label: str = ""):
+        """
+        Constructor
+
+        :param address: Address of the first register of the number.
+        :param data_type: Type of the number, one of DataType except STRING, or None for the raw values (bits).
+        :param byte_order: Order of the bytes in a register, one of ByteOrder.
+        :param word_order: Order of the registers of a value, one of ByteOrder.
+        :param scale: Factor applied to the decoded value.
+        :param offset: Added to the decoded value, after the scale.
+        :param unit: Unit of the scaled value.
+        :param label: Label of the row of the number.
+        """
+        self.address = address
+        self.data_type = data_type
+        self.byte_order = byte_order
+        self.word_order = word_order
+        self.scale = scale
+        self.offset = offset
+        self.unit = unit
+        self.label = label
+        self.register_count = 1 if data_type is None else value_decoder.register_count(data_type)
+
+    @property
+    def name(self) -> str:
+        """Name of the series in the legend."""
+        name = self.label if self.label else str(self.address)
+        return f"{name} ({self.unit})" if self.unit else name
+
+    def _is_raw(self) -> bool:
+        return (self.data_type in (None, DataType.UINT16) and self.scale == 1.0 and self.offset == 0.0)
+
+    def get_history(self, history: HistoryBuffer, since: float = None) -> (array.array, list):
+        """
+        Get the samples of the number.
+
+        :param history: History of the range.
+        :param since: Time of the oldest sample, None for the oldest one kept.
+        :return: The times and the values of the samples, from the oldest.
+        :raise IndexError: If a register of the number is not in the range.
+        """
+        times, first_column = history.get_history(self.address, since)
+        if self._is_raw():
+            return times, first_column
+
+        if self.register_count == 1:
+            registers = first_column
+        else:  # Interleave the registers of each sample
+            registers = array.array('H', bytes(2 * self.register_count * len(times)))
+            registers[0::self.register_count] = first_column
+            for i in range(1, self.register_count):
+                registers[i::self.register_count] = history.get_history(self.address + i, since)[1]
+        numbers = value_decoder.decode_numbers(registers, self.data_type, self.byte_order, self.word_order)
+        values = [number * self.scale + self.offset for number in numbers]
+        if self.data_type in (DataType.FLOAT32, DataType.FLOAT64) and not all(map(math.isfinite, values)):
+            kept = [i for i, value in enumerate(values) if math.isfinite(value)]
+            return array.array('d', [times[i] for i in kept]), [values[i] for i in kept]
+        return times, values
+
+    def get_value(self, starting_address: int, values):
+        """
+        Get the value of the number in a reading.
+
+        :param starting_address: Address of the first value read.
+        :param values: Values of consecutive addresses.
+        :return: The value, None if the number has not been read or is not a finite number.
+        """
+        first = self.address - starting_address
+        if first < 0 or first + self.register_count > len(values):
+            return None
+        if self._is_raw():
+            return values[first]
+        number = value_decoder.decode_numbers(values[first:first + self.register_count], self.data_type,
+                                              self.byte_order, self.word_order)[0]
+        value = number * self.scale + self.offset
+        return value if math.isfinite(value) else None
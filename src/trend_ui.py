@@ -0,0 +1,48 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+from PyQt5.QtWidgets import *
+
+from custome_widgets.QCustomComboBox import QCustomComboBox
+from custome_widgets.TrendPlotWidget import TrendPlotWidget
+
+
+class TrendUI(object):
+    """This class contains all the widgets and configures them for the trend window."""
+    def __init__(self, main_window):
+        main_window.setWindowTitle('Trend')
+        main_window.resize(600, 300)
+        general_layout = QVBoxLayout()
+        widget = QWidget()
+        widget.setLayout(general_layout)
+        main_window.setCentralWidget(widget)
+
+        # ****************************
+        # Time span
+        # ****************************
+        self.span_cb = QCustomComboBox()
+        self.span_cb.setToolTip("Displayed duration")
+
+        form_layout = QFormLayout()
+        form_layout.addRow("Time span", self.span_cb)
+        general_layout.addLayout(form_layout)
+
+        # ****************************
+        # Plot
+        # ****************************
+        self.plot_widget = TrendPlotWidget()
+        general_layout.addWidget(self.plot_widget)
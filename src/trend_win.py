@@ -0,0 +1,90 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+
+import trend_ui
+from history_buffer import HistoryBuffer
+
+
+class TrendWin(QMainWindow):
+    """This class is the window that plots some numbers of a range over time."""
+    closed_event = pyqtSignal(object)
+
+    def __init__(self, parent, title: str, addresses: list, series: list, history: HistoryBuffer):
+        """
+        Constructor
+
+        :param parent: The parent widget.
+        :param title: Title of the window.
+        :param addresses: Addresses of the rows to plot.
+        :param series: TrendSeries of the numbers of these rows.
+        :param history: History of the range, displayed when the window is opened.
+        """
+        super(TrendWin, self).__init__(parent)
+        self.addresses = addresses
+
+        # UI setup
+        self._ui = self._setup_ui()
+        self.setWindowTitle(title)
+
+        for span, text in ((10, "10 seconds"), (60, "1 minute"), (600, "10 minutes"), (3600, "1 hour"),
+                           (8 * 3600, "8 hours"), (24 * 3600, "24 hours")):
+            self._ui.span_cb.add_option(span, text, set_as_current=span == 60)
+        self._ui.plot_widget.set_span(self._ui.span_cb.get_current_option_value())
+        self._ui.plot_widget.set_series(series)
+        self._ui.plot_widget.set_history(history)
+
+    def set_series(self, series: list):
+        """
+        Is called when the decoding or the scaling of the plotted rows has changed.
+
+        :param series: The new TrendSeries of the numbers of the rows.
+        """
+        self._ui.plot_widget.set_series(series)
+
+    def set_history(self, history: HistoryBuffer):
+        """
+        Is called when the history of the range has been replaced.
+
+        :param history: The new history.
+        """
+        self._ui.plot_widget.set_history(history)
+
+    def append(self, timestamp: float, starting_address: int, values):
+        """
+        Plot a new reading.
+
+        :param timestamp: time.monotonic() of the reading.
+        :param starting_address: Address of the first value.
+        :param values: Values of consecutive addresses.
+        """
+        self._ui.plot_widget.append(timestamp, starting_address, values)
+
+    def _on_span_change(self):
+        self._ui.plot_widget.set_span(self._ui.span_cb.get_current_option_value())
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        self.closed_event.emit(self)
+
+    def _setup_ui(self):
+        """Load widgets and connect them to function."""
+        ui = trend_ui.TrendUI(self)
+        ui.span_cb.currentIndexChanged.connect(self._on_span_change)
+        return ui
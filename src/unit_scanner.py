@@ -0,0 +1,123 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import modbus_tk.modbus
+from PyQt5.QtCore import QObject, pyqtSignal
+from modbus_tk.exceptions import *
+import modbus_tk.defines as cst
+
+import defines
+import mb_protocol
+
+
+class UnitScanner(QObject):
+    """
+    Task that finds the unit ids answering on a bus or behind a gateway, with one single-item read each.
+    A unit that answers with an exception is present too, except for the gateway exceptions 10 and 11.
+    The timeout starts at the one of the connection, and is shortened once units have answered: it is learned
+    from the slowest response time seen so far. So the silent unit ids do not cost the full timeout each.
+    The task is executed by the PollScheduler of the connection, one batch of probes per step.
+    On TCP, the probes of a batch are in flight at the same time.
+    """
+    # pyqtSignal should be not in the __init__ !
+    log_progress = pyqtSignal(str)
+    progress = pyqtSignal(int, int)  # Number of unit ids probed, number of unit ids to probe
+    found = pyqtSignal(list)  # Answering units, as (unit_id, response time in millisecond, answer) tuples
+    finished = pyqtSignal()
+
+    TIMEOUT_FACTOR = 4  # Learned timeout, relative to the slowest response time
+    MIN_TIMEOUT = 0.05  # in second
+
+    def __init__(self, read_func: cst, address: int, first_unit_id: int = 1, last_unit_id: int = 247):
+        """
+        Constructor
+
+        :param read_func: Modbus reading function of the probe.
+        :param address: Address read by the probe.
+        :param first_unit_id: First unit id to probe.
+        :param last_unit_id: Last unit id to probe.
+        """
+        super(UnitScanner, self).__init__()
+        self.read_func = read_func
+        self.address = address
+
+        self._unit_ids = list(range(first_unit_id, last_unit_id + 1))
+        self._next_index = 0
+        self._answers = []
+        self._slowest_response_time = None
+        self._canceled = False
+
+    def cancel(self):
+        """Stop the scan at the next step. The units found so far are reported."""
+        self._canceled = True
+
+    def learned_timeout(self, configured_timeout: float) -> float:
+        """
+        :param configured_timeout: Timeout of the connection, in second.
+        :return: The timeout of the next probes, in second.
+        """
+        if self._slowest_response_time is None:
+            return configured_timeout
+        return min(configured_timeout, max(self.MIN_TIMEOUT, self.TIMEOUT_FACTOR * self._slowest_response_time))
+
+    def execute(self, modbus_client: modbus_tk.modbus.Master) -> bool:
+        """
+        Probe one batch of unit ids, with the learned timeout.
+
+        :param modbus_client: The connected modbus client.
+        :return: True if there are more unit ids to probe.
+        """
+        if self._canceled:
+            self._report_found("Scan stopped")
+            return False
+
+        batch_size = defines.MAX_TCP_REQUESTS_IN_FLIGHT if mb_protocol.is_pipelined(modbus_client) else 1
+        batch = self._unit_ids[self._next_index:self._next_index + batch_size]
+
+        # The learned timeout is only used for the probes, not for the read jobs of the connection.
+        configured_timeout = modbus_client.get_timeout()
+        mb_protocol.set_timeout(modbus_client, self.learned_timeout(configured_timeout))
+        try:
+            results = mb_protocol.probe_units(modbus_client, self.read_func, self.address, batch)
+        except Exception as ex:  # Communication failure, invalid response, unexpected error
+            self.log_progress.emit(mb_protocol.error_message(ex))
+            self._report_found("Scan aborted")
+            return False
+        finally:
+            mb_protocol.set_timeout(modbus_client, configured_timeout)
+
+        for unit_id, (result, response_time) in zip(batch, results):
+            if response_time is None:
+                continue
+            if isinstance(result, ModbusError) and result.get_exception_code() in (10, 11):
+                continue  # The gateway answers for a missing unit
+            if self._slowest_response_time is None or response_time > self._slowest_response_time:
+                self._slowest_response_time = response_time
+            answer = mb_protocol.error_message(result) if isinstance(result, Exception) else "Ok"
+            self._answers.append((unit_id, response_time * 1000, answer))
+
+        self._next_index += len(batch)
+        self.progress.emit(self._next_index, len(self._unit_ids))
+        self.log_progress.emit(f"Timeout: {self.learned_timeout(configured_timeout) * 1000:.0f} ms")
+        if self._next_index >= len(self._unit_ids):
+            self._report_found("Scan completed")
+            return False
+        return True
+
+    def _report_found(self, message: str):
+        self.log_progress.emit(f"{message}: {len(self._answers)} unit(s) found")
+        self.found.emit(list(self._answers))
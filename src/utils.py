@@ -27,3 +27,24 @@ def resource_path(relative_path: str) -> str:
         base_path = os.path.abspath("")
 
     return os.path.join(base_path, relative_path)
+
+
+def find_changed_indexes(previous_values, values, block_size: int = 64) -> list:
+    """
+    Find the indexes at which two buffers of the same length and item type differ.
+    The buffers are compared through memoryviews, block by block: the equal blocks are skipped without creating
+    a Python object per value.
+
+    :param previous_values: Old buffer (array, bytes or memoryview).
+    :param values: New buffer, with the same length and item type.
+    :param block_size: Number of items compared at once.
+    :return: The sorted list of indexes of the changed values.
+    """
+    previous_view = memoryview(previous_values)
+    view = memoryview(values)
+    indexes = []
+    for block_start in range(0, len(view), block_size):
+        block_end = min(block_start + block_size, len(view))
+        if previous_view[block_start:block_end] != view[block_start:block_end]:
+            indexes.extend(i for i in range(block_start, block_end) if previous_view[i] != view[i])
+    return indexes
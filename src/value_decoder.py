@@ -0,0 +1,223 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+import array
+import struct
+import sys
+
+
+class DataType:
+    """Enum of the types a value can be decoded as."""
+    UINT16 = "uint16"
+    INT16 = "int16"
+    UINT32 = "uint32"
+    INT32 = "int32"
+    FLOAT32 = "float32"
+    FLOAT64 = "float64"
+    STRING = "string"  # ASCII, 2 characters per register
+
+
+class ByteOrder:
+    """Enum of the order of the 2 bytes of a register, or of the registers of a value (word order)."""
+    BIG = "big"  # Most significant first, as defined by the Modbus protocol
+    LITTLE = "little"
+
+
+# Display name of the data types, in the order of the menus
+DATA_TYPE_NAMES = {
+    DataType.UINT16: "Unsigned 16 bits",
+    DataType.INT16: "Signed 16 bits",
+    DataType.UINT32: "Unsigned 32 bits",
+    DataType.INT32: "Signed 32 bits",
+    DataType.FLOAT32: "Float 32 bits",
+    DataType.FLOAT64: "Float 64 bits",
+    DataType.STRING: "String",
+}
+
+# Number of registers and struct format of the fixed size types
+_REGISTER_COUNTS = {
+    DataType.UINT16: 1,
+    DataType.INT16: 1,
+    DataType.UINT32: 2,
+    DataType.INT32: 2,
+    DataType.FLOAT32: 2,
+    DataType.FLOAT64: 4,
+}
+# Size of the integer types, in bit
+INTEGER_BIT_COUNTS = {
+    DataType.UINT16: 16,
+    DataType.INT16: 16,
+    DataType.UINT32: 32,
+    DataType.INT32: 32,
+}
+_STRUCT_FORMATS = {
+    DataType.UINT16: "H",
+    DataType.INT16: "h",
+    DataType.UINT32: "I",
+    DataType.INT32: "i",
+    DataType.FLOAT32: "f",
+    DataType.FLOAT64: "d",
+}
+
+
+def register_count(data_type: str) -> int:
+    """
+    :param data_type: A fixed size type, one of DataType except STRING.
+    :return: The number of registers of a value of this type.
+    """
+    return _REGISTER_COUNTS[data_type]
+
+
+def decode_numbers(registers, data_type: str, byte_order: str = ByteOrder.BIG,
+                   word_order: str = ByteOrder.BIG) -> tuple:
+    """
+    Decode consecutive numbers of the same type, with one struct call.
+
+    :param registers: Registers of the numbers (array 'H', memoryview of it or sequence of int).
+    :param data_type: Type of the numbers, one of DataType except STRING.
+    :param byte_order: Order of the bytes in a register, one of ByteOrder.
+    :param word_order: Order of the registers of a value, one of ByteOrder.
+    :return: The numbers.
+    """
+    count = len(registers) // _REGISTER_COUNTS[data_type]
+    data = _to_big_endian_bytes(registers[:count * _REGISTER_COUNTS[data_type]], _REGISTER_COUNTS[data_type],
+                                byte_order, word_order)
+    return struct.unpack(">" + str(count) + _STRUCT_FORMATS[data_type], data)
+
+
+def _to_big_endian_bytes(registers, register_count: int, byte_order: str, word_order: str) -> bytes:
+    """
+    Reorder the bytes of registers into the big-endian representation of their values.
+
+    :param registers: Registers of consecutive values of the same size.
+    :param register_count: Number of registers per value.
+    :param byte_order: Order of the bytes in a register, one of ByteOrder.
+    :param word_order: Order of the registers of a value, one of ByteOrder.
+    :return: The bytes, most significant first for each value.
+    """
+    words = array.array('H', registers)
+    if word_order == ByteOrder.LITTLE and register_count > 1:
+        reordered = array.array('H', words)
+        for i in range(register_count):  # Reverse the registers of each value
+            reordered[i::register_count] = words[register_count - 1 - i::register_count]
+        words = reordered
+    if (byte_order == ByteOrder.BIG) == (sys.byteorder == "little"):
+        words.byteswap()
+    return words.tobytes()
+
+
+class DecodingLayout:
+    """
+    Position of the typed values in a block of registers.
+    Each value starts at a register, with the type of the range or the type set for this register, and covers
+    the registers its type needs. A string covers the registers up to the next one with a type set.
+    The layout is computed once, and groups the consecutive values of the same type into runs, so a block is
+    decoded with one struct call per run.
+    """
+
+    def __init__(self, quantity: int, data_type: str, row_data_types: dict = None,
+                 byte_order: str = ByteOrder.BIG, word_order: str = ByteOrder.BIG):
+        """
+        Constructor
+
+        :param quantity: Number of registers of the block.
+        :param data_type: Type of the values, one of DataType.
+        :param row_data_types: Type set for some registers, as index -> DataType.
+        :param byte_order: Order of the bytes in a register, one of ByteOrder.
+        :param word_order: Order of the registers of a value, one of ByteOrder.
+        """
+        self.quantity = quantity
+        self.byte_order = byte_order
+        self.word_order = word_order
+        self.runs = []  # (first index, data type, registers per value, number of values)
+        self.value_starts = array.array('l', [-1]) * quantity  # Index of the value covering each register
+        self.value_types = {}  # Index where a value starts -> data type of the value
+        self.value_register_counts = {}  # Index where a value starts -> number of registers of the value
+        self.numeric_starts = array.array('l')  # Index where each number (value not string) starts
+        self.numeric_positions = {}  # Index where a number starts -> position in numeric_starts
+
+        row_data_types = row_data_types or {}
+        index = 0
+        while index < quantity:
+            value_type = row_data_types.get(index, data_type)
+            if value_type == DataType.STRING:
+                register_count = 1
+                while index + register_count < quantity and index + register_count not in row_data_types:
+                    register_count += 1
+            else:
+                register_count = _REGISTER_COUNTS[value_type]
+            if index + register_count > quantity:
+                break  # Not enough registers for the last value
+
+            run = self.runs[-1] if self.runs else None
+            if (run is not None and value_type != DataType.STRING and run[1] == value_type
+                    and run[0] + run[2] * run[3] == index):
+                self.runs[-1] = (run[0], run[1], run[2], run[3] + 1)
+            else:
+                self.runs.append((index, value_type, register_count, 1))
+            self.value_starts[index:index + register_count] = array.array('l', [index]) * register_count
+            self.value_types[index] = value_type
+            self.value_register_counts[index] = register_count
+            if value_type != DataType.STRING:
+                self.numeric_positions[index] = len(self.numeric_starts)
+                self.numeric_starts.append(index)
+            index += register_count
+
+    def decode(self, registers) -> (list, list):
+        """
+        Decode a block of registers.
+
+        :param registers: Values of the registers (array 'H' or memoryview of it), with the length of the layout.
+        :return: The decoded value of each register where a value starts (None for the other registers),
+            and the list of the numbers, in the order of numeric_starts.
+        """
+        decoded = [None] * self.quantity
+        numbers = []
+        for first, data_type, register_count, count in self.runs:
+            data = self._to_big_endian_bytes(registers[first:first + register_count * count], register_count)
+            if data_type == DataType.STRING:
+                decoded[first] = data.split(b"\0", 1)[0].decode("ascii", "replace")
+            else:
+                values = struct.unpack(">" + str(count) + _STRUCT_FORMATS[data_type], data)
+                decoded[first:first + register_count * count:register_count] = values
+                numbers.extend(values)
+        return decoded, numbers
+
+    def decode_value(self, registers, start: int):
+        """
+        Decode the value that starts at a register, without decoding the rest of the block.
+
+        :param registers: Values of the registers of the block (array 'H' or memoryview of it).
+        :param start: Index where the value starts (see value_starts).
+        :return: The decoded value.
+        """
+        data_type = self.value_types[start]
+        register_count = self.value_register_counts[start]
+        data = self._to_big_endian_bytes(registers[start:start + register_count], register_count)
+        if data_type == DataType.STRING:
+            return data.split(b"\0", 1)[0].decode("ascii", "replace")
+        return struct.unpack(">" + _STRUCT_FORMATS[data_type], data)[0]
+
+    def _to_big_endian_bytes(self, registers, register_count: int) -> bytes:
+        """
+        Reorder the bytes of registers into the big-endian representation of their values.
+
+        :param registers: Registers of consecutive values of the same size.
+        :param register_count: Number of registers per value.
+        :return: The bytes, most significant first for each value.
+        """
+        return _to_big_endian_bytes(registers, register_count, self.byte_order, self.word_order)
@@ -0,0 +1,76 @@
+"""
+Copyright 2022-2023 Lorin Québatte
+
+This file is part of MB-investigator.
+
+MB-investigator is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+MB-investigator is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the
+implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for
+more details.
+
+You should have received a copy of the GNU General Public License along with MB-investigator. If not,
+see <https://www.gnu.org/licenses/>.
+"""
+
+from defines import NumberDisplay
+
+
+class ValueFormatter:
+    """
+    Formats integer values in the base of a NumberDisplay mode.
+    The strings are cached per distinct value, so the values that do not change are not formatted again
+    at each refresh.
+    """
+    MAX_CACHE_SIZE = 65536  # Number of strings kept, the cache is emptied when it is full
+
+    def __init__(self, number_display: NumberDisplay = NumberDisplay.DEC):
+        """
+        Constructor
+
+        :param number_display: The base of the strings.
+        """
+        self.number_display = number_display
+        self._cache = {}  # (value, bit count) -> string
+
+    def set_number_display(self, number_display: NumberDisplay):
+        """
+        Change the base of the strings.
+
+        :param number_display: The base of the strings.
+        """
+        if number_display != self.number_display:
+            self.number_display = number_display
+            self._cache.clear()
+
+    def format(self, value: int, bit_count: int = 16) -> str:
+        """
+        Format a value.
+
+        :param value: The value.
+        :param bit_count: Size of the value, used to pad the binary and hexadecimal strings. A negative value
+            is shown as its two's complement on this size, except in decimal.
+        :return: The string.
+        """
+        key = (value, bit_count)
+        text = self._cache.get(key)
+        if text is None:
+            if len(self._cache) >= self.MAX_CACHE_SIZE:
+                self._cache.clear()
+            text = self._format(value, bit_count)
+            self._cache[key] = text
+        return text
+
+    def _format(self, value: int, bit_count: int) -> str:
+        if self.number_display == NumberDisplay.DEC:
+            return str(value)
+        if value < 0:
+            value &= (1 << bit_count) - 1
+        if self.number_display == NumberDisplay.HEX:
+            return "0x" + format(value, "0{0}X".format((bit_count + 3) // 4))
+        if self.number_display == NumberDisplay.BIN:
+            # Groups of 4 digits, like 0000_0000_1111_1111
+            return format(value, "0{0}_b".format(bit_count + (bit_count - 1) // 4))
+        return "0o" + format(value, "o")